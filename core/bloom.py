@@ -0,0 +1,61 @@
+# core/bloom.py
+"""
+Filtre de Bloom compact, sérialisable pour le cache et les manifestes.
+
+Un test négatif est certain (la valeur n'a jamais été ajoutée) ; un test
+positif peut être un faux positif avec la probabilité choisie à la création.
+"""
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Args:
+        size (int): Nombre de bits
+        hashes (int): Nombre de fonctions de hachage
+        bits (bytes, optional): Contenu sérialisé
+    """
+
+    def __init__(self, size, hashes, bits=None):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray(bits) if bits is not None else bytearray((size + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate=0.01):
+        """Filtre dimensionné pour `capacity` valeurs au taux de faux positifs donné"""
+        capacity = max(capacity, 1)
+        size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        hashes = max(1, round(size / capacity * math.log(2)))
+        return cls(size, hashes)
+
+    @classmethod
+    def from_values(cls, values, error_rate=0.01):
+        values = list(values)
+        bloom = cls.for_capacity(len(values), error_rate)
+        for value in values:
+            bloom.add(value)
+        return bloom
+
+    def _positions(self, value):
+        # Double hachage (Kirsch-Mitzenmacher) : k positions à partir d'un seul condensé
+        digest = hashlib.blake2b(str(value).encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def to_dict(self):
+        """Représentation pour le cache et le manifeste msgpack"""
+        return {'size': self.size, 'hashes': self.hashes, 'bits': bytes(self.bits)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['size'], data['hashes'], data['bits'])
@@ -0,0 +1,187 @@
+# core/codes.py
+"""
+Génération de codes uniques lisibles sans aller-retour en base.
+
+Chaque famille de codes (réservations, tickets, colis...) s'appuie sur un
+compteur CodeSequence dont les processus réservent des blocs. Les blocs sont
+acquis hors de la transaction de l'appelant (connexion dédiée en autocommit),
+de sorte qu'une annulation ne rend jamais à la séquence un bloc encore en
+cache. Un compteur ne repasse jamais deux fois par la même valeur ; il est
+ensuite :
+
+1. mélangé par une permutation de Feistel (les codes successifs ne se
+   suivent pas et ne révèlent pas le volume d'activité) ;
+2. encodé en base 32 de Crockford (pas de I, L, O, U : dictée sans ambiguïté) ;
+3. complété d'un caractère de contrôle Luhn mod 32 qui détecte toute faute
+   de frappe sur un caractère et toute inversion de deux caractères
+   adjacents, sauf l'inversion 0 ↔ Z (comme 09 ↔ 90 pour le Luhn décimal).
+
+La permutation étant une bijection sur le domaine, l'unicité du compteur
+garantit l'unicité du code.
+"""
+import hashlib
+import threading
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+BASE = len(ALPHABET)
+_VALUES = {char: value for value, char in enumerate(ALPHABET)}
+FEISTEL_ROUNDS = 4
+
+_local = threading.local()
+
+
+def luhn_check_char(body):
+    """Caractère de contrôle Luhn mod 32 d'une chaîne en base 32"""
+    factor = 2
+    total = 0
+    for char in reversed(body):
+        addend = factor * _VALUES[char]
+        factor = 1 if factor == 2 else 2
+        total += addend // BASE + addend % BASE
+    return ALPHABET[(BASE - total % BASE) % BASE]
+
+
+def is_luhn_valid(code):
+    return len(code) > 1 and all(char in _VALUES for char in code) and luhn_check_char(code[:-1]) == code[-1]
+
+
+def _allocation_connection():
+    """
+    Connexion pour réserver un bloc : la connexion par défaut hors
+    transaction, sinon une connexion dédiée au thread, en autocommit
+    """
+    from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+    if not connection.in_atomic_block:
+        return connection
+    dedicated = getattr(_local, 'connection', None)
+    if dedicated is None:
+        dedicated = _local.connection = connections.create_connection(DEFAULT_DB_ALIAS)
+    dedicated.close_if_unusable_or_obsolete()
+    return dedicated
+
+
+class FeistelPermutation:
+    """Permutation pseudo-aléatoire de [0, 2**bits) obtenue par un réseau de Feistel"""
+
+    def __init__(self, bits, salt):
+        self.bits = bits
+        self.half = (bits + 1) // 2
+        self.mask = (1 << self.half) - 1
+        self.keys = [
+            hashlib.blake2b(f'{salt}:{round_index}'.encode(), digest_size=32).digest()
+            for round_index in range(FEISTEL_ROUNDS)
+        ]
+
+    def _round(self, value, key):
+        digest = hashlib.blake2b(value.to_bytes(8, 'little'), key=key, digest_size=8).digest()
+        return int.from_bytes(digest, 'little') & self.mask
+
+    def _encrypt(self, value):
+        left, right = value >> self.half, value & self.mask
+        for key in self.keys:
+            left, right = right, left ^ self._round(right, key)
+        return (left << self.half) | right
+
+    def permute(self, value):
+        # Le réseau opère sur 2 * half bits ; si bits est impair on « marche
+        # sur le cycle » jusqu'à retomber dans le domaine, ce qui reste une
+        # bijection de [0, 2**bits).
+        limit = 1 << self.bits
+        value = self._encrypt(value)
+        while value >= limit:
+            value = self._encrypt(value)
+        return value
+
+
+class CodeGenerator:
+    """
+    Famille de codes de la forme PRÉFIXE + corps base 32 + contrôle
+
+    Args:
+        name (str): Nom de la séquence CodeSequence
+        prefix (str): Préfixe lisible (ex: 'RSV')
+        width (int): Nombre de caractères du corps (32**width codes possibles)
+        block_size (int): Nombre de valeurs réservées par accès à la base
+    """
+
+    def __init__(self, name, prefix, width, block_size=100):
+        self.name = name
+        self.prefix = prefix
+        self.width = width
+        self.block_size = block_size
+        self.length = len(prefix) + width + 1
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._permutation = None
+
+    def _get_permutation(self, salt):
+        if self._permutation is None:
+            self._permutation = FeistelPermutation(5 * self.width, salt)
+        return self._permutation
+
+    def _reserve(self, count):
+        """Valeurs de compteur pour `count` codes, en réservant des blocs si nécessaire"""
+        from django.db import connection
+
+        from .models import CodeSequence
+
+        if connection.in_atomic_block and connection.vendor == 'sqlite':
+            # SQLite n'admet qu'un écrivain : une connexion dédiée attendrait
+            # le verrou de la transaction en cours. Les valeurs sont prises
+            # dans cette transaction, sans cache, et annulées avec elle.
+            start, end, salt = CodeSequence.allocate_in_transaction(self.name, count)
+            values = list(range(start, end))
+            with self._lock:
+                permutation = self._get_permutation(salt)
+        else:
+            values = []
+            with self._lock:
+                while len(values) < count:
+                    if self._next >= self._end:
+                        size = max(self.block_size, count - len(values))
+                        self._next, self._end, salt = CodeSequence.allocate_block(
+                            self.name, size, using=_allocation_connection()
+                        )
+                        self._get_permutation(salt)
+                    take = min(count - len(values), self._end - self._next)
+                    values.extend(range(self._next, self._next + take))
+                    self._next += take
+                permutation = self._permutation
+
+        if values and values[-1] >= BASE ** self.width:
+            raise OverflowError(f"Séquence de codes '{self.name}' épuisée")
+        return [permutation.permute(value) for value in values]
+
+    def _encode(self, value):
+        chars = []
+        for _ in range(self.width):
+            value, digit = divmod(value, BASE)
+            chars.append(ALPHABET[digit])
+        body = ''.join(reversed(chars))
+        return f'{self.prefix}{body}{luhn_check_char(body)}'
+
+    def next(self):
+        """Retourne un nouveau code"""
+        return self.batch(1)[0]
+
+    def batch(self, count):
+        """Retourne `count` nouveaux codes, pour les insertions en masse"""
+        return [self._encode(value) for value in self._reserve(count)]
+
+    def is_valid(self, code):
+        """Vérifie le format et le caractère de contrôle sans requête"""
+        code = (code or '').upper()
+        return (
+            len(code) == self.length
+            and code.startswith(self.prefix)
+            and is_luhn_valid(code[len(self.prefix):])
+        )
+
+
+RESERVATION_CODES = CodeGenerator('reservation', 'RSV', width=8)
+TICKET_CODES = CodeGenerator('ticket', 'TCK', width=10)
+PARCEL_CODES = CodeGenerator('parcel', 'PCL', width=10)
+NOTIFICATION_CODES = CodeGenerator('notification', 'NOT', width=10, block_size=500)
+SUPPORT_TICKET_CODES = CodeGenerator('support_ticket', 'TKT', width=10, block_size=20)
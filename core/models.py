@@ -2,10 +2,12 @@ from django.db import models
 
 # Create your models here.
 import uuid
+import secrets
+import hashlib
 import qrcode
 import io
 from django.core.files.base import ContentFile
-from django.db import models
+from django.db import connection, models
 from django.utils import timezone
 
 
@@ -79,6 +81,12 @@ class QRCodeMixin(models.Model):
     class Meta:
         abstract = True
 
+    @staticmethod
+    def qr_path(data):
+        """Chemin du PNG adressé par le contenu : un même contenu n'est rendu qu'une fois"""
+        digest = hashlib.sha256(str(data).encode()).hexdigest()
+        return f"qrcodes/{digest[:2]}/{digest}.png"
+
     def generate_qr_code(self, data=None):
         """Génère un QR code pour l'objet"""
         if not data:
@@ -86,10 +94,92 @@ class QRCodeMixin(models.Model):
             
         if not data:
             return
-            
-        qr_img = qrcode.make(data)
-        buffer = io.BytesIO()
-        qr_img.save(buffer, format="PNG")
-        filename = f"{self.__class__.__name__.lower()}_{self.id}.png"
         
-        self.qr_image.save(filename, ContentFile(buffer.getvalue()), save=False)
\ No newline at end of file
+        path = self.qr_path(data)
+        storage = self.qr_image.storage
+        if not storage.exists(path):
+            qr_img = qrcode.make(data)
+            buffer = io.BytesIO()
+            qr_img.save(buffer, format="PNG")
+            path = storage.save(path, ContentFile(buffer.getvalue()))
+        
+        self.qr_image.name = path
+
+    def ensure_qr_code(self):
+        """Génère et enregistre le QR code à la première demande"""
+        if not self.qr_image and self.qr_token:
+            self.generate_qr_code()
+            type(self)._default_manager.filter(pk=self.pk).update(qr_image=self.qr_image.name)
+        return self.qr_image
+
+class CodeSequence(models.Model):
+    """
+    Compteur persistant d'une famille de codes (voir core.codes).
+
+    Les processus réservent des blocs de valeurs : une seule requête par
+    bloc, aucune pour les codes tirés ensuite du bloc. Un bloc mis en cache
+    doit être acquis en autocommit : s'il était pris dans la transaction de
+    l'appelant, une annulation rendrait le bloc à la séquence alors que le
+    processus continue de l'utiliser.
+    """
+    name = models.CharField(max_length=50, primary_key=True, verbose_name="Nom")
+    next_value = models.BigIntegerField(default=0, verbose_name="Prochaine valeur")
+    salt = models.CharField(max_length=64, default=secrets.token_hex, verbose_name="Sel")
+
+    class Meta:
+        verbose_name = "Séquence de codes"
+        verbose_name_plural = "Séquences de codes"
+
+    def __str__(self):
+        return f"{self.name} ({self.next_value})"
+
+    @classmethod
+    def allocate_block(cls, name, size, using=None):
+        """
+        Réserve définitivement `size` valeurs consécutives de la séquence
+
+        Args:
+            using (DatabaseWrapper, optional): Connexion à utiliser (connexion
+                par défaut sinon) ; elle ne doit pas être dans une transaction
+
+        Returns:
+            tuple: (première valeur, fin exclue, sel de la séquence)
+
+        Raises:
+            RuntimeError: Si la connexion est dans un bloc atomique
+        """
+        using = using or connection
+        if using.in_atomic_block:
+            raise RuntimeError(
+                "Un bloc de codes ne peut pas être réservé dans une transaction "
+                "(il serait rendu à la séquence en cas d'annulation)"
+            )
+        return cls._increment(using, name, size)
+
+    @classmethod
+    def allocate_in_transaction(cls, name, size):
+        """
+        Réserve `size` valeurs dans la transaction courante
+
+        Les valeurs sont rendues à la séquence si la transaction est annulée :
+        elles ne doivent servir qu'aux objets écrits dans cette transaction.
+        """
+        return cls._increment(connection, name, size)
+
+    @classmethod
+    def _increment(cls, using, name, size):
+        # Incrément et lecture en une seule instruction (UPDATE ... RETURNING)
+        table = using.ops.quote_name(cls._meta.db_table)
+        with using.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (name, next_value, salt) VALUES (%s, 0, %s) "
+                f"ON CONFLICT (name) DO NOTHING",
+                [name, secrets.token_hex()]
+            )
+            cursor.execute(
+                f"UPDATE {table} SET next_value = next_value + %s WHERE name = %s "
+                f"RETURNING next_value, salt",
+                [size, name]
+            )
+            end, salt = cursor.fetchone()
+        return end - size, end, salt
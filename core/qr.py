@@ -0,0 +1,117 @@
+# core/qr.py
+"""
+Rendu des QR codes en arrière-plan.
+
+Les modèles utilisant QRCodeMixin mettent leurs objets en file après la
+validation de la transaction ; un pool de threads rend les PNG et enregistre
+le chemin. Les fichiers étant adressés par le contenu (QRCodeMixin.qr_path),
+un token déjà rendu n'est jamais ré-encodé. Si un QR code est demandé avant
+la fin du rendu, QRCodeMixin.ensure_qr_code() le génère à la demande.
+"""
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import qrcode
+import qrcode.image.svg
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils.http import parse_etags
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.G_TRAVEL_CONFIG.get('QR_RENDER_WORKERS', 2),
+                thread_name_prefix='qr-render',
+            )
+        return _executor
+
+
+def _render(label, pk):
+    try:
+        close_old_connections()
+        model = apps.get_model(label)
+        instance = model._base_manager.filter(pk=pk).only('pk', 'qr_token', 'qr_image').first()
+        if instance:
+            instance.ensure_qr_code()
+    except Exception:
+        logger.exception("Échec du rendu du QR code %s %s", label, pk)
+    finally:
+        with _pending_lock:
+            _pending.discard((label, pk))
+        close_old_connections()
+
+
+def _submit(label, pks):
+    if not settings.G_TRAVEL_CONFIG.get('QR_RENDER_ASYNC', True):
+        return
+    executor = _get_executor()
+    for pk in pks:
+        key = (label, pk)
+        with _pending_lock:
+            if key in _pending:
+                continue
+            _pending.add(key)
+        executor.submit(_render, label, pk)
+
+
+def enqueue_qr_codes(model, pks):
+    """Programme le rendu des QR codes des objets après validation de la transaction"""
+    pks = list(pks)
+    if pks:
+        label = model._meta.label
+        transaction.on_commit(lambda: _submit(label, pks))
+
+
+def enqueue_qr_code(instance):
+    """Programme le rendu du QR code d'un objet s'il n'en a pas encore"""
+    if not instance.qr_image and instance.qr_token:
+        enqueue_qr_codes(type(instance), [instance.pk])
+
+
+# =========================================================================
+# SERVICE HTTP DES QR CODES
+# =========================================================================
+
+QR_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+
+def qr_etag(data, variant):
+    """ETag fort : le QR code d'un token ne change jamais"""
+    digest = hashlib.sha256(f'{variant}:{data}'.encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def is_not_modified(request, etag):
+    """Indique si le client possède déjà la version identifiée par l'ETag"""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or etag in etags
+
+
+def render_qr_svg(data):
+    """QR code vectoriel généré en mémoire et mis en cache"""
+    key = f"qr_svg:{hashlib.sha256(str(data).encode()).hexdigest()}"
+    svg = cache.get(key)
+    if svg is None:
+        buffer = io.BytesIO()
+        qrcode.make(data, image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+        svg = buffer.getvalue()
+        cache.set(key, svg, 24 * 3600)
+    return svg
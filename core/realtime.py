@@ -0,0 +1,53 @@
+# core/realtime.py
+"""
+Diffusion temps réel vers les WebSockets (Django Channels).
+
+Les groupes suivent la forme trip.<id> et agency.<id>. Les messages sont
+envoyés après validation de la transaction en cours : un client ne reçoit
+jamais un changement qui a été annulé.
+"""
+import json
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_TYPE = 'realtime.message'
+
+
+def trip_group(trip_id):
+    return f'trip.{trip_id}'
+
+
+def agency_group(agency_id):
+    return f'agency.{agency_id}'
+
+
+def _send(groups, event, data):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    # Aller-retour JSON : UUID, dates et décimaux deviennent des types simples
+    # acceptés par toutes les couches (msgpack pour Redis)
+    message = {'type': MESSAGE_TYPE, 'event': event, 'data': json.loads(json.dumps(data, cls=DjangoJSONEncoder))}
+    for group in groups:
+        try:
+            async_to_sync(channel_layer.group_send)(group, message)
+        except Exception:
+            logger.exception("Échec de la diffusion %s vers %s", event, group)
+
+
+def broadcast(groups, event, data):
+    """Diffuse `event` aux groupes après validation de la transaction"""
+    groups = [group for group in dict.fromkeys(groups) if group]
+    if groups:
+        transaction.on_commit(lambda: _send(groups, event, data))
+
+
+def broadcast_trip(trip, event, data):
+    """Diffuse aux abonnés du voyage et de son agence"""
+    broadcast([trip_group(trip.pk), agency_group(trip.agency_id)], event, data)
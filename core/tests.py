@@ -1,3 +1,91 @@
-from django.test import TestCase
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase
 
-# Create your tests here.
+from .codes import ALPHABET, CodeGenerator, FeistelPermutation, is_luhn_valid, luhn_check_char
+from .models import CodeSequence
+
+
+class FeistelPermutationTests(SimpleTestCase):
+
+    def test_permutation_is_a_bijection(self):
+        for bits in (8, 9, 10, 11):
+            permutation = FeistelPermutation(bits, salt='test')
+            images = {permutation.permute(value) for value in range(1 << bits)}
+            self.assertEqual(images, set(range(1 << bits)), f"{bits} bits")
+
+    def test_salt_changes_the_permutation(self):
+        first = FeistelPermutation(10, salt='a')
+        second = FeistelPermutation(10, salt='b')
+        self.assertNotEqual(
+            [first.permute(value) for value in range(32)],
+            [second.permute(value) for value in range(32)]
+        )
+
+
+class LuhnCheckTests(SimpleTestCase):
+    body = '7K2M9QX4'
+
+    def test_check_char_is_valid(self):
+        self.assertTrue(is_luhn_valid(self.body + luhn_check_char(self.body)))
+
+    def test_detects_every_single_substitution(self):
+        code = self.body + luhn_check_char(self.body)
+        for position in range(len(code)):
+            for char in ALPHABET:
+                if char == code[position]:
+                    continue
+                typo = code[:position] + char + code[position + 1:]
+                self.assertFalse(is_luhn_valid(typo), typo)
+
+    def test_detects_adjacent_swaps_except_zero_and_z(self):
+        for first in ALPHABET:
+            for second in ALPHABET:
+                if first == second or {first, second} == {'0', 'Z'}:
+                    continue
+                body = f'1{first}{second}3'
+                swapped = f'1{second}{first}3'
+                self.assertFalse(is_luhn_valid(swapped + luhn_check_char(body)), swapped)
+
+    def test_rejects_characters_outside_the_alphabet(self):
+        self.assertFalse(is_luhn_valid('7K2M9QXI0'))
+
+
+class CodeGeneratorTests(TestCase):
+
+    def test_codes_are_unique_and_valid(self):
+        generator = CodeGenerator('test_unique', 'TST', width=6, block_size=50)
+        codes = generator.batch(300) + [generator.next() for _ in range(120)]
+        self.assertEqual(len(set(codes)), len(codes))
+        self.assertTrue(all(generator.is_valid(code) for code in codes))
+        self.assertTrue(all(len(code) == generator.length for code in codes))
+
+    def test_generators_sharing_a_sequence_do_not_collide(self):
+        first = CodeGenerator('test_shared', 'TST', width=6, block_size=10)
+        second = CodeGenerator('test_shared', 'TST', width=6, block_size=10)
+        codes = []
+        for _ in range(5):
+            codes += first.batch(7) + second.batch(7)
+        self.assertEqual(len(set(codes)), len(codes))
+
+    def test_block_allocation_is_refused_inside_a_transaction(self):
+        with transaction.atomic():
+            with self.assertRaises(RuntimeError):
+                CodeSequence.allocate_block('test_atomic', 10)
+
+    def test_rolled_back_block_is_not_reused(self):
+        first = CodeGenerator('test_rollback', 'TST', width=6, block_size=10)
+        second = CodeGenerator('test_rollback', 'TST', width=6, block_size=10)
+        try:
+            with transaction.atomic():
+                first.next()
+                raise ValueError
+        except ValueError:
+            pass
+        codes = first.batch(5) + second.batch(5)
+        self.assertEqual(len(set(codes)), len(codes))
+
+    def test_is_valid_rejects_wrong_prefix_and_length(self):
+        generator = CodeGenerator('test_valid', 'TST', width=6)
+        code = generator.next()
+        self.assertFalse(generator.is_valid('XYZ' + code[3:]))
+        self.assertFalse(generator.is_valid(code[:-1]))
@@ -99,6 +99,7 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'django_filters',
+    'channels',
 
     # Applications internes
     'core',
@@ -128,6 +129,7 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'g_voyage.urls'
 WSGI_APPLICATION = 'g_voyage.wsgi.application'
+ASGI_APPLICATION = 'g_voyage.asgi.application'
 
 # ---------------------------------------------------------------------
 # 8. Templates
@@ -440,25 +442,64 @@ G_TRAVEL_CONFIG = {
     'DEFAULT_CURRENCY': 'FCFA',
     'SUPPORT_PHONE': '+226 66 60 55 72',
     'SUPPORT_EMAIL': 'cyber.dev.226@gmail.com',
+    'SEARCH_INDEX_DAYS': 14,
+    'PLANNER_MIN_TRANSFER_MINUTES': 15,
+    'PLANNER_HORIZON_HOURS': 36,
+    'RESERVATION_SWEEPER_INTERVAL_SECONDS': 60,
+    'RESERVATION_SWEEPER_BATCH_SIZE': 500,
+    # Période minimale entre deux publications du nombre d'embarqués d'un voyage
+    'BOARDING_COUNT_PUBLISH_SECONDS': 5,
+    'QR_RENDER_ASYNC': True,
+    'QR_RENDER_WORKERS': 2,
+    # Clé privée Ed25519 des manifestes hors ligne (commande generate_scanner_key)
+    'SCANNER_MANIFEST_KEY': os.getenv('SCANNER_MANIFEST_KEY', ''),
+    'VEHICLE_POSITION_MAX_BATCH': 500,
+    'VEHICLE_POSITION_MAX_SKEW_SECONDS': 120,
+    'VEHICLE_POSITION_CACHE_SECONDS': 6 * 3600,
+    'VEHICLE_POSITION_RETENTION_DAYS': 90,
+    'TRIP_MATERIALIZATION_DAYS': 14,
+    'TRIP_MATERIALIZATION_ON_SAVE': True,
+    'TRIP_TURNAROUND_MINUTES': 60,
+    'PARCEL_HANDLING_MINUTES': 30,
+    'PARCEL_MIN_TRANSFER_MINUTES': 60,
+    'PARCEL_ROUTING_HORIZON_HOURS': 72,
+    'PARCEL_STATS_LIVE_DAYS': 7,
+    'PARCEL_STATS_ROLLUP_DAYS': 60,
 }
 
 # ---------------------------------------------------------------------
 # 20. Cache
 # ---------------------------------------------------------------------
-CACHES = {
+# Cache partagé entre processus (Redis) si REDIS_URL est défini ; le cache
+# mémoire local ne convient qu'à un processus unique (développement).
+REDIS_URL = os.getenv('REDIS_URL', '')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+        }
+    }
+
+# ---------------------------------------------------------------------
+# 21. Channels (WebSockets)
+# ---------------------------------------------------------------------
+# Couche Redis partagée : les diffusions des workers WSGI, des commandes et
+# du balayeur atteignent les clients de tous les processus daphne. La couche
+# en mémoire (g_voyage.test_settings) est réservée aux tests.
+CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {
+            'hosts': [REDIS_URL or 'redis://127.0.0.1:6379'],
+        },
     }
 }
-
-# Cache Redis pour la production:
-# CACHES = {
-#     'default': {
-#         'BACKEND': 'django_redis.cache.RedisCache',
-#         'LOCATION': 'redis://127.0.0.1:6379/1',
-#         'OPTIONS': {
-#             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
-#         }
-#     }
-# }
\ No newline at end of file
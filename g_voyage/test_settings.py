@@ -0,0 +1,17 @@
+"""
+Paramètres des tests : couche Channels et cache en mémoire, sans Redis
+"""
+from .settings import *  # noqa: F401,F403
+
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests',
+    }
+}
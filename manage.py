@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'g_voyage.settings')
+    # Les tests tournent sans Redis (voir g_voyage.test_settings)
+    default_settings = 'g_voyage.test_settings' if sys.argv[1:2] == ['test'] else 'g_voyage.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', default_settings)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
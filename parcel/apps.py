@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ParcelConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'parcel'
+
+    def ready(self):
+        from . import hooks, signals  # noqa: F401
@@ -0,0 +1,76 @@
+# parcel/hooks.py
+from django.utils import timezone
+
+from core.realtime import broadcast_trip
+
+from transport.lifecycle import on_transition
+from transport.models import Trip
+
+from .models import Parcel, ParcelRouteStep, ParcelTrackingSnapshot, TrackingEvent
+
+
+@on_transition(to_status=Trip.Status.IN_PROGRESS)
+def dispatch_loaded_parcels(context):
+    """Au départ, les colis chargés dans le véhicule passent en transit"""
+    trip = context.trip
+    now = timezone.now()
+    parcels = list(
+        Parcel.objects.filter(current_trip=trip, status=Parcel.Status.LOADED)
+        .values_list('pk', 'current_city_id')
+    )
+    if not parcels:
+        return
+
+    Parcel.objects.filter(pk__in=[pk for pk, _ in parcels]).update(
+        status=Parcel.Status.IN_TRANSIT,
+        current_agency=None,
+        updated=now
+    )
+    # Les colis qui vont au terminus du voyage prennent l'ETA du voyage
+    Parcel.objects.filter(
+        pk__in=[pk for pk, _ in parcels],
+        destination_city_id=trip.schedule.leg.destination_id
+    ).update(estimated_delivery=trip.get_estimated_arrival())
+    position = trip.get_current_location()
+    TrackingEvent.objects.bulk_create([
+        TrackingEvent(
+            parcel_id=pk,
+            event=TrackingEvent.Event.IN_TRANSIT,
+            status=Parcel.Status.IN_TRANSIT,
+            city_id=city_id,
+            trip=trip,
+            actor=context.user,
+            note="Colis en transit",
+            latitude=round(position['latitude'], 6) if position else None,
+            longitude=round(position['longitude'], 6) if position else None,
+            ts=now
+        )
+        for pk, city_id in parcels
+    ])
+    ParcelTrackingSnapshot.schedule_rebuild([pk for pk, _ in parcels])
+    broadcast_trip(trip, 'parcel.dispatched', {
+        'trip_id': trip.pk,
+        'parcel_ids': [pk for pk, _ in parcels],
+        'status': Parcel.Status.IN_TRANSIT,
+    })
+
+
+@on_transition(to_status=Trip.Status.CANCELLED)
+def drop_cancelled_routes(context):
+    """
+    Supprime les plans d'acheminement qui empruntent le voyage annulé
+
+    Les colis concernés redeviennent planifiables au prochain passage de
+    parcel.routing. Les colis déjà chargés restent à décharger par l'agent
+    (manifeste de déchargement).
+    """
+    parcel_ids = list(
+        ParcelRouteStep.objects.filter(trip=context.trip)
+        .values_list('parcel_id', flat=True).distinct()
+    )
+    if not parcel_ids:
+        return
+
+    ParcelRouteStep.objects.filter(parcel_id__in=parcel_ids).delete()
+    Parcel.objects.filter(pk__in=parcel_ids).update(estimated_delivery=None, updated=timezone.now())
+    ParcelTrackingSnapshot.schedule_rebuild(parcel_ids)
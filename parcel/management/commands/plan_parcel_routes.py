@@ -0,0 +1,24 @@
+# parcel/management/commands/plan_parcel_routes.py
+from django.core.management.base import BaseCommand
+
+from locations.models import Agency
+from parcel.routing import plan_parcels, routable_parcels
+
+
+class Command(BaseCommand):
+    help = "Planifie l'acheminement des colis en attente sur les voyages à venir"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agency', help="Identifiant de l'agence (toutes par défaut)")
+        parser.add_argument(
+            '--replan',
+            action='store_true',
+            help="Recalcule aussi les colis qui ont déjà un plan",
+        )
+
+    def handle(self, *args, **options):
+        agency = Agency.objects.get(pk=options['agency']) if options['agency'] else None
+        result = plan_parcels(routable_parcels(agency), replan=options['replan'])
+        for tracking_code in result['unrouted']:
+            self.stdout.write(self.style.WARNING(f'  - {tracking_code}: aucun voyage disponible'))
+        self.stdout.write(self.style.SUCCESS(f"{result['planned']} colis planifiés"))
@@ -0,0 +1,28 @@
+# parcel/management/commands/rollup_parcel_stats.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from parcel.statistics import build_daily_stats
+
+
+class Command(BaseCommand):
+    help = "Recalcule les statistiques journalières des colis par agence"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.G_TRAVEL_CONFIG.get('PARCEL_STATS_ROLLUP_DAYS', 60),
+            help="Nombre de jours recalculés, jusqu'à hier",
+        )
+
+    def handle(self, *args, **options):
+        end_date = timezone.localdate() - timedelta(days=1)
+        start_date = end_date - timedelta(days=options['days'] - 1)
+        count = build_daily_stats(start_date, end_date)
+        self.stdout.write(self.style.SUCCESS(
+            f'{count} statistiques journalières calculées du {start_date} au {end_date}'
+        ))
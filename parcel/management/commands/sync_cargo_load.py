@@ -0,0 +1,48 @@
+# parcel/management/commands/sync_cargo_load.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from parcel.models import Parcel
+from transport.models import Trip, TripCargoLoad
+
+
+class Command(BaseCommand):
+    help = "Recalcule le registre de fret des voyages en cours à partir des colis à bord"
+
+    def handle(self, *args, **options):
+        trips = Trip.objects.exclude(
+            status__in=[Trip.Status.CANCELLED, Trip.Status.COMPLETED]
+        ).select_related('vehicle')
+
+        totals = {
+            row['current_trip_id']: row
+            for row in Parcel.objects.filter(
+                current_trip__in=trips,
+                status__in=Parcel.ONBOARD_STATUSES
+            ).values('current_trip_id').annotate(
+                weight=Sum('weight_kg'),
+                volume=Sum('volume_cm3'),
+                count=Count('pk'),
+            )
+        }
+
+        now = timezone.now()
+        synced = 0
+        with transaction.atomic():
+            for trip in trips:
+                row = totals.get(trip.pk, {})
+                TripCargoLoad.objects.update_or_create(
+                    trip=trip,
+                    defaults={
+                        **TripCargoLoad._capacities(trip.vehicle),
+                        'weight_kg': row.get('weight') or 0,
+                        'volume_cm3': row.get('volume') or 0,
+                        'parcels': row.get('count') or 0,
+                        'updated': now,
+                    }
+                )
+                synced += 1
+
+        self.stdout.write(self.style.SUCCESS(f'{synced} registres de fret synchronisés'))
@@ -1,10 +1,19 @@
-from django.db import models
+import hashlib
+import json
+import re
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.core.cache import cache
 from core.models import TimeStampedModel, QRCodeMixin
+from core.codes import PARCEL_CODES
+from core.qr import enqueue_qr_code
+from core.realtime import agency_group, broadcast, trip_group
 from parameter.models import CompanyConfig
 
 
@@ -25,6 +34,7 @@ class Parcel(TimeStampedModel, QRCodeMixin):
     class Status(models.TextChoices):
         CREATED = "created", _("Enregistré")
         LOADED = "loaded", _("Chargé pour transport")
+        IN_TRANSIT = "in_transit", _("En transit")
         AT_AGENCY = "at_agency", _("Arrivé à l'agence")
         OUT_FOR_DELIVERY = "out_for_delivery", _("En livraison")
         DELIVERED = "delivered", _("Livré")
@@ -39,6 +49,9 @@ class Parcel(TimeStampedModel, QRCodeMixin):
         FRAGILE = "fragile", _("Fragile")
         OTHER = "other", _("Autre")
 
+    # Statuts pour lesquels le colis occupe la soute de son voyage
+    ONBOARD_STATUSES = [Status.LOADED, Status.IN_TRANSIT]
+
     # Informations de base - tracking_code généré automatiquement
     tracking_code = models.CharField(
         max_length=20, 
@@ -70,6 +83,7 @@ class Parcel(TimeStampedModel, QRCodeMixin):
     description = models.TextField(blank=True, verbose_name=_("Description du contenu"))
     weight_kg = models.DecimalField(max_digits=7, decimal_places=3, validators=[MinValueValidator(0)], verbose_name=_("Poids (kg)"))
     dimensions = models.CharField(max_length=100, blank=True, verbose_name=_("Dimensions (L x l x H)"))
+    volume_cm3 = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("Volume (cm³)"))
     declared_value = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name=_("Valeur déclarée"))
 
     # Tarification
@@ -110,8 +124,9 @@ class Parcel(TimeStampedModel, QRCodeMixin):
             models.Index(fields=["receiver_phone"]),
             models.Index(fields=["status"]),
             models.Index(fields=["current_agency"]),
-            models.Index(fields=["origin_agency"]),
-            models.Index(fields=["destination_agency"]),
+            # Statistiques par agence sur une période de création
+            models.Index(fields=["origin_agency", "created"]),
+            models.Index(fields=["destination_agency", "created"]),
         ]
 
     def __str__(self):
@@ -121,7 +136,7 @@ class Parcel(TimeStampedModel, QRCodeMixin):
         """Sauvegarde avec génération automatique des codes et calcul des prix"""
         # Génération du tracking_code si vide
         if not self.tracking_code:
-            self.tracking_code = self._generate_unique_tracking_code()
+            self.tracking_code = PARCEL_CODES.next()
         
         # Génération du QR token si vide
         if not self.qr_token:
@@ -130,6 +145,9 @@ class Parcel(TimeStampedModel, QRCodeMixin):
         # Calcul du prix total
         self._calculate_total_price()
         
+        # Volume calculé à partir des dimensions saisies
+        self.volume_cm3 = self.parse_volume_cm3(self.dimensions)
+        
         # Définition des villes si non spécifiées
         if not self.origin_city and self.origin_agency:
             self.origin_city = self.origin_agency.city
@@ -140,40 +158,28 @@ class Parcel(TimeStampedModel, QRCodeMixin):
         
         super().save(*args, **kwargs)
         
-        # Génération du QR code après sauvegarde
-        if not self.qr_image:
-            self.generate_qr_code()
+        # Rendu du QR code en arrière-plan après validation de la transaction
+        enqueue_qr_code(self)
 
     # =========================================================================
     # MÉTHODES DE GÉNÉRATION DE CODES UNIQUES
     # =========================================================================
 
-    def _generate_unique_tracking_code(self):
-        """
-        Génère un code de suivi unique avec vérification d'unicité
-        Format: PCL + YYMMDD + 6 caractères aléatoires
-        """
-        import secrets
-        import string
-        
-        max_attempts = 10
-        attempt = 0
-        
-        while attempt < max_attempts:
-            # Format: PCL230101 + 6 caractères aléatoires
-            date_part = timezone.now().strftime('%y%m%d')
-            random_part = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(6))
-            tracking_code = f"PCL{date_part}{random_part}"
-            
-            # Vérifier l'unicité
-            if not Parcel.objects.filter(tracking_code=tracking_code).exists():
-                return tracking_code
-            
-            attempt += 1
-        
-        # Fallback avec UUID si échec après plusieurs tentatives
-        fallback_code = f"PCL{timezone.now().strftime('%y%m%d')}{str(uuid.uuid4().int)[:8]}"
-        return fallback_code[:20]  # Truncate to max_length
+    # Dimensions saisies librement : "40x30x20", "40 x 30 x 20 cm", "0,4 x 0,3 x 0,2 m"
+    DIMENSION_UNITS = {'mm': 0.1, 'cm': 1, 'm': 100}
+
+    @classmethod
+    def parse_volume_cm3(cls, dimensions):
+        """Volume en cm³ à partir des dimensions (0 si illisibles)"""
+        values = re.findall(r'\d+(?:[.,]\d+)?', dimensions or '')
+        if len(values) != 3:
+            return 0
+        unit = re.search(r'(mm|cm|m)\b', dimensions.lower())
+        factor = cls.DIMENSION_UNITS[unit.group(1)] if unit else 1
+        volume = 1.0
+        for value in values:
+            volume *= float(value.replace(',', '.')) * factor
+        return round(volume)
 
     def _generate_qr_token(self):
         """Génère un token unique pour le QR code"""
@@ -260,8 +266,12 @@ class Parcel(TimeStampedModel, QRCodeMixin):
     def update_status(self, new_status, actor, agency=None, trip=None, note="", proof=None):
         """
         Met à jour le statut du colis et crée un événement de suivi
+
+        Raises:
+            ValueError: Si le voyage n'a plus la capacité de fret pour ce colis
         """
         old_status = self.status
+        old_trip_id = self.current_trip_id
         self.status = new_status
         self.current_agency = agency or self.current_agency
         self.current_trip = trip or self.current_trip
@@ -277,25 +287,66 @@ class Parcel(TimeStampedModel, QRCodeMixin):
             if proof:
                 self.delivery_proof = proof
         
-        self.save()
-
-        # Création de l'événement de suivi
-        TrackingEvent.objects.create(
-            parcel=self,
-            event=new_status,
-            status=new_status,
-            city=self.current_city,
-            agency=self.current_agency,
-            trip=self.current_trip,
-            actor=actor,
-            note=note,
-        )
+        # Statut, registre de fret et événement de suivi validés ensemble :
+        # un chargement refusé annule le changement de statut
+        position = self.current_trip.get_current_location() if self.current_trip else None
+        with transaction.atomic():
+            self._update_cargo_load(old_status, old_trip_id)
+            self.save()
+
+            # Événement de suivi, positionné sur le GPS du véhicule
+            TrackingEvent.objects.create(
+                parcel=self,
+                event=new_status,
+                status=new_status,
+                city=self.current_city,
+                agency=self.current_agency,
+                trip=self.current_trip,
+                actor=actor,
+                note=note,
+                latitude=round(position['latitude'], 6) if position else None,
+                longitude=round(position['longitude'], 6) if position else None,
+            )
 
         # Notification si nécessaire
         self._notify_status_change(old_status, new_status)
+        self._publish_status()
         
         return self
 
+    def _update_cargo_load(self, old_status, old_trip_id):
+        """
+        Reporte la montée ou la descente du colis sur le registre de fret
+        
+        Raises:
+            ValueError: Si le voyage n'a plus la capacité pour ce colis
+        """
+        from transport.models import TripCargoLoad
+        
+        was_onboard = old_status in self.ONBOARD_STATUSES and old_trip_id
+        is_onboard = self.status in self.ONBOARD_STATUSES and self.current_trip_id
+        if was_onboard and (not is_onboard or old_trip_id != self.current_trip_id):
+            TripCargoLoad.unload(old_trip_id, self.weight_kg, self.volume_cm3)
+        if is_onboard and (not was_onboard or old_trip_id != self.current_trip_id):
+            TripCargoLoad.load(self.current_trip, self.weight_kg, self.volume_cm3)
+
+    def _publish_status(self):
+        """Pousse le statut aux abonnés du voyage et de l'agence courants"""
+        broadcast(
+            [
+                trip_group(self.current_trip_id) if self.current_trip_id else None,
+                agency_group(self.current_agency_id) if self.current_agency_id else None,
+            ],
+            'parcel.status',
+            {
+                'parcel_id': self.pk,
+                'tracking_code': self.tracking_code,
+                'status': self.status,
+                'trip_id': self.current_trip_id,
+                'city_id': self.current_city_id,
+            }
+        )
+
     def mark_loaded(self, actor, trip, note=""):
         """Marque le colis comme chargé dans un véhicule"""
         return self.update_status(
@@ -355,6 +406,10 @@ class Parcel(TimeStampedModel, QRCodeMixin):
     # MÉTHODES DE SUIVI ET TRACABILITÉ
     # =========================================================================
 
+    def get_planned_route(self):
+        """Étapes d'acheminement planifiées, dans l'ordre"""
+        return self.route_steps.select_related('trip', 'from_city', 'to_city').order_by('sequence')
+
     def get_tracking_history(self):
         """Retourne l'historique complet de suivi du colis"""
         return self.events.all().order_by('ts')
@@ -373,7 +428,8 @@ class Parcel(TimeStampedModel, QRCodeMixin):
                 'type': 'in_transit',
                 'trip': str(self.current_trip),
                 'vehicle': self.current_trip.vehicle.plate,
-                'driver': self.current_trip.driver.get_full_name()
+                'driver': self.current_trip.driver.get_full_name(),
+                'position': self.current_trip.get_current_location()
             }
         else:
             return {
@@ -389,6 +445,15 @@ class Parcel(TimeStampedModel, QRCodeMixin):
         if self.status == self.Status.DELIVERED:
             return self.actual_delivery
         
+        # À bord d'un voyage vers la ville de destination : ETA du voyage
+        if self.current_trip_id and self.status in [self.Status.LOADED, self.Status.IN_TRANSIT]:
+            trip = self.current_trip
+            if trip.schedule.leg.destination_id == self.destination_city_id:
+                return trip.get_estimated_arrival()
+        
+        if self.estimated_delivery:
+            return self.estimated_delivery
+        
         # Logique d'estimation basée sur la distance et le statut
         base_estimation = self.created + timezone.timedelta(days=3)
         return base_estimation
@@ -502,26 +567,16 @@ class Parcel(TimeStampedModel, QRCodeMixin):
         return None
 
     @classmethod
-    def get_agency_statistics(cls, agency, start_date=None, end_date=None):
-        """Statistiques des colis pour une agence"""
-        if not start_date:
-            start_date = timezone.now().date() - timezone.timedelta(days=30)
-        if not end_date:
-            end_date = timezone.now().date()
-
-        parcels = cls.objects.filter(
-            models.Q(origin_agency=agency) | models.Q(destination_agency=agency),
-            created__date__range=[start_date, end_date]
-        )
+    def get_agency_statistics(cls, agency, start_date=None, end_date=None, use_rollups=False):
+        """
+        Statistiques des colis pour une agence (voir parcel.statistics)
 
-        return {
-            'total_parcels': parcels.count(),
-            'delivered': parcels.filter(status=cls.Status.DELIVERED).count(),
-            'in_transit': parcels.filter(status__in=[cls.Status.LOADED, cls.Status.AT_AGENCY]).count(),
-            'pending': parcels.filter(status=cls.Status.CREATED).count(),
-            'problems': parcels.filter(status__in=[cls.Status.LOST, cls.Status.RETURNED]).count(),
-            'total_revenue': parcels.aggregate(total=models.Sum('total_price'))['total'] or 0,
-        }
+        Args:
+            use_rollups (bool): Lire les jours anciens dans les agrégats journaliers
+        """
+        from .statistics import agency_statistics
+
+        return agency_statistics(agency, start_date, end_date, use_rollups=use_rollups)
 
     # =========================================================================
     # PROPRIÉTÉS UTILES
@@ -533,7 +588,7 @@ class Parcel(TimeStampedModel, QRCodeMixin):
 
     @property
     def is_in_transit(self):
-        return self.status in [self.Status.LOADED, self.Status.OUT_FOR_DELIVERY]
+        return self.status in [self.Status.LOADED, self.Status.IN_TRANSIT, self.Status.OUT_FOR_DELIVERY]
 
     @property
     def has_insurance(self):
@@ -550,6 +605,7 @@ class TrackingEvent(TimeStampedModel):
     class Event(models.TextChoices):
         CREATED = "created", _("Colis enregistré")
         LOADED = "loaded", _("Chargé pour transport")
+        IN_TRANSIT = "in_transit", _("En transit")
         AT_AGENCY = "at_agency", _("Arrivé à l'agence")
         OUT_FOR_DELIVERY = "out_for_delivery", _("En livraison")
         DELIVERED = "delivered", _("Livré")
@@ -631,4 +687,454 @@ class TrackingEvent(TimeStampedModel):
             actor=actor,
             note=note,
             photos=photos or []
-        )
\ No newline at end of file
+        )
+
+class ParcelRouteStep(models.Model):
+    """
+    Étape planifiée de l'acheminement d'un colis (voir parcel.routing).
+
+    Un colis peut emprunter plusieurs voyages successifs entre son agence
+    d'origine et son agence de destination ; chaque étape réserve le poids
+    du colis sur la capacité de fret du voyage.
+    """
+    parcel = models.ForeignKey(Parcel, on_delete=models.CASCADE, related_name="route_steps", verbose_name=_("Colis"))
+    sequence = models.PositiveSmallIntegerField(verbose_name=_("Ordre"))
+    trip = models.ForeignKey("transport.Trip", on_delete=models.CASCADE, related_name="parcel_route_steps", verbose_name=_("Voyage"))
+    from_city = models.ForeignKey("locations.City", on_delete=models.PROTECT, related_name="+", verbose_name=_("Ville de départ"))
+    to_city = models.ForeignKey("locations.City", on_delete=models.PROTECT, related_name="+", verbose_name=_("Ville d'arrivée"))
+    departure_dt = models.DateTimeField(verbose_name=_("Départ"))
+    arrival_dt = models.DateTimeField(verbose_name=_("Arrivée estimée"))
+    planned_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Planifié le"))
+
+    class Meta:
+        verbose_name = _("Étape d'acheminement")
+        verbose_name_plural = _("Étapes d'acheminement")
+        ordering = ["parcel", "sequence"]
+        unique_together = ("parcel", "sequence")
+        indexes = [
+            models.Index(fields=["trip"]),
+        ]
+
+    def __str__(self):
+        return f"{self.parcel_id} #{self.sequence}: {self.from_city_id} → {self.to_city_id}"
+
+class ParcelManifest(TimeStampedModel):
+    """
+    Liste de chargement ou de déchargement des colis d'un voyage.
+
+    L'agent constitue la liste (brouillon) puis la valide : tous les colis
+    changent de statut dans une seule transaction (bulk_update), leurs
+    événements de suivi sont insérés en lot et les expéditeurs reçoivent
+    une notification groupée.
+    """
+
+    class Kind(models.TextChoices):
+        LOAD = "load", _("Chargement")
+        UNLOAD = "unload", _("Déchargement")
+
+    class Status(models.TextChoices):
+        DRAFT = "draft", _("Brouillon")
+        COMMITTED = "committed", _("Validé")
+        CANCELLED = "cancelled", _("Annulé")
+
+    trip = models.ForeignKey("transport.Trip", on_delete=models.PROTECT, related_name="parcel_manifests", verbose_name=_("Voyage"))
+    agency = models.ForeignKey("locations.Agency", on_delete=models.PROTECT, related_name="parcel_manifests", verbose_name=_("Agence"))
+    kind = models.CharField(max_length=10, choices=Kind.choices, verbose_name=_("Type"))
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.DRAFT, verbose_name=_("Statut"))
+    note = models.CharField(max_length=255, blank=True, verbose_name=_("Note"))
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name="+", verbose_name=_("Créé par"))
+    committed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+", verbose_name=_("Validé par"))
+    committed_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Validé le"))
+    parcels = models.ManyToManyField(Parcel, through="ParcelManifestItem", related_name="manifests", verbose_name=_("Colis"))
+
+    class Meta:
+        verbose_name = _("Manifeste de colis")
+        verbose_name_plural = _("Manifestes de colis")
+        ordering = ["-created"]
+        indexes = [
+            models.Index(fields=["trip", "kind", "status"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} - {self.trip_id} ({self.get_status_display()})"
+
+    # Statuts des colis acceptés selon le type de manifeste
+    LOADABLE = [Parcel.Status.CREATED, Parcel.Status.AT_AGENCY]
+    UNLOADABLE = [Parcel.Status.LOADED, Parcel.Status.IN_TRANSIT]
+
+    def eligible_parcels(self):
+        """Colis pouvant figurer sur ce manifeste"""
+        if self.kind == self.Kind.LOAD:
+            # Un colis tout juste enregistré n'a pas encore d'agence courante
+            return Parcel.objects.filter(status__in=self.LOADABLE).filter(
+                models.Q(current_agency_id=self.agency_id)
+                | models.Q(current_agency__isnull=True, origin_agency_id=self.agency_id)
+            )
+        return Parcel.objects.filter(status__in=self.UNLOADABLE, current_trip_id=self.trip_id)
+
+    def add_parcels(self, tracking_codes):
+        """
+        Ajoute des colis au brouillon
+
+        Returns:
+            dict: {'added': [codes], 'rejected': [codes]}
+        """
+        if self.status != self.Status.DRAFT:
+            raise ValueError("Le manifeste n'est plus modifiable")
+
+        tracking_codes = {code.strip().upper() for code in tracking_codes}
+        parcels = dict(
+            self.eligible_parcels().filter(tracking_code__in=tracking_codes).values_list('tracking_code', 'pk')
+        )
+        ParcelManifestItem.objects.bulk_create(
+            [ParcelManifestItem(manifest=self, parcel_id=pk) for pk in parcels.values()],
+            ignore_conflicts=True
+        )
+        return {'added': sorted(parcels), 'rejected': sorted(tracking_codes - set(parcels))}
+
+    def remove_parcels(self, tracking_codes):
+        if self.status != self.Status.DRAFT:
+            raise ValueError("Le manifeste n'est plus modifiable")
+        deleted, _ = self.items.filter(
+            parcel__tracking_code__in=[code.strip().upper() for code in tracking_codes]
+        ).delete()
+        return deleted
+
+    def commit(self, actor):
+        """
+        Valide le manifeste : statut, événements et notifications en lot
+
+        Les colis qui ne sont plus éligibles (déjà chargés, déplacés entre
+        temps) sont ignorés et retirés de la liste.
+
+        Returns:
+            dict: {'committed': int, 'skipped': [codes]}
+
+        Raises:
+            ValueError: Si le manifeste n'est pas un brouillon ou si le
+                chargement dépasse la capacité de fret du voyage
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            manifest = ParcelManifest.objects.select_for_update(of=('self',)).select_related('agency', 'trip__vehicle').get(pk=self.pk)
+            if manifest.status != self.Status.DRAFT:
+                raise ValueError("Le manifeste a déjà été validé ou annulé")
+
+            listed = set(manifest.items.values_list('parcel_id', flat=True))
+            parcels = list(
+                manifest.eligible_parcels().select_for_update().filter(pk__in=listed)
+            )
+            skipped = listed - {parcel.pk for parcel in parcels}
+            skipped_codes = list(
+                Parcel.objects.filter(pk__in=skipped).values_list('tracking_code', flat=True)
+            )
+            manifest.items.filter(parcel_id__in=skipped).delete()
+
+            if manifest.kind == self.Kind.LOAD:
+                new_status, event, note = Parcel.Status.LOADED, TrackingEvent.Event.LOADED, "Colis chargé dans le véhicule"
+            else:
+                new_status, event, note = Parcel.Status.AT_AGENCY, TrackingEvent.Event.AT_AGENCY, "Colis arrivé à l'agence"
+
+            for parcel in parcels:
+                parcel.status = new_status
+                parcel.current_trip_id = manifest.trip_id
+                parcel.last_handled_by = actor
+                parcel.current_agency_id = manifest.agency_id
+                parcel.current_city_id = manifest.agency.city_id
+                parcel.updated = now
+            # Registre de fret : un seul UPDATE pour tout le manifeste
+            from transport.models import TripCargoLoad
+            weight = sum((parcel.weight_kg for parcel in parcels), Decimal(0))
+            volume = sum(parcel.volume_cm3 for parcel in parcels)
+            if parcels and manifest.kind == self.Kind.LOAD:
+                TripCargoLoad.load(manifest.trip, weight, volume, parcels=len(parcels))
+            elif parcels:
+                TripCargoLoad.unload(manifest.trip_id, weight, volume, parcels=len(parcels))
+
+            Parcel.objects.bulk_update(parcels, [
+                'status', 'current_trip', 'current_agency', 'current_city', 'last_handled_by', 'updated'
+            ], batch_size=500)
+
+            TrackingEvent.objects.bulk_create([
+                TrackingEvent(
+                    parcel=parcel,
+                    event=event,
+                    status=new_status,
+                    city_id=parcel.current_city_id,
+                    agency_id=manifest.agency_id,
+                    trip_id=manifest.trip_id,
+                    actor=actor,
+                    note=manifest.note or note,
+                    ts=now
+                )
+                for parcel in parcels
+            ], batch_size=500)
+
+            manifest.status = self.Status.COMMITTED
+            manifest.committed_by = actor
+            manifest.committed_at = now
+            manifest.save(update_fields=['status', 'committed_by', 'committed_at', 'updated'])
+
+            ParcelTrackingSnapshot.schedule_rebuild([parcel.pk for parcel in parcels])
+            transaction.on_commit(lambda: manifest._notify_senders(parcels))
+            broadcast(
+                [trip_group(manifest.trip_id), agency_group(manifest.agency_id)],
+                'parcel.manifest',
+                {
+                    'manifest_id': manifest.pk,
+                    'trip_id': manifest.trip_id,
+                    'kind': manifest.kind,
+                    'status': new_status,
+                    'parcel_ids': [parcel.pk for parcel in parcels],
+                }
+            )
+
+        self.status, self.committed_by, self.committed_at = manifest.status, actor, now
+        return {'committed': len(parcels), 'skipped': skipped_codes}
+
+    def _notify_senders(self, parcels):
+        """Une notification par expéditeur, insérées en une seule requête"""
+        from core.codes import NOTIFICATION_CODES
+        from publications.models import Notification
+
+        by_sender = {}
+        for parcel in parcels:
+            by_sender.setdefault(parcel.sender_id, []).append(parcel)
+        if not by_sender:
+            return
+
+        if self.kind == self.Kind.LOAD:
+            title = _("Colis chargé")
+            template = _("Votre colis {} a été chargé pour le transport")
+        else:
+            title = _("Colis arrivé")
+            template = _("Votre colis {} est arrivé à l'agence {}")
+
+        codes = NOTIFICATION_CODES.batch(len(by_sender))
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=sender_id,
+                title=title,
+                message=template.format(', '.join(parcel.tracking_code for parcel in sender_parcels), self.agency.name),
+                notification_type=Notification.Type.INFO,
+                related_parcel=sender_parcels[0] if len(sender_parcels) == 1 else None,
+                related_trip_id=self.trip_id,
+                notification_id=code,
+                should_send_sms=self.kind == self.Kind.UNLOAD
+            )
+            for (sender_id, sender_parcels), code in zip(by_sender.items(), codes)
+        ], batch_size=500)
+
+    def cancel(self):
+        if self.status != self.Status.DRAFT:
+            raise ValueError("Seul un brouillon peut être annulé")
+        self.status = self.Status.CANCELLED
+        self.save(update_fields=['status', 'updated'])
+
+
+class ParcelManifestItem(models.Model):
+    """Colis inscrit sur un manifeste"""
+    manifest = models.ForeignKey(ParcelManifest, on_delete=models.CASCADE, related_name="items", verbose_name=_("Manifeste"))
+    parcel = models.ForeignKey(Parcel, on_delete=models.CASCADE, related_name="manifest_items", verbose_name=_("Colis"))
+    added = models.DateTimeField(auto_now_add=True, verbose_name=_("Ajouté le"))
+
+    class Meta:
+        verbose_name = _("Colis du manifeste")
+        verbose_name_plural = _("Colis du manifeste")
+        unique_together = ("manifest", "parcel")
+
+    def __str__(self):
+        return f"{self.manifest_id} - {self.parcel_id}"
+
+class ParcelTrackingSnapshot(models.Model):
+    """
+    Document de suivi public précalculé d'un colis.
+
+    Le JSON servi par la page de suivi (statut, localisation, historique)
+    est construit une fois à chaque changement et stocké tel quel avec son
+    ETag. La lecture passe par le cache puis par cette table : aucune
+    jointure ni sérialisation n'est faite à la requête. Les données
+    personnelles du destinataire n'y figurent pas.
+
+    La position GPS du véhicule n'y est pas figée : elle est servie à part
+    (ParcelLiveTrackingView). L'arrivée estimée d'un colis à bord suit les
+    événements du voyage (départ, arrêts, arrivée), qui reconstruisent le
+    document.
+
+    Attributes:
+        tracking_code (str): Code de suivi
+        parcel (Parcel): Colis
+        document (str): JSON sérialisé
+        etag (str): Empreinte du document
+    """
+    tracking_code = models.CharField(max_length=20, primary_key=True, verbose_name=_("Code de suivi"))
+    parcel = models.OneToOneField(
+        Parcel,
+        on_delete=models.CASCADE,
+        related_name="tracking_snapshot",
+        verbose_name=_("Colis")
+    )
+    document = models.TextField(verbose_name=_("Document"))
+    etag = models.CharField(max_length=66, verbose_name=_("ETag"))
+    updated = models.DateTimeField(auto_now=True, verbose_name=_("Mis à jour le"))
+
+    class Meta:
+        verbose_name = _("Suivi public")
+        verbose_name_plural = _("Suivis publics")
+
+    def __str__(self):
+        return self.tracking_code
+
+    CACHE_TIMEOUT = 3600
+
+    @staticmethod
+    def _cache_key(tracking_code):
+        return f"parcel_tracking:{tracking_code}"
+
+    @staticmethod
+    def build_document(parcel):
+        """
+        Document de suivi public : colis et voyage en une requête jointe,
+        historique, puis arrivée estimée du voyage pour un colis à bord
+        """
+        parcel = Parcel.objects.select_related(
+            'origin_city', 'destination_city', 'current_city', 'current_agency',
+            'current_trip__schedule__leg'
+        ).get(pk=parcel.pk)
+        events = TrackingEvent.objects.filter(parcel_id=parcel.pk).order_by('ts').values(
+            'ts', 'event', 'city__name', 'agency__name', 'note'
+        )
+        event_labels = dict(TrackingEvent.Event.choices)
+
+        if parcel.current_agency_id:
+            location = {'type': 'agency', 'agency': parcel.current_agency.name, 'city': parcel.current_city.name}
+        elif parcel.current_trip_id:
+            location = {'type': 'in_transit', 'city': parcel.current_city.name}
+        else:
+            location = {'type': 'unknown', 'city': parcel.current_city.name}
+
+        return {
+            'tracking_code': parcel.tracking_code,
+            'status': parcel.status,
+            'status_display': str(parcel.get_status_display()),
+            'origin_city': parcel.origin_city.name,
+            'destination_city': parcel.destination_city.name,
+            'current_location': location,
+            'estimated_delivery': parcel.get_estimated_delivery_time(),
+            'actual_delivery': parcel.actual_delivery,
+            'timeline': [
+                {
+                    'ts': event['ts'],
+                    'event': event['event'],
+                    'event_display': str(event_labels.get(event['event'], event['event'])),
+                    'city': event['city__name'],
+                    'agency': event['agency__name'],
+                    'note': event['note'],
+                }
+                for event in events
+            ],
+        }
+
+    @classmethod
+    def rebuild(cls, parcel):
+        """
+        Reconstruit, enregistre et met en cache le document d'un colis
+
+        Returns:
+            tuple: (etag, document)
+        """
+        document = json.dumps(cls.build_document(parcel), cls=DjangoJSONEncoder, separators=(',', ':'))
+        etag = f'"{hashlib.sha256(document.encode()).hexdigest()[:32]}"'
+        cls.objects.update_or_create(
+            parcel_id=parcel.pk,
+            defaults={'tracking_code': parcel.tracking_code, 'document': document, 'etag': etag}
+        )
+        cache.set(cls._cache_key(parcel.tracking_code), (etag, document), cls.CACHE_TIMEOUT)
+        return etag, document
+
+    @classmethod
+    def rebuild_many(cls, parcel_ids):
+        for parcel in Parcel.objects.filter(pk__in=list(parcel_ids)).only('pk', 'tracking_code'):
+            cls.rebuild(parcel)
+
+    @classmethod
+    def schedule_rebuild(cls, parcel_ids):
+        """Reconstruit les documents après validation de la transaction"""
+        parcel_ids = list(parcel_ids)
+        if parcel_ids:
+            transaction.on_commit(lambda: cls.rebuild_many(parcel_ids))
+
+    @classmethod
+    def invalidate(cls, tracking_code):
+        """
+        Retire le document après validation de la transaction : il sera
+        reconstruit à la prochaine lecture, à partir des données validées
+        """
+        def drop():
+            cls.objects.filter(tracking_code=tracking_code).delete()
+            cache.delete(cls._cache_key(tracking_code))
+
+        transaction.on_commit(drop)
+
+    @classmethod
+    def schedule_rebuild_for_trip(cls, trip_id):
+        """Reconstruit les documents des colis à bord d'un voyage (arrivée estimée)"""
+        cls.schedule_rebuild(Parcel.objects.filter(
+            current_trip_id=trip_id,
+            status__in=Parcel.ONBOARD_STATUSES
+        ).values_list('pk', flat=True))
+
+    @classmethod
+    def get_document(cls, tracking_code):
+        """
+        Document de suivi : cache, puis table, puis construction
+
+        Returns:
+            tuple | None: (etag, document JSON) ou None si le code est inconnu
+        """
+        key = cls._cache_key(tracking_code)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        snapshot = cls.objects.filter(tracking_code=tracking_code).values_list('etag', 'document').first()
+        if snapshot is not None:
+            cache.set(key, snapshot, cls.CACHE_TIMEOUT)
+            return snapshot
+
+        parcel = Parcel.objects.filter(tracking_code=tracking_code).only('pk', 'tracking_code').first()
+        if parcel is None:
+            return None
+        return cls.rebuild(parcel)
+
+
+class ParcelDailyStat(models.Model):
+    """
+    Agrégat journalier des colis d'une agence (voir parcel.statistics).
+
+    Une ligne par (agence, jour de création) : les colis au départ et à
+    l'arrivée de l'agence, répartis par statut au moment du calcul.
+    """
+    agency = models.ForeignKey("locations.Agency", on_delete=models.CASCADE, related_name="parcel_daily_stats", verbose_name=_("Agence"))
+    day = models.DateField(verbose_name=_("Jour"))
+    total_parcels = models.PositiveIntegerField(default=0, verbose_name=_("Colis"))
+    delivered = models.PositiveIntegerField(default=0, verbose_name=_("Livrés"))
+    in_transit = models.PositiveIntegerField(default=0, verbose_name=_("En transit"))
+    pending = models.PositiveIntegerField(default=0, verbose_name=_("En attente"))
+    problems = models.PositiveIntegerField(default=0, verbose_name=_("Incidents"))
+    total_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name=_("Chiffre d'affaires"))
+    updated = models.DateTimeField(verbose_name=_("Calculé le"))
+
+    class Meta:
+        verbose_name = _("Statistique journalière des colis")
+        verbose_name_plural = _("Statistiques journalières des colis")
+        ordering = ["agency", "day"]
+        constraints = [
+            models.UniqueConstraint(fields=["agency", "day"], name="unique_parcel_daily_stat"),
+        ]
+        indexes = [
+            models.Index(fields=["day"]),
+        ]
+
+    def __str__(self):
+        return f"{self.agency_id} {self.day}: {self.total_parcels} colis"
@@ -0,0 +1,258 @@
+# parcel/routing.py
+"""
+Acheminement des colis sur les voyages planifiés.
+
+Les voyages à venir (générés à partir des horaires, voir
+transport.materialization) forment une liste de connexions triées par heure
+de départ. Un seul parcours de cette liste (connection scan) donne, depuis
+une ville, l'arrivée au plus tôt vers toutes les autres villes et le voyage
+d'arrivée de chacune : cet arbre est calculé une fois par ville de départ
+et partagé par tous les colis qui en partent.
+
+La capacité de fret restante (poids et volume) de chaque voyage est
+décomptée au fil de la planification. Quand le chemin d'un colis traverse
+un voyage trop chargé pour lui, l'arbre est recalculé en écartant ces
+voyages. Les colis puis les voyages planifiés sont verrouillés pendant le
+calcul : deux planifications simultanées ne réservent pas deux fois la
+même capacité.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from transport.models import LegTravelTime, Trip
+
+from .models import Parcel, ParcelRouteStep, ParcelTrackingSnapshot
+
+# Colis en attente d'acheminement
+ROUTABLE_STATUSES = [Parcel.Status.CREATED, Parcel.Status.AT_AGENCY]
+
+# Voyages sur lesquels un colis peut être planifié
+PLANNABLE_TRIP_STATUSES = [Trip.Status.PLANNED, Trip.Status.BOARDING]
+
+
+class CargoConnection:
+    """Voyage à venir vu comme une connexion entre deux villes"""
+    __slots__ = (
+        'trip_id', 'origin_id', 'destination_id', 'departure', 'arrival',
+        'remaining', 'remaining_volume'
+    )
+
+    def __init__(self, trip_id, origin_id, destination_id, departure, arrival, remaining, remaining_volume):
+        self.trip_id = trip_id
+        self.origin_id = origin_id
+        self.destination_id = destination_id
+        self.departure = departure
+        self.arrival = arrival
+        self.remaining = remaining
+        self.remaining_volume = remaining_volume
+
+    def fits(self, weight, volume):
+        return self.remaining >= weight and self.remaining_volume >= volume
+
+
+def load_connections(start, end):
+    """
+    Voyages partant entre start et end, triés par départ, avec leur
+    capacité de fret restante (poids et volume) : registre de fret du voyage
+    (colis à bord) moins les étapes planifiées dont le colis n'est pas
+    encore chargé
+
+    À appeler dans une transaction : les voyages sont verrouillés (par clé
+    croissante) jusqu'à l'enregistrement du plan.
+    """
+    trips = Trip.objects.filter(
+        departure_dt__range=(start, end),
+        status__in=PLANNABLE_TRIP_STATUSES
+    )
+    list(trips.select_for_update().order_by('pk').values_list('pk', flat=True))
+    trips = list(trips.values_list(
+        'pk', 'departure_dt', 'schedule__leg_id', 'schedule__leg__origin_id',
+        'schedule__leg__destination_id', 'schedule__leg__duration_minutes',
+        'vehicle__cargo_capacity_kg', 'vehicle__cargo_volume_m3',
+        'cargo_load__weight_capacity_kg', 'cargo_load__weight_kg',
+        'cargo_load__volume_capacity_cm3', 'cargo_load__volume_cm3'
+    ).order_by('departure_dt'))
+
+    planned = {
+        trip_id: (weight, volume)
+        for trip_id, weight, volume in ParcelRouteStep.objects.filter(
+            trip_id__in=[trip[0] for trip in trips]
+        ).exclude(
+            parcel__current_trip_id=F('trip_id'),
+            parcel__status__in=Parcel.ONBOARD_STATUSES
+        ).values('trip_id').annotate(
+            weight=Sum('parcel__weight_kg'),
+            volume=Sum('parcel__volume_cm3')
+        ).values_list('trip_id', 'weight', 'volume')
+    }
+
+    connections = []
+    travel_times = {}
+    for (trip_id, departure, leg_id, origin_id, destination_id, duration,
+         vehicle_capacity, vehicle_volume, capacity, loaded, volume_capacity, volume_loaded) in trips:
+        if leg_id not in travel_times:
+            travel_times[leg_id] = LegTravelTime.for_leg(leg_id)
+        minutes = travel_times[leg_id].get(str(destination_id), (duration,))[0]
+        planned_weight, planned_volume = planned.get(trip_id, (0, 0))
+        remaining = float(capacity if capacity is not None else vehicle_capacity)
+        remaining -= float(loaded or 0) + float(planned_weight or 0)
+        if volume_capacity is None:
+            volume_capacity = int(vehicle_volume * 1_000_000)
+        remaining_volume = volume_capacity - (volume_loaded or 0) - (planned_volume or 0)
+        connections.append(CargoConnection(
+            trip_id, origin_id, destination_id, departure,
+            departure + timedelta(minutes=minutes),
+            remaining, remaining_volume
+        ))
+    return connections
+
+
+def earliest_arrival_tree(connections, source_id, ready_at, min_capacity=0, min_volume=0):
+    """
+    Connection scan : voyage d'arrivée au plus tôt pour chaque ville
+
+    Les voyages sans poids disponible, ou qui ne peuvent pas prendre
+    min_capacity kg et min_volume cm³, sont écartés.
+
+    Returns:
+        dict: {city_id: CargoConnection}
+    """
+    transfer = timedelta(minutes=settings.G_TRAVEL_CONFIG.get('PARCEL_MIN_TRANSFER_MINUTES', 60))
+    earliest = {source_id: ready_at}
+    via = {}
+    for connection in connections:
+        if connection.remaining <= 0 or not connection.fits(min_capacity, min_volume):
+            continue
+        reached = earliest.get(connection.origin_id)
+        if reached is None:
+            continue
+        if connection.origin_id != source_id:
+            reached += transfer
+        if connection.departure < reached:
+            continue
+        best = earliest.get(connection.destination_id)
+        if best is None or connection.arrival < best:
+            earliest[connection.destination_id] = connection.arrival
+            via[connection.destination_id] = connection
+    return via
+
+
+def extract_path(via, source_id, destination_id):
+    """Voyages successifs de source à destination, ou None si injoignable"""
+    path = []
+    city_id = destination_id
+    while city_id != source_id:
+        connection = via.get(city_id)
+        if connection is None:
+            return None
+        path.append(connection)
+        city_id = connection.origin_id
+    path.reverse()
+    return path
+
+
+def routable_parcels(agency=None):
+    """Colis en agence qui ne sont pas encore dans leur ville de destination"""
+    parcels = Parcel.objects.filter(status__in=ROUTABLE_STATUSES).exclude(
+        destination_city_id=F('current_city_id')
+    )
+    if agency is not None:
+        parcels = parcels.filter(
+            Q(current_agency=agency) | Q(current_agency__isnull=True, origin_agency=agency)
+        )
+    return parcels
+
+
+def plan_parcels(parcels, replan=False, now=None):
+    """
+    Planifie l'acheminement d'un lot de colis en une passe
+
+    Les colis sont traités du plus ancien au plus récent ; un colis qui a
+    déjà un plan à venir sur un voyage encore planifiable est ignoré sauf
+    si replan=True (les étapes d'un voyage annulé ne comptent pas).
+
+    Returns:
+        dict: {'planned': int, 'unrouted': [tracking codes]}
+    """
+    config = settings.G_TRAVEL_CONFIG
+    now = now or timezone.now()
+    ready_at = now + timedelta(minutes=config.get('PARCEL_HANDLING_MINUTES', 30))
+    horizon = now + timedelta(hours=config.get('PARCEL_ROUTING_HORIZON_HOURS', 72))
+
+    if not replan:
+        parcels = parcels.exclude(pk__in=ParcelRouteStep.objects.filter(
+            departure_dt__gt=now,
+            trip__status__in=PLANNABLE_TRIP_STATUSES
+        ).values('parcel_id'))
+
+    with transaction.atomic():
+        # Colis verrouillés avant les voyages, toujours dans cet ordre
+        parcels = list(parcels.select_for_update(of=('self',)).only(
+            'pk', 'tracking_code', 'weight_kg', 'volume_cm3', 'current_city_id',
+            'destination_city_id', 'created'
+        ).order_by('pk'))
+        if not parcels:
+            return {'planned': 0, 'unrouted': []}
+        parcels.sort(key=lambda parcel: parcel.created)
+
+        # Les anciens plans libèrent leur capacité avant le calcul
+        ParcelRouteStep.objects.filter(parcel__in=parcels).delete()
+        connections = load_connections(now, horizon)
+
+        trees = {}
+        steps = []
+        planned = []
+        unrouted = []
+        for parcel in parcels:
+            weight = float(parcel.weight_kg)
+            volume = parcel.volume_cm3
+            source_id = parcel.current_city_id
+            if source_id not in trees:
+                trees[source_id] = earliest_arrival_tree(connections, source_id, ready_at)
+            path = extract_path(trees[source_id], source_id, parcel.destination_city_id)
+
+            if path and not all(connection.fits(weight, volume) for connection in path):
+                # Capacité épuisée en route : arbre recalculé pour ce colis,
+                # l'arbre partagé sera reconstruit au prochain colis
+                del trees[source_id]
+                path = extract_path(
+                    earliest_arrival_tree(
+                        connections, source_id, ready_at, min_capacity=weight, min_volume=volume
+                    ),
+                    source_id, parcel.destination_city_id
+                )
+
+            if not path:
+                unrouted.append(parcel.tracking_code)
+                continue
+
+            for sequence, connection in enumerate(path, start=1):
+                connection.remaining -= weight
+                connection.remaining_volume -= volume
+                steps.append(ParcelRouteStep(
+                    parcel=parcel,
+                    sequence=sequence,
+                    trip_id=connection.trip_id,
+                    from_city_id=connection.origin_id,
+                    to_city_id=connection.destination_id,
+                    departure_dt=connection.departure,
+                    arrival_dt=connection.arrival,
+                ))
+            parcel.estimated_delivery = path[-1].arrival
+            parcel.updated = now
+            planned.append(parcel)
+
+        ParcelRouteStep.objects.bulk_create(steps, batch_size=500)
+        Parcel.objects.bulk_update(planned, ['estimated_delivery', 'updated'], batch_size=500)
+        ParcelTrackingSnapshot.schedule_rebuild([parcel.pk for parcel in planned])
+
+    return {'planned': len(planned), 'unrouted': unrouted}
+
+
+def plan_agency_parcels(agency, replan=False):
+    """Planifie tous les colis en attente dans une agence"""
+    return plan_parcels(routable_parcels(agency), replan=replan)
@@ -1,7 +1,7 @@
 # parcel/serializers.py
 from rest_framework import serializers
 
-from .models import Parcel, TrackingEvent
+from .models import Parcel, ParcelManifest, ParcelRouteStep, TrackingEvent
 
 
 class ParcelSerializer(serializers.ModelSerializer):
@@ -84,4 +84,77 @@ class ParcelStatusUpdateSerializer(serializers.Serializer):
     status = serializers.ChoiceField(choices=Parcel.Status.choices)
     agency_id = serializers.IntegerField(required=False)
     trip_id = serializers.IntegerField(required=False)
-    note = serializers.CharField(required=False)
\ No newline at end of file
+    note = serializers.CharField(required=False)
+
+
+class ParcelManifestSerializer(serializers.ModelSerializer):
+    kind_display = serializers.CharField(source='get_kind_display', read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    tracking_codes = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ParcelManifest
+        fields = [
+            'id', 'trip', 'agency', 'kind', 'kind_display', 'status', 'status_display',
+            'note', 'created_by', 'committed_by', 'committed_at', 'tracking_codes',
+            'created', 'updated'
+        ]
+        read_only_fields = ['status', 'created_by', 'committed_by', 'committed_at']
+    
+    def validate_agency(self, value):
+        user = self.context['request'].user
+        if not user.is_admin() and not user.get_managed_agencies().filter(pk=value.pk).exists():
+            raise serializers.ValidationError("Agence non gérée par l'utilisateur")
+        return value
+    
+    def validate(self, data):
+        from transport.models import Trip
+        
+        trip, agency = data['trip'], data['agency']
+        if trip.status not in [Trip.Status.PLANNED, Trip.Status.BOARDING]:
+            raise serializers.ValidationError({'trip': "Le voyage doit être planifié ou en embarquement"})
+        leg = trip.schedule.leg
+        if trip.agency_id != agency.pk and agency.city_id not in (leg.origin_id, leg.destination_id):
+            raise serializers.ValidationError({'trip': "Le voyage ne dessert pas la ville de l'agence"})
+        return data
+    
+    def get_tracking_codes(self, obj):
+        return [item.parcel.tracking_code for item in obj.items.all()]
+
+
+class ManifestParcelsSerializer(serializers.Serializer):
+    tracking_codes = serializers.ListField(
+        child=serializers.CharField(max_length=20),
+        min_length=1,
+        max_length=1000
+    )
+
+
+class ParcelRouteStepSerializer(serializers.ModelSerializer):
+    from_city_name = serializers.CharField(source='from_city.name', read_only=True)
+    to_city_name = serializers.CharField(source='to_city.name', read_only=True)
+    trip_status = serializers.CharField(source='trip.status', read_only=True)
+    
+    class Meta:
+        model = ParcelRouteStep
+        fields = [
+            'sequence', 'trip', 'trip_status', 'from_city', 'from_city_name',
+            'to_city', 'to_city_name', 'departure_dt', 'arrival_dt', 'planned_at'
+        ]
+
+
+class ParcelRoutePlanSerializer(serializers.Serializer):
+    agency_id = serializers.UUIDField(required=False)
+    replan = serializers.BooleanField(required=False, default=False)
+
+
+class ParcelStatisticsQuerySerializer(serializers.Serializer):
+    agency_id = serializers.UUIDField(required=False)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    use_rollups = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, data):
+        if data.get('start_date') and data.get('end_date') and data['start_date'] > data['end_date']:
+            raise serializers.ValidationError("La date de début doit précéder la date de fin")
+        return data
@@ -0,0 +1,32 @@
+# parcel/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from transport.models import TripEvent
+
+from .models import Parcel, ParcelTrackingSnapshot, TrackingEvent
+
+ETA_EVENT_TYPES = [TripEvent.Type.DEPARTURE, TripEvent.Type.STOP, TripEvent.Type.ARRIVAL]
+
+
+@receiver(post_save, sender=Parcel)
+def refresh_tracking_on_parcel_save(sender, instance, created, **kwargs):
+    """Suivi public d'un colis : construit à la création, invalidé ensuite"""
+    if created:
+        ParcelTrackingSnapshot.schedule_rebuild([instance.pk])
+    else:
+        # Un changement de statut crée aussi un événement, qui reconstruit
+        # le document : ici une simple invalidation suffit
+        ParcelTrackingSnapshot.invalidate(instance.tracking_code)
+
+
+@receiver([post_save, post_delete], sender=TrackingEvent)
+def refresh_tracking_on_event(sender, instance, **kwargs):
+    ParcelTrackingSnapshot.schedule_rebuild([instance.parcel_id])
+
+
+@receiver(post_save, sender=TripEvent)
+def refresh_tracking_on_trip_progress(sender, instance, created, **kwargs):
+    """L'arrivée estimée des colis à bord change au départ, aux arrêts et à l'arrivée"""
+    if created and instance.event_type in ETA_EVENT_TYPES:
+        ParcelTrackingSnapshot.schedule_rebuild_for_trip(instance.trip_id)
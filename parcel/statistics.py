@@ -0,0 +1,154 @@
+# parcel/statistics.py
+"""
+Statistiques des colis par agence.
+
+Un colis compte pour son agence d'origine et pour son agence de
+destination. Toutes les catégories de statut et le chiffre d'affaires sont
+calculés en une seule requête d'agrégation conditionnelle, filtrée sur un
+intervalle [début, fin) de `created` qui utilise les index
+(agence, created).
+
+Pour les longues périodes, les jours anciens peuvent être lus dans les
+agrégats journaliers ParcelDailyStat (commande rollup_parcel_stats) ; seuls
+les PARCEL_STATS_LIVE_DAYS derniers jours sont alors calculés sur la table
+des colis. Les agrégats figent la répartition par statut au moment du
+calcul : la commande recalcule les PARCEL_STATS_ROLLUP_DAYS derniers jours
+à chaque passage.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Parcel, ParcelDailyStat
+
+# Catégories de statut : {clé: statuts}, None pour tous les colis
+STATUS_BUCKETS = {
+    'total_parcels': None,
+    'delivered': [Parcel.Status.DELIVERED],
+    'in_transit': [Parcel.Status.LOADED, Parcel.Status.IN_TRANSIT, Parcel.Status.AT_AGENCY],
+    'pending': [Parcel.Status.CREATED],
+    'problems': [Parcel.Status.LOST, Parcel.Status.RETURNED],
+}
+
+
+def _aggregates():
+    aggregates = {
+        key: Count('pk', filter=Q(status__in=statuses)) if statuses else Count('pk')
+        for key, statuses in STATUS_BUCKETS.items()
+    }
+    aggregates['total_revenue'] = Sum('total_price')
+    return aggregates
+
+
+def _bounds(start_date, end_date):
+    """Intervalle [début, fin) de datetimes couvrant les jours start_date..end_date"""
+    start = timezone.make_aware(datetime.combine(start_date, time.min))
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    return start, end
+
+
+def _empty():
+    stats = {key: 0 for key in STATUS_BUCKETS}
+    stats['total_revenue'] = 0
+    return stats
+
+
+def _add(stats, row):
+    for key in stats:
+        stats[key] += row.get(key) or 0
+    return stats
+
+
+def live_statistics(agency, start_date, end_date):
+    """Statistiques calculées sur la table des colis (une requête)"""
+    start, end = _bounds(start_date, end_date)
+    row = Parcel.objects.filter(
+        Q(origin_agency=agency) | Q(destination_agency=agency),
+        created__gte=start,
+        created__lt=end,
+    ).aggregate(**_aggregates())
+    return _add(_empty(), row)
+
+
+def rollup_statistics(agency, start_date, end_date):
+    """Statistiques lues dans les agrégats journaliers (une requête)"""
+    row = ParcelDailyStat.objects.filter(
+        agency=agency,
+        day__range=(start_date, end_date),
+    ).aggregate(**{key: Sum(key) for key in _empty()})
+    return _add(_empty(), row)
+
+
+def agency_statistics(agency, start_date=None, end_date=None, use_rollups=False):
+    """
+    Statistiques des colis d'une agence sur une période
+
+    Args:
+        agency (Agency): Agence concernée
+        start_date (date, optional): Premier jour (30 jours avant la fin par défaut)
+        end_date (date, optional): Dernier jour (aujourd'hui par défaut)
+        use_rollups (bool): Lire les jours anciens dans ParcelDailyStat
+
+    Returns:
+        dict: {total_parcels, delivered, in_transit, pending, problems, total_revenue}
+    """
+    end_date = end_date or timezone.localdate()
+    start_date = start_date or end_date - timedelta(days=30)
+    if start_date > end_date:
+        return _empty()
+    if not use_rollups:
+        return live_statistics(agency, start_date, end_date)
+
+    live_days = settings.G_TRAVEL_CONFIG.get('PARCEL_STATS_LIVE_DAYS', 7)
+    cutoff = timezone.localdate() - timedelta(days=live_days)
+    if end_date < cutoff:
+        return rollup_statistics(agency, start_date, end_date)
+    if start_date >= cutoff:
+        return live_statistics(agency, start_date, end_date)
+    return _add(
+        rollup_statistics(agency, start_date, cutoff - timedelta(days=1)),
+        live_statistics(agency, cutoff, end_date)
+    )
+
+
+def build_daily_stats(start_date, end_date):
+    """
+    Recalcule les agrégats journaliers de toutes les agences sur une période
+
+    Deux requêtes groupées par (agence, jour) : côté origine, puis côté
+    destination sans les colis dont l'origine est la même agence.
+
+    Returns:
+        int: Nombre de lignes écrites
+    """
+    start, end = _bounds(start_date, end_date)
+    parcels = Parcel.objects.filter(created__gte=start, created__lt=end)
+    sides = [
+        parcels.annotate(stat_agency_id=F('origin_agency_id')),
+        parcels.exclude(
+            destination_agency_id=F('origin_agency_id')
+        ).annotate(stat_agency_id=F('destination_agency_id')),
+    ]
+
+    totals = defaultdict(_empty)
+    for side in sides:
+        rows = side.annotate(day=TruncDate('created')).values(
+            'stat_agency_id', 'day'
+        ).annotate(**_aggregates()).order_by()
+        for row in rows:
+            _add(totals[row['stat_agency_id'], row['day']], row)
+
+    now = timezone.now()
+    rows = [
+        ParcelDailyStat(agency_id=agency_id, day=day, updated=now, **stats)
+        for (agency_id, day), stats in totals.items()
+    ]
+    with transaction.atomic():
+        ParcelDailyStat.objects.filter(day__range=(start_date, end_date)).delete()
+        ParcelDailyStat.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
@@ -1,3 +1,67 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone
 
-# Create your tests here.
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from .routing import CargoConnection, earliest_arrival_tree, extract_path
+
+BASE = datetime(2026, 1, 5, 6, 0, tzinfo=timezone.utc)
+
+
+def at(hours, minutes=0):
+    return BASE + timedelta(hours=hours, minutes=minutes)
+
+
+def connection(trip_id, origin, destination, departure, arrival, remaining=100, remaining_volume=10**6):
+    return CargoConnection(trip_id, origin, destination, departure, arrival, remaining, remaining_volume)
+
+
+@override_settings(G_TRAVEL_CONFIG={**settings.G_TRAVEL_CONFIG, 'PARCEL_MIN_TRANSFER_MINUTES': 60})
+class ConnectionScanTests(SimpleTestCase):
+
+    def route(self, connections, source, destination, ready_at=BASE, **capacity):
+        connections = sorted(connections, key=lambda item: item.departure)
+        tree = earliest_arrival_tree(connections, source, ready_at, **capacity)
+        path = extract_path(tree, source, destination)
+        return None if path is None else [step.trip_id for step in path]
+
+    def test_prefers_earliest_arrival_over_fewer_legs(self):
+        connections = [
+            connection('direct', 'A', 'C', at(2), at(12)),
+            connection('first', 'A', 'B', at(2), at(4)),
+            connection('second', 'B', 'C', at(5, 30), at(7)),
+        ]
+        self.assertEqual(self.route(connections, 'A', 'C'), ['first', 'second'])
+
+    def test_respects_minimum_transfer_time(self):
+        connections = [
+            connection('direct', 'A', 'C', at(2), at(12)),
+            connection('first', 'A', 'B', at(2), at(4)),
+            connection('tight', 'B', 'C', at(4, 30), at(6)),
+        ]
+        self.assertEqual(self.route(connections, 'A', 'C'), ['direct'])
+
+    def test_skips_departures_before_ready_time(self):
+        connections = [
+            connection('early', 'A', 'B', at(1), at(3)),
+            connection('late', 'A', 'B', at(5), at(8)),
+        ]
+        self.assertEqual(self.route(connections, 'A', 'B', ready_at=at(2)), ['late'])
+
+    def test_skips_full_trips_and_trips_too_small_for_the_parcel(self):
+        connections = [
+            connection('full', 'A', 'B', at(1), at(2), remaining=0),
+            connection('light', 'A', 'B', at(2), at(3), remaining=5),
+            connection('cramped', 'A', 'B', at(3), at(4), remaining_volume=1000),
+            connection('roomy', 'A', 'B', at(4), at(5)),
+        ]
+        self.assertEqual(self.route(connections, 'A', 'B'), ['light'])
+        self.assertEqual(
+            self.route(connections, 'A', 'B', min_capacity=10, min_volume=5000),
+            ['roomy']
+        )
+
+    def test_unreachable_destination_has_no_path(self):
+        connections = [connection('first', 'A', 'B', at(1), at(2))]
+        self.assertIsNone(self.route(connections, 'A', 'C'))
+        self.assertEqual(extract_path({}, 'A', 'A'), [])
@@ -6,7 +6,10 @@ from . import views
 router = DefaultRouter()
 router.register(r'parcels', views.ParcelViewSet, basename='parcel')
 router.register(r'tracking-events', views.TrackingEventViewSet, basename='tracking-event')
+router.register(r'parcel-manifests', views.ParcelManifestViewSet, basename='parcel-manifest')
 
 urlpatterns = [
+    path('tracking/<str:tracking_code>/', views.ParcelPublicTrackingView.as_view(), name='parcel-public-tracking'),
+    path('tracking/<str:tracking_code>/live/', views.ParcelLiveTrackingView.as_view(), name='parcel-live-tracking'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
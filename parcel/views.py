@@ -1,16 +1,22 @@
 # parcel/views.py
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
+from django.http import HttpResponse, HttpResponseNotModified
 from django.utils import timezone
 from django.db import models
 
-from .models import Parcel, TrackingEvent
+from .models import Parcel, ParcelManifest, ParcelTrackingSnapshot, TrackingEvent
 from .serializers import (
     ParcelSerializer, ParcelCreateSerializer, TrackingEventSerializer,
-    ParcelTrackingSerializer, ParcelStatusUpdateSerializer
+    ParcelStatusUpdateSerializer, ParcelManifestSerializer, ManifestParcelsSerializer,
+    ParcelRouteStepSerializer, ParcelRoutePlanSerializer, ParcelStatisticsQuerySerializer
 )
+from .routing import plan_agency_parcels
+from core.qr import is_not_modified
 from core.permissions import (
     IsAuthenticatedAndVerified, IsClient, IsLivreur,
     CanManageParcels, IsOwnerOrAgencyStaff, IsAgencyStaff,
@@ -18,6 +24,65 @@ from core.permissions import (
 )
 
 
+TRACKING_CACHE_CONTROL = 'public, max-age=30'
+LIVE_TRACKING_CACHE_CONTROL = 'public, max-age=10'
+
+
+def tracking_response(request, tracking_code):
+    """Réponse de suivi servie depuis le document précalculé, avec ETag"""
+    snapshot = ParcelTrackingSnapshot.get_document(tracking_code.strip().upper())
+    if snapshot is None:
+        return Response({'error': 'Colis non trouvé'}, status=status.HTTP_404_NOT_FOUND)
+    
+    etag, document = snapshot
+    if is_not_modified(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(document, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = TRACKING_CACHE_CONTROL
+    return response
+
+
+class ParcelPublicTrackingView(APIView):
+    """Suivi public d'un colis par son code (sans authentification)"""
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    
+    def get(self, request, tracking_code):
+        return tracking_response(request, tracking_code)
+
+
+class ParcelLiveTrackingView(APIView):
+    """
+    Position du véhicule et arrivée estimée d'un colis à bord (sans authentification)
+
+    Servi à part du document de suivi précalculé : ces données changent à
+    chaque point GPS et ne sont lues que depuis le cache des positions.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    
+    def get(self, request, tracking_code):
+        parcel = Parcel.objects.select_related('current_trip__schedule__leg').filter(
+            tracking_code=tracking_code.strip().upper()
+        ).first()
+        if parcel is None:
+            return Response({'error': 'Colis non trouvé'}, status=status.HTTP_404_NOT_FOUND)
+        
+        trip = parcel.current_trip
+        if trip is None or parcel.status not in Parcel.ONBOARD_STATUSES:
+            response = Response({'in_transit': False, 'position': None, 'estimated_delivery': None})
+        else:
+            response = Response({
+                'in_transit': True,
+                'position': trip.get_current_location(),
+                'estimated_delivery': parcel.get_estimated_delivery_time(),
+            })
+        response['Cache-Control'] = LIVE_TRACKING_CACHE_CONTROL
+        return response
+
+
 class ParcelViewSet(viewsets.ModelViewSet):
     queryset = Parcel.objects.all()
     filter_backends = [DjangoFilterBackend]
@@ -40,6 +105,8 @@ class ParcelViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAuthenticatedAndVerified, IsAdmin]
         elif self.action in ['update_status', 'mark_delivered']:
             permission_classes = [IsAuthenticatedAndVerified, CanManageParcels]
+        elif self.action in ['plan_routes', 'statistics']:
+            permission_classes = [IsAuthenticatedAndVerified, IsAgencyStaff]
         else:
             permission_classes = [IsAuthenticatedAndVerified, IsOwnerOrAgencyStaff]
         return [permission() for permission in permission_classes]
@@ -73,17 +140,57 @@ class ParcelViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def tracking(self, request, pk=None):
         parcel = self.get_object()
+        return tracking_response(request, parcel.tracking_code)
+    
+    @action(detail=True, methods=['get'])
+    def route(self, request, pk=None):
+        """Voyages planifiés pour acheminer le colis"""
+        parcel = self.get_object()
+        serializer = ParcelRouteStepSerializer(parcel.get_planned_route(), many=True)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'])
+    def plan_routes(self, request):
+        """Planifie l'acheminement de tous les colis en attente dans une agence"""
+        serializer = ParcelRoutePlanSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        agency_id = serializer.validated_data.get('agency_id') or request.user.agency_id
+        if not request.user.is_admin() and not request.user.get_managed_agencies().filter(pk=agency_id).exists():
+            return Response(
+                {'error': 'Agence non gérée par l\'utilisateur'},
+                status=status.HTTP_403_FORBIDDEN
+            )
         
-        tracking_data = {
-            'tracking_code': parcel.tracking_code,
-            'current_status': parcel.status,
-            'current_location': parcel.get_current_location(),
-            'timeline': [event.to_dict() for event in parcel.get_tracking_history()],
-            'estimated_delivery': parcel.estimated_delivery
-        }
+        from locations.models import Agency
+        agency = Agency.objects.filter(pk=agency_id).first()
+        if agency is None:
+            return Response({'error': 'Agence non trouvée'}, status=status.HTTP_404_NOT_FOUND)
         
-        serializer = ParcelTrackingSerializer(tracking_data)
-        return Response(serializer.data)
+        return Response(plan_agency_parcels(agency, replan=serializer.validated_data['replan']))
+    
+    @action(detail=False, methods=['get'])
+    def statistics(self, request):
+        """Statistiques des colis d'une agence sur une période"""
+        serializer = ParcelStatisticsQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        agency_id = data.get('agency_id') or request.user.agency_id
+        if not request.user.is_admin() and not request.user.get_managed_agencies().filter(pk=agency_id).exists():
+            return Response(
+                {'error': 'Agence non gérée par l\'utilisateur'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        from locations.models import Agency
+        agency = Agency.objects.filter(pk=agency_id).first()
+        if agency is None:
+            return Response({'error': 'Agence non trouvée'}, status=status.HTTP_404_NOT_FOUND)
+        
+        return Response(Parcel.get_agency_statistics(
+            agency, data.get('start_date'), data.get('end_date'), use_rollups=data['use_rollups']
+        ))
     
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
@@ -102,13 +209,16 @@ class ParcelViewSet(viewsets.ModelViewSet):
             from transport.models import Trip
             trip = Trip.objects.get(id=serializer.validated_data['trip_id'])
         
-        parcel.update_status(
-            serializer.validated_data['status'],
-            request.user,
-            agency,
-            trip,
-            serializer.validated_data.get('note', '')
-        )
+        try:
+            parcel.update_status(
+                serializer.validated_data['status'],
+                request.user,
+                agency,
+                trip,
+                serializer.validated_data.get('note', '')
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({'status': 'Statut mis à jour'})
     
@@ -140,15 +250,7 @@ class ParcelViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            parcel = Parcel.objects.get(tracking_code=tracking_code)
-            serializer = ParcelSerializer(parcel, context={'request': request})
-            return Response(serializer.data)
-        except Parcel.DoesNotExist:
-            return Response(
-                {'error': 'Colis non trouvé'}, 
-                status=status.HTTP_404_NOT_FOUND
-            )
+        return tracking_response(request, tracking_code)
     
     @action(detail=False, methods=['get'])
     def my_parcels(self, request):
@@ -201,4 +303,64 @@ class TrackingEventViewSet(viewsets.ReadOnlyModelViewSet):
                 managed_agencies = user.get_managed_agencies()
                 return queryset.filter(agency__in=managed_agencies)
         
-        return queryset
\ No newline at end of file
+        return queryset
+
+
+class ParcelManifestViewSet(viewsets.ModelViewSet):
+    """Chargement et déchargement des colis d'un voyage en lot"""
+    serializer_class = ParcelManifestSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['trip', 'agency', 'kind', 'status']
+    permission_classes = [IsAuthenticatedAndVerified, IsAgencyStaff]
+    http_method_names = ['get', 'post', 'head', 'options']
+    
+    def get_queryset(self):
+        queryset = ParcelManifest.objects.prefetch_related('items__parcel')
+        user = self.request.user
+        if not user.is_admin():
+            queryset = queryset.filter(agency__in=user.get_managed_agencies())
+        return queryset
+    
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+    
+    def _parcel_codes(self, request):
+        serializer = ManifestParcelsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['tracking_codes']
+    
+    @action(detail=True, methods=['post'])
+    def add_parcels(self, request, pk=None):
+        manifest = self.get_object()
+        try:
+            result = manifest.add_parcels(self._parcel_codes(request))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+    
+    @action(detail=True, methods=['post'])
+    def remove_parcels(self, request, pk=None):
+        manifest = self.get_object()
+        try:
+            removed = manifest.remove_parcels(self._parcel_codes(request))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'removed': removed})
+    
+    @action(detail=True, methods=['post'])
+    def commit(self, request, pk=None):
+        manifest = self.get_object()
+        try:
+            result = manifest.commit(request.user)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        manifest = self.get_object()
+        try:
+            manifest.cancel()
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': 'Manifeste annulé'})
@@ -8,10 +8,8 @@ from django.core.cache import cache
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
-import uuid
-import secrets
-import string
 from core.models import TimeStampedModel
+from core.codes import NOTIFICATION_CODES, SUPPORT_TICKET_CODES
 from parameter.models import CompanyConfig
 
 
@@ -515,25 +513,9 @@ class Notification(TimeStampedModel):
     def save(self, *args, **kwargs):
         """Sauvegarde avec génération automatique de l'ID"""
         if not self.notification_id:
-            self.notification_id = self._generate_notification_id()
+            self.notification_id = NOTIFICATION_CODES.next()
         super().save(*args, **kwargs)
 
-    def _generate_notification_id(self):
-        """Génère un ID de notification unique"""
-        max_attempts = 10
-        attempt = 0
-        
-        while attempt < max_attempts:
-            date_part = timezone.now().strftime('%y%m%d')
-            random_part = ''.join(secrets.choice(string.digits) for _ in range(6))
-            notification_id = f"NOT{date_part}{random_part}"
-            
-            if not Notification.objects.filter(notification_id=notification_id).exists():
-                return notification_id
-            attempt += 1
-        
-        return f"NOT{timezone.now().strftime('%y%m%d')}{str(uuid.uuid4().int)[:8]}"
-
     # =========================================================================
     # MÉTHODES DE GESTION DU STATUT
     # =========================================================================
@@ -846,25 +828,9 @@ class SupportTicket(TimeStampedModel):
     def save(self, *args, **kwargs):
         """Sauvegarde avec génération automatique du ticket_id"""
         if not self.ticket_id:
-            self.ticket_id = self._generate_ticket_id()
+            self.ticket_id = SUPPORT_TICKET_CODES.next()
         super().save(*args, **kwargs)
 
-    def _generate_ticket_id(self):
-        """Génère un ID de ticket unique"""
-        max_attempts = 10
-        attempt = 0
-        
-        while attempt < max_attempts:
-            date_part = timezone.now().strftime('%y%m%d')
-            random_part = ''.join(secrets.choice(string.digits) for _ in range(6))
-            ticket_id = f"TKT{date_part}{random_part}"
-            
-            if not SupportTicket.objects.filter(ticket_id=ticket_id).exists():
-                return ticket_id
-            attempt += 1
-        
-        return f"TKT{timezone.now().strftime('%y%m%d')}{str(uuid.uuid4().int)[:8]}"
-
     # =========================================================================
     # MÉTHODES DE GESTION DU STATUT
     # =========================================================================
@@ -0,0 +1,51 @@
+# reservations/hooks.py
+from functools import partial
+
+from django.db import transaction
+from django.utils.translation import gettext as _
+
+from transport.lifecycle import on_transition
+from transport.models import Trip
+
+from .models import Reservation, Ticket
+from .scanning import build_ticket_filter
+
+
+@on_transition(to_status=Trip.Status.BOARDING, deferred=True)
+def prepare_boarding(context):
+    """Construit le filtre des tickets valides à l'ouverture de l'embarquement"""
+    build_ticket_filter(context.trip.pk)
+
+
+@on_transition(to_status=Trip.Status.IN_PROGRESS)
+def mark_missed_tickets(context):
+    """Tickets non scannés au départ : non embarqués"""
+    Ticket.process_missed_tickets_for_trip(context.trip, user=context.user)
+
+
+@on_transition(to_status=Trip.Status.CANCELLED)
+def cancel_bookings(context):
+    """Annule réservations en attente et tickets, rend les places puis prévient les voyageurs"""
+    buyer_ids = Reservation.cancel_for_trip(context.trip)
+    if buyer_ids:
+        transaction.on_commit(partial(notify_cancellation, context.trip, buyer_ids))
+
+
+def notify_cancellation(trip, buyer_ids):
+    """Prévient les détenteurs des tickets annulés (après validation)"""
+    from core.codes import NOTIFICATION_CODES
+    from publications.models import Notification
+
+    codes = NOTIFICATION_CODES.batch(len(buyer_ids))
+    Notification.objects.bulk_create([
+        Notification(
+            user_id=buyer_id,
+            title=_("Voyage annulé"),
+            message=_("Votre voyage du {} a été annulé").format(trip.departure_dt.strftime('%d/%m/%Y %H:%M')),
+            notification_type=Notification.Type.ALERT,
+            related_trip=trip,
+            notification_id=code,
+            should_send_sms=True
+        )
+        for buyer_id, code in zip(buyer_ids, codes)
+    ])
@@ -0,0 +1,42 @@
+# reservations/management/commands/expire_reservations.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from reservations.models import Reservation
+from reservations.sweeper import run_sweeper
+
+
+class Command(BaseCommand):
+    help = "Expire les réservations en attente dont le délai est dépassé et libère leurs places"
+
+    def add_arguments(self, parser):
+        config = settings.G_TRAVEL_CONFIG
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=config.get('RESERVATION_SWEEPER_BATCH_SIZE', 500),
+            help="Nombre de réservations expirées par transaction",
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help="Tourner en continu au lieu d'un passage unique",
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=config.get('RESERVATION_SWEEPER_INTERVAL_SECONDS', 60),
+            help="Secondes entre deux passages avec --loop",
+        )
+
+    def handle(self, *args, **options):
+        if options['loop']:
+            self.stdout.write(f"Expiration des réservations toutes les {options['interval']}s (Ctrl+C pour arrêter)")
+            try:
+                run_sweeper(options['interval'], options['batch_size'])
+            except KeyboardInterrupt:
+                pass
+            return
+
+        expired = Reservation.expire_overdue(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{expired} réservations expirées'))
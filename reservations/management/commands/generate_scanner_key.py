@@ -0,0 +1,21 @@
+# reservations/management/commands/generate_scanner_key.py
+import base64
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.serialization import Encoding, NoEncryption, PrivateFormat, PublicFormat
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Génère une paire de clés Ed25519 pour signer les manifestes d'embarquement"
+
+    def handle(self, *args, **options):
+        key = Ed25519PrivateKey.generate()
+        private = key.private_bytes(Encoding.Raw, PrivateFormat.Raw, NoEncryption())
+        public = key.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+
+        self.stdout.write(f'SCANNER_MANIFEST_KEY={base64.b64encode(private).decode()}')
+        self.stdout.write(f'  - clé publique des scanners : {base64.b64encode(public).decode()}')
+        self.stdout.write(self.style.WARNING(
+            'La clé privée reste sur le serveur ; seule la clé publique est installée sur les scanners'
+        ))
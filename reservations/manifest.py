@@ -0,0 +1,139 @@
+# reservations/manifest.py
+"""
+Manifeste d'embarquement hors ligne.
+
+Un manifeste liste, pour un voyage, les tickets que le scanner doit pouvoir
+valider sans réseau. Il est encodé en msgpack et signé en Ed25519 : le
+serveur détient la clé privée (G_TRAVEL_CONFIG['SCANNER_MANIFEST_KEY'],
+commande generate_scanner_key), les scanners seulement la clé publique.
+Sa version est la date de dernière modification (en millisecondes) des
+tickets du voyage, ce qui permet au scanner de ne demander que les
+changements intervenus depuis la version qu'il détient.
+
+Format (msgpack) :
+    {
+        'trip': str, 'departure': int (ms), 'trip_status': str,
+        'version': int, 'since': int | None,
+        'tickets': [[ticket_code, qr_token, seat_number, status], ...],
+        'codes': [ticket_code, ...] | None,
+        'filter': {'size': int, 'hashes': int, 'bits': bytes}
+    }
+
+Dans un manifeste différentiel (since), `codes` liste tous les tickets
+actuellement sur le voyage : le scanner retire ceux qui n'y figurent plus
+(tickets déplacés sur un autre voyage).
+
+Le filtre de Bloom (core.bloom) couvre tous les codes de tickets valides du
+voyage (en majuscules) : le scanner rejette localement les codes saisis
+erronés. Les tokens des QR codes sont vérifiés sur la liste des tickets.
+"""
+import base64
+from datetime import datetime, timezone as dt_timezone
+
+import msgpack
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Count, Max
+
+from .models import Ticket
+from .scanning import get_ticket_filter
+
+CONTENT_TYPE = 'application/msgpack'
+SIGNATURE_ALGORITHM = 'Ed25519'
+
+
+def _to_ms(value):
+    return int(value.timestamp() * 1000) if value else 0
+
+
+def _from_ms(value):
+    return datetime.fromtimestamp(value / 1000, tz=dt_timezone.utc)
+
+
+def _private_key():
+    """
+    Clé de signature des manifestes (32 octets en base64)
+
+    Raises:
+        ImproperlyConfigured: Si la clé n'est pas définie ou illisible
+    """
+    key = settings.G_TRAVEL_CONFIG.get('SCANNER_MANIFEST_KEY')
+    if not key:
+        raise ImproperlyConfigured("SCANNER_MANIFEST_KEY n'est pas défini (voir generate_scanner_key)")
+    try:
+        return Ed25519PrivateKey.from_private_bytes(base64.b64decode(key))
+    except ValueError as e:
+        raise ImproperlyConfigured(f"SCANNER_MANIFEST_KEY invalide: {e}")
+
+
+def public_key():
+    """Clé publique de vérification, en base64, à installer sur les scanners"""
+    raw = _private_key().public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+    return base64.b64encode(raw).decode()
+
+
+def sign(payload):
+    return base64.b64encode(_private_key().sign(payload)).decode()
+
+
+def verify(payload, signature):
+    try:
+        _private_key().public_key().verify(base64.b64decode(signature), payload)
+    except (InvalidSignature, ValueError):
+        return False
+    return True
+
+
+def get_etag(trip, since=None):
+    """
+    ETag du manifeste : version et nombre de tickets du voyage (une requête)
+
+    Le nombre de tickets change quand un ticket quitte le voyage, ce que la
+    date de dernière modification des tickets restants ne reflète pas.
+    """
+    state = Ticket.objects.filter(trip=trip).aggregate(latest=Max('updated'), count=Count('pk'))
+    return f'"{trip.pk}:{_to_ms(state["latest"])}:{state["count"]}:{since or 0}"'
+
+
+def build_manifest(trip, since=None):
+    """
+    Construit le manifeste signé d'un voyage
+
+    Args:
+        trip (Trip): Voyage concerné
+        since (int, optional): Version détenue par le scanner ; seuls les
+            tickets modifiés depuis sont inclus
+
+    Returns:
+        tuple: (payload msgpack, version, signature)
+
+    Raises:
+        ImproperlyConfigured: Si la clé de signature n'est pas définie
+    """
+    tickets = Ticket.objects.filter(trip=trip)
+    codes = list(tickets.values_list('ticket_code', flat=True)) if since else None
+    if since:
+        tickets = tickets.filter(updated__gt=_from_ms(since))
+
+    rows = []
+    version = since or 0
+    for code, token, seat, status, updated in tickets.order_by('updated').values_list(
+        'ticket_code', 'qr_token', 'seat_number', 'status', 'updated'
+    ):
+        rows.append([code, token, seat, status])
+        version = max(version, _to_ms(updated))
+
+    payload = msgpack.packb({
+        'trip': str(trip.pk),
+        'departure': _to_ms(trip.departure_dt),
+        'trip_status': trip.status,
+        'version': version,
+        'since': since,
+        'tickets': rows,
+        'codes': codes,
+        'filter': get_ticket_filter(trip.pk).to_dict(),
+    }, use_bin_type=True)
+    return payload, version, sign(payload)
@@ -1,12 +1,14 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.core.cache import cache
 import uuid
-import secrets
-import string
 from core.models import TimeStampedModel, QRCodeMixin
+from core.codes import RESERVATION_CODES, TICKET_CODES
+from core.qr import enqueue_qr_code, enqueue_qr_codes
+from core.realtime import agency_group, broadcast, trip_group
+from .scanning import invalidate_ticket_filters
 from parameter.models import CompanyConfig
 
 
@@ -44,9 +46,18 @@ class Reservation(TimeStampedModel):
         verbose_name=_("Horaire")
     )
     travel_date = models.DateField(verbose_name=_("Date de voyage"))
+    trip = models.ForeignKey(
+        "transport.Trip",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="reservations",
+        verbose_name=_("Voyage")
+    )
     
     # Détails réservation
     total_seats = models.PositiveIntegerField(default=1, verbose_name=_("Nombre de places"))
+    seat_numbers = models.JSONField(default=list, blank=True, verbose_name=_("Sièges attribués"))
     total_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_("Prix total"))
     status = models.CharField(
         max_length=20, 
@@ -68,6 +79,7 @@ class Reservation(TimeStampedModel):
             models.Index(fields=["buyer"]),
             models.Index(fields=["status"]),
             models.Index(fields=["travel_date"]),
+            models.Index(fields=["status", "expires_at"]),
         ]
 
     def __str__(self):
@@ -76,7 +88,7 @@ class Reservation(TimeStampedModel):
     def save(self, *args, **kwargs):
         """Sauvegarde avec génération automatique du code"""
         if not self.code:
-            self.code = self._generate_unique_reservation_code()
+            self.code = RESERVATION_CODES.next()
         
         # Définir la date d'expiration si c'est une nouvelle réservation en attente
         if not self.pk and self.status == self.Status.PENDING:
@@ -85,31 +97,36 @@ class Reservation(TimeStampedModel):
         
         super().save(*args, **kwargs)
 
-    def _generate_unique_reservation_code(self):
-        """Génère un code de réservation unique"""
-        max_attempts = 10
-        attempt = 0
-        
-        while attempt < max_attempts:
-            date_part = timezone.now().strftime('%y%m%d')
-            random_part = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(4))
-            code = f"RSV{date_part}{random_part}"
-            
-            if not Reservation.objects.filter(code=code).exists():
-                return code
-            attempt += 1
-        
-        fallback_code = f"RSV{timezone.now().strftime('%y%m%d')}{str(uuid.uuid4().int)[:6]}"
-        return fallback_code[:12]
+    def _lock(self):
+        """Verrouille la ligne et recharge son état courant (dans une transaction)"""
+        self.refresh_from_db(from_queryset=type(self).objects.select_for_update())
 
     def confirm_reservation(self):
-        """Confirme la réservation"""
-        self.status = self.Status.CONFIRMED
-        self.expires_at = None
-        self.save()
+        """
+        Confirme la réservation
+
+        Raises:
+            ValueError: Si la réservation n'est plus en attente ou a expiré
+        """
+        from transport.models import TripSeatInventory
         
-        # Créer les tickets associés
-        self._create_tickets()
+        with transaction.atomic():
+            self._lock()
+            if self.status != self.Status.PENDING:
+                raise ValueError(f"Réservation non confirmable (statut: {self.get_status_display()})")
+            if self.expires_at and self.expires_at <= timezone.now():
+                raise ValueError("La réservation a expiré")
+            
+            self.status = self.Status.CONFIRMED
+            self.expires_at = None
+            self.save()
+            
+            # Les places bloquées deviennent vendues
+            if self.trip_id:
+                TripSeatInventory.sell_held(self.trip, self.total_seats)
+            
+            # Créer les tickets associés
+            self._create_tickets()
 
     def mark_paid(self):
         """Marque la réservation comme payée"""
@@ -118,41 +135,156 @@ class Reservation(TimeStampedModel):
         self.save()
 
     def cancel_reservation(self, reason=""):
-        """Annule la réservation"""
-        self.status = self.Status.CANCELLED
-        self.notes = f"{self.notes}\nAnnulé: {reason}".strip()
-        self.save()
-        
-        # Annuler les tickets associés
-        self.tickets.update(status=Ticket.Status.CANCELLED)
+        """
+        Annule la réservation
+
+        Raises:
+            ValueError: Si la réservation est déjà annulée ou expirée
+        """
+        with transaction.atomic():
+            self._lock()
+            previous_status = self.status
+            if previous_status not in [self.Status.PENDING, self.Status.CONFIRMED, self.Status.PAID]:
+                raise ValueError(f"Réservation non annulable (statut: {self.get_status_display()})")
+            
+            self.status = self.Status.CANCELLED
+            self.notes = f"{self.notes}\nAnnulé: {reason}".strip()
+            self.save()
+            self._release_seats(previous_status)
+            
+            # Annuler les tickets associés
+            self.tickets.update(status=Ticket.Status.CANCELLED, updated=timezone.now())
 
     def mark_expired(self):
         """Marque la réservation comme expirée"""
-        if self.status == self.Status.PENDING and self.expires_at and timezone.now() > self.expires_at:
-            self.status = self.Status.EXPIRED
-            self.save()
-            return True
+        with transaction.atomic():
+            self._lock()
+            if self.status == self.Status.PENDING and self.expires_at and timezone.now() > self.expires_at:
+                self.status = self.Status.EXPIRED
+                self.save()
+                self._release_seats(self.Status.PENDING)
+                return True
         return False
 
+    @classmethod
+    def expire_overdue(cls, batch_size=500, now=None):
+        """
+        Expire par lots les réservations en attente dont le délai est dépassé
+        
+        Chaque lot est verrouillé, passé en EXPIRED par un seul UPDATE et ses
+        places sont rendues aux voyages dans la même transaction.
+        
+        Args:
+            batch_size (int): Nombre de réservations par transaction
+            now (datetime, optional): Instant de référence
+            
+        Returns:
+            int: Nombre de réservations expirées
+        """
+        from transport.models import TripSeatInventory
+        
+        now = now or timezone.now()
+        expired = 0
+        
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    cls.objects.select_for_update(skip_locked=True).filter(
+                        status=cls.Status.PENDING,
+                        expires_at__lt=now
+                    ).order_by('expires_at').values(
+                        'pk', 'trip_id', 'total_seats', 'seat_numbers'
+                    )[:batch_size]
+                )
+                if not batch:
+                    break
+                
+                updated = cls.objects.filter(
+                    pk__in=[row['pk'] for row in batch],
+                    status=cls.Status.PENDING,
+                    expires_at__lt=now
+                ).update(status=cls.Status.EXPIRED, updated=timezone.now())
+                
+                releases = {}
+                for row in batch:
+                    if row['trip_id']:
+                        seats, seat_numbers = releases.get(row['trip_id'], (0, []))
+                        releases[row['trip_id']] = (
+                            seats + row['total_seats'],
+                            seat_numbers + list(row['seat_numbers'] or [])
+                        )
+                if releases:
+                    TripSeatInventory.release_batch(releases)
+                
+                expired += updated
+            
+            if len(batch) < batch_size:
+                break
+        
+        return expired
+
+    @classmethod
+    def cancel_for_trip(cls, trip):
+        """
+        Annule les réservations en attente et les tickets valides d'un voyage annulé
+
+        Les réservations confirmées ou payées gardent leur statut pour le
+        remboursement ; toutes les places du voyage sont rendues.
+
+        Returns:
+            set: Acheteurs dont un ticket a été annulé
+        """
+        from transport.models import TripSeatInventory
+        from .scanning import invalidate_ticket_filters
+
+        now = timezone.now()
+        with transaction.atomic():
+            pending = list(
+                cls.objects.select_for_update().filter(
+                    trip=trip,
+                    status=cls.Status.PENDING
+                ).order_by('pk').values_list('pk', flat=True)
+            )
+            cls.objects.filter(pk__in=pending).update(status=cls.Status.CANCELLED, updated=now)
+
+            tickets = Ticket.objects.filter(trip=trip, status=Ticket.Status.CONFIRMED)
+            buyer_ids = set(tickets.values_list('buyer_id', flat=True))
+            tickets.update(status=Ticket.Status.CANCELLED, updated=now)
+
+            TripSeatInventory.release_all(trip)
+        invalidate_ticket_filters([trip.pk])
+        return buyer_ids
+
+    def _release_seats(self, previous_status):
+        """Rend au voyage les places bloquées ou vendues par la réservation"""
+        from transport.models import TripSeatInventory
+        
+        if not self.trip_id:
+            return
+        if previous_status == self.Status.PENDING:
+            TripSeatInventory.release(self.trip, self.total_seats, seat_numbers=self.seat_numbers)
+        elif previous_status in [self.Status.CONFIRMED, self.Status.PAID]:
+            TripSeatInventory.release(self.trip, self.total_seats, sold=True, seat_numbers=self.seat_numbers)
+
     def _create_tickets(self):
         """Crée les tickets pour cette réservation"""
-        from transport.models import Trip
+        # Voyage fixé à la réservation, ou recherché pour les anciennes réservations
+        trip = self.trip or self.schedule.get_trip_for_date(self.travel_date)
         
-        # Trouver le voyage correspondant à la date
-        trip = Trip.objects.filter(
-            schedule=self.schedule,
-            departure_dt__date=self.travel_date
-        ).first()
+        seat_numbers = list(self.seat_numbers or [])
         
-        for i in range(self.total_seats):
-            Ticket.objects.create(
+        Ticket.bulk_issue([
+            Ticket(
                 reservation=self,
                 trip=trip,
                 buyer=self.buyer,
                 passenger_name=f"Passager {i+1}",
                 passenger_phone=self.buyer.phone,
+                seat_number=seat_numbers[i] if i < len(seat_numbers) else None,
                 status=Ticket.Status.CONFIRMED
             )
+            for i in range(self.total_seats)
+        ])
 
     def get_travel_details(self):
         """Retourne les détails du voyage"""
@@ -180,6 +312,9 @@ class Ticket(TimeStampedModel, QRCodeMixin):
         CANCELLED = "cancelled", _("Annulé")
         REFUNDED = "refunded", _("Remboursé")
 
+    # Délai d'embarquement après le départ prévu
+    BOARDING_GRACE_MINUTES = 30
+
     # Code unique généré automatiquement
     ticket_code = models.CharField(
         max_length=15,
@@ -259,41 +394,86 @@ class Ticket(TimeStampedModel, QRCodeMixin):
     def __str__(self):
         return f"{self.ticket_code} - {self.passenger_name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Voyage lu en base, pour invalider son filtre si le ticket en change
+        instance._loaded_trip_id = instance.__dict__.get('trip_id')
+        return instance
+
     def save(self, *args, **kwargs):
         """Sauvegarde avec génération automatique des codes"""
         if not self.ticket_code:
-            self.ticket_code = self._generate_unique_ticket_code()
+            self.ticket_code = TICKET_CODES.next()
         
         if not self.qr_token:
             self.qr_token = uuid.uuid4().hex
-            
+        
+        loaded_trip_id = getattr(self, '_loaded_trip_id', None)
+        creating = self._state.adding
         super().save(*args, **kwargs)
         
-        if not self.qr_image:
-            self.generate_qr_code()
+        # Nouveau ticket ou changement de voyage : filtres des deux voyages
+        if creating or loaded_trip_id != self.trip_id:
+            invalidate_ticket_filters([loaded_trip_id, self.trip_id])
+        self._loaded_trip_id = self.trip_id
+        
+        # Rendu du QR code en arrière-plan (ou à la demande, voir ensure_qr_code)
+        enqueue_qr_code(self)
 
-    def _generate_unique_ticket_code(self):
-        """Génère un code de ticket unique"""
-        max_attempts = 10
-        attempt = 0
+    @classmethod
+    def bulk_issue(cls, tickets):
+        """
+        Émet plusieurs tickets en une seule insertion
         
-        while attempt < max_attempts:
-            date_part = timezone.now().strftime('%y%m%d')
-            random_part = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(6))
-            code = f"TCK{date_part}{random_part}"
+        Les codes sont tirés en lot sans requête ; les QR codes sont rendus
+        en arrière-plan après validation de la transaction.
+        
+        Args:
+            tickets (list): Instances de Ticket non enregistrées
             
-            if not Ticket.objects.filter(ticket_code=code).exists():
-                return code
-            attempt += 1
+        Returns:
+            list: Tickets créés
+        """
+        if not tickets:
+            return []
+        
+        codes = TICKET_CODES.batch(len(tickets))
+        for ticket, code in zip(tickets, codes):
+            ticket.ticket_code = code
+            ticket.qr_token = ticket.qr_token or uuid.uuid4().hex
         
-        fallback_code = f"TCK{timezone.now().strftime('%y%m%d')}{str(uuid.uuid4().int)[:8]}"
-        return fallback_code[:15]
+        tickets = cls.objects.bulk_create(tickets)
+        invalidate_ticket_filters(ticket.trip_id for ticket in tickets)
+        enqueue_qr_codes(cls, [ticket.pk for ticket in tickets])
+        return tickets
 
     # =========================================================================
     # MÉTHODES DE SCAN ET EMBARQUEMENT
     # =========================================================================
 
-    def scan_ticket(self, scanned_by, scan_location=None):
+    # Relations chargées avec le ticket lors d'un scan (une seule requête)
+    SCAN_RELATED = (
+        'trip__schedule__leg__origin',
+        'trip__schedule__leg__destination',
+        'trip__vehicle',
+        'trip__driver',
+    )
+
+    @classmethod
+    def scan_by_code(cls, ticket_code, scanned_by, scan_location_id=None):
+        """
+        Scan rapide : une requête de lecture jointe puis une mise à jour conditionnelle
+        
+        Returns:
+            dict: Résultat du scan, ou None si le ticket n'existe pas
+        """
+        ticket = cls.objects.select_related(*cls.SCAN_RELATED).filter(ticket_code=ticket_code).first()
+        if ticket is None:
+            return None
+        return ticket.scan_ticket(scanned_by, scan_location_id=scan_location_id)
+
+    def scan_ticket(self, scanned_by, scan_location=None, scan_location_id=None):
         """
         Scan un ticket pour l'embarquement
         Retourne un dict avec le résultat du scan
@@ -306,7 +486,8 @@ class Ticket(TimeStampedModel, QRCodeMixin):
             'already_boarded': False,
             'trip_departed': False,
             'trip_completed': False,
-            'current_location': None
+            'current_location': None,
+            'trip_info': self.get_trip_info()
         }
 
         # Vérifier si le ticket est déjà embarqué
@@ -339,20 +520,39 @@ class Ticket(TimeStampedModel, QRCodeMixin):
             scan_result['message'] = _("Embarquement non autorisé à ce moment")
             return scan_result
 
-        # Marquer comme embarqué
+        # Marquer comme embarqué : la condition sur le statut rend la
+        # transition sûre si deux portes scannent le même ticket
+        if scan_location is not None:
+            scan_location_id = scan_location.pk
+        now = timezone.now()
+        boarded = Ticket.objects.filter(pk=self.pk, status=self.Status.CONFIRMED).update(
+            status=self.Status.BOARDED,
+            scanned_at=now,
+            scanned_by=scanned_by,
+            boarding_time=now,
+            scan_location_id=scan_location_id,
+            updated=now
+        )
+        if not boarded:
+            scan_result['already_boarded'] = True
+            scan_result['ticket_status'] = self.Status.BOARDED
+            scan_result['message'] = _("Ticket déjà embarqué")
+            return scan_result
+
         self.status = self.Status.BOARDED
-        self.scanned_at = timezone.now()
+        self.scanned_at = now
         self.scanned_by = scanned_by
-        self.boarding_time = timezone.now()
-        self.scan_location = scan_location
-        self.save()
+        self.boarding_time = now
+        self.scan_location_id = scan_location_id
 
         scan_result['success'] = True
         scan_result['message'] = _("Ticket embarqué avec succès")
         scan_result['ticket_status'] = self.Status.BOARDED
 
-        # Créer un événement d'embarquement
+        # Créer un événement d'embarquement ; le compteur agrégé n'est pas
+        # recalculé à chaque scan (voir throttle_boarding_counts)
         self._create_boarding_event(scanned_by)
+        Ticket.throttle_boarding_counts(self.trip_id)
 
         return scan_result
 
@@ -383,7 +583,7 @@ class Ticket(TimeStampedModel, QRCodeMixin):
         """Vérifie si le voyage est déjà parti"""
         if not self.trip:
             return False
-        return self.trip.status in ['boarding', 'in_progress', 'completed']
+        return self.trip.status in ['in_progress', 'completed']
 
     def _is_trip_completed(self):
         """Vérifie si le voyage est terminé"""
@@ -408,7 +608,151 @@ class Ticket(TimeStampedModel, QRCodeMixin):
         departure_time = self.trip.departure_dt
         current_time = timezone.now()
         
-        return current_time <= departure_time + timezone.timedelta(minutes=30)
+        return current_time <= departure_time + timezone.timedelta(minutes=self.BOARDING_GRACE_MINUTES)
+
+    @classmethod
+    def sync_offline_scans(cls, scans, scanned_by, trips=None):
+        """
+        Applique en lot des scans effectués hors ligne
+        
+        Un ticket scanné plusieurs fois n'est traité qu'une fois, avec son
+        scan le plus ancien. Les tickets et événements sont écrits avec
+        bulk_update / bulk_create.
+        
+        Args:
+            scans (list): Dicts {ticket_code, scanned_at, scan_location_id}
+            scanned_by (User): Agent ayant synchronisé le scanner
+            trips (QuerySet, optional): Voyages que l'agent peut contrôler ;
+                un ticket d'un autre voyage est traité comme introuvable
+            
+        Returns:
+            list: Résultat par ticket {ticket_code, result, status, message}
+        """
+        from transport.models import TripEvent
+        from locations.models import City
+        
+        earliest = {}
+        for scan in scans:
+            code = scan['ticket_code']
+            if code not in earliest or scan['scanned_at'] < earliest[code]['scanned_at']:
+                earliest[code] = scan
+        
+        now = timezone.now()
+        grace = timezone.timedelta(minutes=cls.BOARDING_GRACE_MINUTES)
+        location_ids = {scan.get('scan_location_id') for scan in earliest.values()} - {None}
+        known_locations = set(City.objects.filter(id__in=location_ids).values_list('id', flat=True))
+        
+        results = []
+        boarded = []
+        corrected = []
+        events = []
+        
+        with transaction.atomic():
+            candidates = cls.objects.select_for_update(of=('self',)).select_related('trip').filter(
+                ticket_code__in=list(earliest)
+            )
+            if trips is not None:
+                candidates = candidates.filter(trip__in=trips)
+            tickets = {ticket.ticket_code: ticket for ticket in candidates}
+            
+            for code, scan in earliest.items():
+                ticket = tickets.get(code)
+                scanned_at = scan['scanned_at']
+                location_id = scan.get('scan_location_id')
+                location_id = location_id if location_id in known_locations else None
+                
+                def result(outcome, message):
+                    results.append({
+                        'ticket_code': code,
+                        'result': outcome,
+                        'status': ticket.status if ticket else None,
+                        'message': str(message),
+                    })
+                
+                if ticket is None:
+                    result('not_found', _("Ticket non trouvé"))
+                elif scanned_at > now + grace:
+                    result('rejected', _("Horodatage de scan dans le futur"))
+                elif ticket.status == cls.Status.BOARDED:
+                    # Conflit entre scanners : on retient le scan le plus ancien
+                    if ticket.scanned_at is None or scanned_at < ticket.scanned_at:
+                        ticket.scanned_at = scanned_at
+                        ticket.boarding_time = scanned_at
+                        ticket.updated = now
+                        corrected.append(ticket)
+                    result('already_boarded', _("Ticket déjà embarqué"))
+                elif ticket.status not in [cls.Status.CONFIRMED, cls.Status.MISSED]:
+                    result('rejected', _("Ticket {}").format(ticket.get_status_display()))
+                elif not ticket.trip or ticket.trip.status == 'cancelled':
+                    result('rejected', _("Aucun voyage valide associé"))
+                elif scanned_at > ticket.trip.departure_dt + grace:
+                    result('rejected', _("Scan après la fermeture de l'embarquement"))
+                else:
+                    ticket.status = cls.Status.BOARDED
+                    ticket.scanned_at = scanned_at
+                    ticket.boarding_time = scanned_at
+                    ticket.scanned_by = scanned_by
+                    ticket.scan_location_id = location_id
+                    ticket.updated = now
+                    boarded.append(ticket)
+                    events.append(TripEvent(
+                        trip=ticket.trip,
+                        event_type=TripEvent.Type.PASSENGER_BOARDING,
+                        city_id=location_id,
+                        timestamp=scanned_at,
+                        note=f"Embarquement: {ticket.passenger_name} (Ticket: {ticket.ticket_code})",
+                        created_by=scanned_by
+                    ))
+                    result('boarded', _("Ticket embarqué avec succès"))
+            
+            cls.objects.bulk_update(boarded, [
+                'status', 'scanned_at', 'boarding_time', 'scanned_by', 'scan_location', 'updated'
+            ])
+            cls.objects.bulk_update(corrected, ['scanned_at', 'boarding_time', 'updated'])
+            TripEvent.objects.bulk_create(events)
+            # bulk_create n'envoie pas post_save : diffusion appelée comme le
+            # ferait le signal de transport
+            TripEvent.publish(events)
+            cls.publish_boarding_counts({ticket.trip_id for ticket in boarded})
+        
+        return results
+
+    @classmethod
+    def publish_boarding_counts(cls, trip_ids):
+        """Pousse aux abonnés le nombre d'embarqués par voyage (une requête agrégée)"""
+        trip_ids = [trip_id for trip_id in trip_ids if trip_id]
+        if not trip_ids:
+            return
+        counts = (
+            cls.objects.filter(trip_id__in=trip_ids)
+            .exclude(status__in=[cls.Status.CANCELLED, cls.Status.REFUNDED])
+            .values('trip_id', 'trip__agency_id')
+            .annotate(
+                boarded=models.Count('id', filter=models.Q(status=cls.Status.BOARDED)),
+                expected=models.Count('id'),
+            )
+        )
+        for row in counts:
+            broadcast(
+                [trip_group(row['trip_id']), agency_group(row['trip__agency_id'])],
+                'trip.boarding',
+                {'trip_id': row['trip_id'], 'boarded': row['boarded'], 'expected': row['expected']}
+            )
+
+    @classmethod
+    def throttle_boarding_counts(cls, trip_id):
+        """
+        Publie le nombre d'embarqués au plus une fois par période et par voyage
+
+        Entre deux publications, les abonnés reçoivent chaque embarquement
+        par l'événement PASSENGER_BOARDING du voyage et l'ajoutent au dernier
+        compte publié ; l'agrégat ne tourne donc pas à chaque scan.
+        """
+        if not trip_id:
+            return
+        period = settings.G_TRAVEL_CONFIG.get('BOARDING_COUNT_PUBLISH_SECONDS', 5)
+        if cache.add(f'trip_boarding_count_published:{trip_id}', True, period):
+            transaction.on_commit(lambda: cls.publish_boarding_counts([trip_id]))
 
     def _create_boarding_event(self, scanned_by):
         """Crée un événement d'embarquement"""
@@ -418,7 +762,7 @@ class Ticket(TimeStampedModel, QRCodeMixin):
             TripEvent.objects.create(
                 trip=self.trip,
                 event_type='passenger_boarding',
-                city=self.scan_location,
+                city_id=self.scan_location_id,
                 note=f"Embarquement: {self.passenger_name} (Ticket: {self.ticket_code})",
                 created_by=scanned_by
             )
@@ -443,20 +787,33 @@ class Ticket(TimeStampedModel, QRCodeMixin):
         return False
 
     @classmethod
-    def process_missed_tickets_for_trip(cls, trip):
+    def process_missed_tickets_for_trip(cls, trip, user=None):
         """
-        Traite tous les tickets non embarqués pour un voyage
+        Marque en une requête les tickets non embarqués d'un voyage parti
+        
+        Un seul événement MISSED_PASSENGERS résume le nombre de tickets
+        concernés.
+        
+        Returns:
+            int: Nombre de tickets marqués non embarqués
         """
-        missed_tickets = cls.objects.filter(
-            trip=trip,
-            status=cls.Status.CONFIRMED,
-            scanned_at__isnull=True
-        )
+        from transport.models import TripEvent
         
-        count = 0
-        for ticket in missed_tickets:
-            if ticket.auto_mark_missed():
-                count += 1
+        with transaction.atomic():
+            count = cls.objects.filter(
+                trip=trip,
+                status=cls.Status.CONFIRMED,
+                scanned_at__isnull=True
+            ).update(status=cls.Status.MISSED, updated=timezone.now())
+            
+            if count:
+                TripEvent.objects.create(
+                    trip=trip,
+                    event_type=TripEvent.Type.MISSED_PASSENGERS,
+                    city_id=trip.schedule.leg.origin_id,
+                    note=f"{count} passager(s) non embarqué(s) au départ",
+                    created_by=user
+                )
         
         return count
 
@@ -0,0 +1,123 @@
+# reservations/scanning.py
+"""
+Aides pour les portes d'embarquement : validation sans requête des lieux de
+scan et filtre de Bloom des tickets valides d'un voyage.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core.bloom import BloomFilter
+
+CITY_IDS_CACHE_KEY = 'scan_known_city_ids'
+TICKET_FILTER_TIMEOUT = 12 * 3600
+
+
+def known_city_ids():
+    """Identifiants des villes, en cache pour valider un lieu de scan sans requête"""
+    from locations.models import City
+
+    city_ids = cache.get(CITY_IDS_CACHE_KEY)
+    if city_ids is None:
+        city_ids = set(City.objects.values_list('id', flat=True))
+        cache.set(CITY_IDS_CACHE_KEY, city_ids, 600)
+    return city_ids
+
+
+# Caches propres au processus : un filtre reconstruit ailleurs n'invaliderait
+# pas celui-ci, le filtre n'y est donc jamais conservé
+LOCAL_CACHE_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def shared_cache():
+    """True si le cache par défaut est partagé entre les processus"""
+    return settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
+
+
+def _ticket_filter_version(trip_id):
+    """
+    Version du filtre d'un voyage, incrémentée à chaque invalidation
+
+    Initialisée à l'horodatage courant : si la clé expire ou est évincée, la
+    nouvelle version ne peut pas retomber sur un ancien filtre.
+    """
+    key = f'trip_ticket_filter_version:{trip_id}'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), TICKET_FILTER_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def _ticket_filter_key(trip_id, version):
+    return f'trip_ticket_filter:{trip_id}:{version}'
+
+
+def build_ticket_filter(trip_id):
+    """
+    Construit le filtre des codes et jetons QR valides d'un voyage, mis en cache si celui-ci est partagé
+
+    La version est lue avant les tickets : un filtre construit pendant une
+    invalidation est rangé sous l'ancienne version et n'est jamais relu.
+    """
+    from .models import Ticket
+
+    version = _ticket_filter_version(trip_id) if shared_cache() else None
+    codes = Ticket.objects.filter(
+        trip_id=trip_id,
+        status__in=[Ticket.Status.CONFIRMED, Ticket.Status.BOARDED, Ticket.Status.MISSED]
+    ).values_list('ticket_code', flat=True)
+
+    bloom = BloomFilter.from_values(list(codes))
+    if version is not None:
+        cache.set(_ticket_filter_key(trip_id, version), bloom.to_dict(), TICKET_FILTER_TIMEOUT)
+    return bloom
+
+
+def get_ticket_filter(trip_id):
+    """Filtre du voyage, construit à la première demande"""
+    if shared_cache():
+        data = cache.get(_ticket_filter_key(trip_id, _ticket_filter_version(trip_id)))
+        if data is not None:
+            return BloomFilter.from_dict(data)
+    return build_ticket_filter(trip_id)
+
+
+def invalidate_ticket_filters(trip_ids):
+    """
+    À appeler quand des tickets sont émis sur des voyages ou en changent
+
+    L'invalidation a lieu après validation de la transaction : un filtre
+    reconstruit entre-temps contiendrait les nouveaux tickets ou serait
+    rangé sous une version périmée.
+    """
+    trip_ids = {trip_id for trip_id in trip_ids if trip_id}
+    if not trip_ids or not shared_cache():
+        return
+
+    def bump():
+        for trip_id in trip_ids:
+            try:
+                cache.incr(f'trip_ticket_filter_version:{trip_id}')
+            except ValueError:
+                # Pas de version : aucun filtre n'est en cache pour ce voyage
+                pass
+
+    transaction.on_commit(bump)
+
+
+def is_definitely_invalid(trip_id, code):
+    """
+    True si le code ne peut pas être un ticket du voyage (aucune requête si le filtre est en cache)
+
+    Sans cache partagé le filtre n'est pas conservé : aucune lecture n'est
+    rejetée ici, le scan interroge directement la base.
+    """
+    if not shared_cache():
+        return False
+    return code not in get_ticket_filter(trip_id)
@@ -1,9 +1,18 @@
 # reservations/serializers.py
+import re
+
 from rest_framework import serializers
+from django.db import transaction
+from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 
+from core.codes import TICKET_CODES
+
 from .models import Reservation, Ticket, Payment
 
+# Jeton encodé dans le QR code des tickets (uuid4 hexadécimal)
+QR_TOKEN_PATTERN = re.compile(r'[0-9a-f]{32}')
+
 
 class ReservationSerializer(serializers.ModelSerializer):
     buyer_name = serializers.CharField(source='buyer.full_name', read_only=True)
@@ -15,10 +24,10 @@ class ReservationSerializer(serializers.ModelSerializer):
         model = Reservation
         fields = [
             'id', 'code', 'buyer', 'buyer_name', 'schedule', 'schedule_info',
-            'travel_date', 'total_seats', 'total_price', 'status', 'status_display',
+            'travel_date', 'trip', 'total_seats', 'seat_numbers', 'total_price', 'status', 'status_display',
             'expires_at', 'notes', 'travel_details', 'created', 'updated'
         ]
-        read_only_fields = ['code', 'status', 'expires_at']
+        read_only_fields = ['code', 'trip', 'seat_numbers', 'status', 'expires_at']
 
 
 class ReservationCreateSerializer(serializers.ModelSerializer):
@@ -31,17 +40,32 @@ class ReservationCreateSerializer(serializers.ModelSerializer):
         travel_date = attrs.get('travel_date')
         total_seats = attrs.get('total_seats', 1)
         
-        available_seats = schedule.get_available_seats(travel_date)
+        trip = schedule.get_trip_for_date(travel_date)
+        if trip is None:
+            raise serializers.ValidationError("Aucun voyage programmé à cette date")
+        
+        available_seats = trip.get_available_seats()
         if total_seats > available_seats:
             raise serializers.ValidationError(
                 f"Seulement {available_seats} sièges disponibles"
             )
         
+        attrs['trip'] = trip
         return attrs
     
     def create(self, validated_data):
+        from transport.models import TripSeatInventory
+        
         validated_data['buyer'] = self.context['request'].user
-        return super().create(validated_data)
+        with transaction.atomic():
+            # Contrôle définitif sous verrou : la lecture de validate() peut être dépassée
+            try:
+                validated_data['seat_numbers'] = TripSeatInventory.hold(
+                    validated_data['trip'], validated_data.get('total_seats', 1)
+                )
+            except ValueError as e:
+                raise serializers.ValidationError(str(e))
+            return super().create(validated_data)
 
 
 class TicketSerializer(serializers.ModelSerializer):
@@ -64,25 +88,49 @@ class TicketSerializer(serializers.ModelSerializer):
     
     def get_qr_code_url(self, obj):
         request = self.context.get('request')
-        if request and obj.qr_image:
+        if not request:
+            return None
+        if obj.qr_image:
             return request.build_absolute_uri(obj.qr_image.url)
-        return None
+        # QR code pas encore généré : il le sera à la première consultation
+        return request.build_absolute_uri(reverse('ticket-qr-code', args=[obj.pk]))
 
 
 class TicketScanSerializer(serializers.Serializer):
     ticket_code = serializers.CharField()
-    scan_location_id = serializers.IntegerField(required=False)
+    scan_location_id = serializers.UUIDField(required=False, allow_null=True)
+    trip_id = serializers.UUIDField(required=False, allow_null=True)
     
     def validate_ticket_code(self, value):
-        try:
-            ticket = Ticket.objects.get(ticket_code=value)
-        except Ticket.DoesNotExist:
-            raise serializers.ValidationError("Ticket non trouvé")
-        
-        self.context['ticket'] = ticket
+        # Jeton lu sur le QR code (hexadécimal minuscule) : gardé tel quel
+        value = value.strip()
+        if QR_TOKEN_PATTERN.fullmatch(value.lower()):
+            return value.lower()
+        # Faute de saisie détectée par le caractère de contrôle, sans requête ;
+        # les anciens codes (15 caractères) n'en ont pas
+        value = value.upper()
+        if len(value) == TICKET_CODES.length and not TICKET_CODES.is_valid(value):
+            raise serializers.ValidationError("Code de ticket invalide")
         return value
 
 
+class OfflineScanSerializer(serializers.Serializer):
+    ticket_code = serializers.CharField()
+    scanned_at = serializers.DateTimeField()
+    scan_location_id = serializers.UUIDField(required=False, allow_null=True)
+
+
+class ScanSyncSerializer(serializers.Serializer):
+    scans = OfflineScanSerializer(many=True, allow_empty=False, max_length=1000)
+
+
+class ScanSyncResultSerializer(serializers.Serializer):
+    ticket_code = serializers.CharField()
+    result = serializers.ChoiceField(choices=['boarded', 'already_boarded', 'rejected', 'not_found'])
+    status = serializers.CharField(allow_null=True)
+    message = serializers.CharField()
+
+
 class ScanResultSerializer(serializers.Serializer):
     success = serializers.BooleanField()
     message = serializers.CharField()
@@ -92,6 +140,7 @@ class ScanResultSerializer(serializers.Serializer):
     trip_departed = serializers.BooleanField()
     trip_completed = serializers.BooleanField()
     current_location = serializers.DictField(allow_null=True)
+    trip_info = serializers.DictField(allow_null=True, required=False)
 
 
 class PaymentSerializer(serializers.ModelSerializer):
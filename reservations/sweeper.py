@@ -0,0 +1,32 @@
+# reservations/sweeper.py
+"""
+Expiration périodique des réservations en attente.
+
+La boucle tourne dans un processus dédié (`manage.py expire_reservations
+--loop`), jamais dans le processus web : AppConfig.ready s'exécute pour
+chaque commande manage.py et deux fois sous l'autoreloader.
+"""
+import logging
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+def run_sweeper(interval, batch_size, stop_event=None):
+    """Boucle d'expiration : un passage toutes les `interval` secondes"""
+    from .models import Reservation
+
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        try:
+            close_old_connections()
+            expired = Reservation.expire_overdue(batch_size=batch_size)
+            if expired:
+                logger.info("%s réservations expirées", expired)
+        except Exception:
+            logger.exception("Échec de l'expiration des réservations")
+        finally:
+            close_old_connections()
+        stop_event.wait(interval)
@@ -3,17 +3,24 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.http import HttpResponse
+from django.http import HttpResponse, FileResponse, HttpResponseNotModified
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
 from django.utils import timezone
 import os
+import uuid
 from django.conf import settings
 
 from .models import Reservation, Ticket, Payment
+from . import manifest as boarding_manifest
+from .scanning import known_city_ids, is_definitely_invalid
 from .serializers import (
     ReservationSerializer, ReservationCreateSerializer,
     TicketSerializer, TicketScanSerializer, ScanResultSerializer,
+    ScanSyncSerializer, ScanSyncResultSerializer,
     PaymentSerializer, PaymentCreateSerializer
 )
+from core.qr import QR_CACHE_CONTROL, qr_etag, is_not_modified, render_qr_svg
 from core.permissions import (
     IsAuthenticatedAndVerified, IsClient, IsCaissier, IsOwnerOrStaff,
     CanScanTickets, IsOwnerOrAgencyStaff, IsCashierOrAgencyStaff,
@@ -66,14 +73,20 @@ class ReservationViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def confirm(self, request, pk=None):
         reservation = self.get_object()
-        reservation.confirm_reservation()
+        try:
+            reservation.confirm_reservation()
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'status': 'Réservation confirmée'})
     
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         reservation = self.get_object()
         reason = request.data.get('reason', '')
-        reservation.cancel_reservation(reason)
+        try:
+            reservation.cancel_reservation(reason)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'status': 'Réservation annulée'})
     
     @action(detail=True, methods=['get'])
@@ -103,7 +116,7 @@ class TicketViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ['reservation', 'trip', 'status', 'scanned_at']
     
     def get_permissions(self):
-        if self.action == 'scan':
+        if self.action in ['scan', 'scan_sync', 'manifest', 'manifest_key']:
             permission_classes = [IsAuthenticatedAndVerified, CanScanTickets]
         else:
             permission_classes = [IsAuthenticatedAndVerified, IsOwnerOrAgencyStaff]
@@ -126,31 +139,132 @@ class TicketViewSet(viewsets.ReadOnlyModelViewSet):
         serializer = TicketScanSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         
-        ticket = serializer.context['ticket']
+        ticket_code = serializer.validated_data['ticket_code']
+        trip_id = serializer.validated_data.get('trip_id')
+        
+        # Lecture erronée ou ticket d'un autre voyage : rejet sans requête
+        if trip_id and is_definitely_invalid(trip_id, ticket_code):
+            return Response({'error': 'Ticket invalide pour ce voyage'}, status=status.HTTP_404_NOT_FOUND)
+        
         scan_location_id = serializer.validated_data.get('scan_location_id')
+        if scan_location_id and scan_location_id not in known_city_ids():
+            scan_location_id = None
         
-        scan_location = None
-        if scan_location_id:
-            from locations.models import City
-            try:
-                scan_location = City.objects.get(id=scan_location_id)
-            except City.DoesNotExist:
-                pass
+        result = Ticket.scan_by_code(ticket_code, request.user, scan_location_id)
+        if result is None:
+            return Response({'error': 'Ticket non trouvé'}, status=status.HTTP_404_NOT_FOUND)
         
-        result = ticket.scan_ticket(request.user, scan_location)
         result_serializer = ScanResultSerializer(result)
         
         return Response(result_serializer.data)
     
+    @action(detail=False, methods=['post'])
+    def scan_sync(self, request):
+        """Synchronisation en lot des scans effectués hors ligne"""
+        serializer = ScanSyncSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        results = Ticket.sync_offline_scans(
+            serializer.validated_data['scans'],
+            request.user,
+            trips=self._scanner_trips(request.user)
+        )
+        return Response({
+            'boarded': sum(1 for item in results if item['result'] == 'boarded'),
+            'results': ScanSyncResultSerializer(results, many=True).data,
+        })
+    
+    @action(detail=False, methods=['get'])
+    def manifest(self, request):
+        """
+        Manifeste d'embarquement signé d'un voyage pour la validation hors ligne
+        
+        Paramètres : trip_id (obligatoire), since (version détenue, optionnel)
+        """
+        try:
+            trip_id = uuid.UUID(request.query_params.get('trip_id') or '')
+        except ValueError:
+            return Response({'error': 'trip_id invalide ou manquant'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            since = int(request.query_params.get('since') or 0)
+        except ValueError:
+            return Response({'error': 'since invalide'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        trip = self._scanner_trips(request.user).filter(pk=trip_id).first()
+        if trip is None:
+            return Response({'error': 'Voyage non trouvé'}, status=status.HTTP_404_NOT_FOUND)
+        
+        etag = boarding_manifest.get_etag(trip, since)
+        if is_not_modified(request, etag):
+            return HttpResponseNotModified(headers={'ETag': etag})
+        
+        try:
+            payload, version, signature = boarding_manifest.build_manifest(trip, since=since or None)
+        except ImproperlyConfigured as e:
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response = HttpResponse(payload, content_type=boarding_manifest.CONTENT_TYPE)
+        response['ETag'] = etag
+        response['X-Manifest-Version'] = str(version)
+        response['X-Manifest-Signature'] = signature
+        return response
+    
+    @action(detail=False, methods=['get'])
+    def manifest_key(self, request):
+        """Clé publique de vérification des manifestes"""
+        try:
+            public_key = boarding_manifest.public_key()
+        except ImproperlyConfigured as e:
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({'algorithm': boarding_manifest.SIGNATURE_ALGORITHM, 'public_key': public_key})
+    
+    @staticmethod
+    def _scanner_trips(user):
+        """Voyages dont l'utilisateur peut télécharger le manifeste et synchroniser les scans"""
+        from transport.models import Trip
+        
+        if user.is_admin():
+            return Trip.objects.all()
+        scope = models.Q(driver=user) | models.Q(agency__in=user.get_managed_agencies())
+        if user.agency_id:
+            scope |= models.Q(agency_id=user.agency_id)
+        return Trip.objects.filter(scope)
+    
+    @staticmethod
+    def _qr_response(response, etag):
+        response['ETag'] = etag
+        response['Cache-Control'] = QR_CACHE_CONTROL
+        return response
+    
     @action(detail=True, methods=['get'])
     def qr_code(self, request, pk=None):
         ticket = self.get_object()
-        if ticket.qr_image:
-            qr_path = os.path.join(settings.MEDIA_ROOT, ticket.qr_image.name)
-            with open(qr_path, 'rb') as f:
-                return HttpResponse(f.read(), content_type='image/png')
-        else:
+        if not ticket.qr_token:
+            return Response({'error': 'QR code non disponible'}, status=404)
+        
+        etag = qr_etag(ticket.qr_token, 'png')
+        if is_not_modified(request, etag):
+            return self._qr_response(HttpResponseNotModified(), etag)
+        
+        if not ticket.ensure_qr_code():
             return Response({'error': 'QR code non disponible'}, status=404)
+        
+        qr_path = os.path.join(settings.MEDIA_ROOT, ticket.qr_image.name)
+        response = FileResponse(open(qr_path, 'rb'), content_type='image/png')
+        return self._qr_response(response, etag)
+    
+    @action(detail=True, methods=['get'])
+    def qr_svg(self, request, pk=None):
+        """QR code vectoriel généré en mémoire, sans accès disque"""
+        ticket = self.get_object()
+        if not ticket.qr_token:
+            return Response({'error': 'QR code non disponible'}, status=404)
+        
+        etag = qr_etag(ticket.qr_token, 'svg')
+        if is_not_modified(request, etag):
+            return self._qr_response(HttpResponseNotModified(), etag)
+        
+        response = HttpResponse(render_qr_svg(ticket.qr_token), content_type='image/svg+xml')
+        return self._qr_response(response, etag)
     
     @action(detail=False, methods=['get'])
     def my_tickets(self, request):
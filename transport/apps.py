@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class TransportConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'transport'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import signals  # noqa: F401
+        from . import hooks  # noqa: F401
+        post_migrate.connect(signals.backfill_service_dates_after_migrate, sender=self)
@@ -0,0 +1,69 @@
+# transport/consumers.py
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from core.realtime import agency_group, trip_group
+
+
+class RealtimeFeedConsumer(AsyncJsonWebsocketConsumer):
+    """Base des flux temps réel : authentification, abonnement au groupe, relais"""
+
+    group_name = None
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if not user or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        if not await self.can_follow(user, **self.scope['url_route']['kwargs']):
+            await self.close(code=4403)
+            return
+
+        self.group_name = self.get_group_name(**self.scope['url_route']['kwargs'])
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        # Flux en lecture seule : seul le ping applicatif est accepté
+        if content.get('type') == 'ping':
+            await self.send_json({'type': 'pong'})
+
+    async def realtime_message(self, message):
+        await self.send_json({'type': message['event'], 'data': message['data']})
+
+
+class TripFeedConsumer(RealtimeFeedConsumer):
+    """ws/trips/<trip_id>/ : événements, embarquement et colis d'un voyage"""
+
+    def get_group_name(self, trip_id):
+        return trip_group(trip_id)
+
+    @database_sync_to_async
+    def can_follow(self, user, trip_id):
+        from .models import Trip
+
+        trip = Trip.objects.filter(pk=trip_id).only('agency_id', 'driver_id').first()
+        if trip is None:
+            return False
+        if user.is_client():
+            return trip.tickets.filter(buyer=user).exists()
+        if user.is_chauffeur():
+            return trip.driver_id == user.pk
+        return user.agency_id == trip.agency_id or user.get_managed_agencies().filter(pk=trip.agency_id).exists()
+
+
+class AgencyFeedConsumer(RealtimeFeedConsumer):
+    """ws/agencies/<agency_id>/ : tableau de bord d'une gare"""
+
+    def get_group_name(self, agency_id):
+        return agency_group(agency_id)
+
+    @database_sync_to_async
+    def can_follow(self, user, agency_id):
+        if user.is_client():
+            return False
+        return str(user.agency_id) == str(agency_id) or user.get_managed_agencies().filter(pk=agency_id).exists()
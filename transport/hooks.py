@@ -0,0 +1,41 @@
+# transport/hooks.py
+from core.realtime import broadcast_trip
+
+from .lifecycle import on_transition
+from .models import Trip, TripEvent
+
+
+@on_transition(to_status=Trip.Status.IN_PROGRESS)
+def record_departure(context):
+    """Événement de départ à la ville d'origine"""
+    trip = context.trip
+    TripEvent.objects.create(
+        trip=trip,
+        event_type=TripEvent.Type.DEPARTURE,
+        city_id=trip.schedule.leg.origin_id,
+        note="Départ du voyage",
+        created_by=context.user
+    )
+
+
+@on_transition(to_status=Trip.Status.COMPLETED)
+def record_arrival(context):
+    """Événement d'arrivée à la ville de destination"""
+    trip = context.trip
+    TripEvent.objects.create(
+        trip=trip,
+        event_type=TripEvent.Type.ARRIVAL,
+        city_id=trip.schedule.leg.destination_id,
+        note="Arrivée du voyage",
+        created_by=context.user
+    )
+
+
+@on_transition()
+def publish_status(context):
+    """Pousse le nouveau statut aux abonnés du voyage et de l'agence"""
+    broadcast_trip(context.trip, 'trip.status', {
+        'trip_id': context.trip.pk,
+        'from_status': context.from_status,
+        'status': context.to_status,
+    })
@@ -0,0 +1,113 @@
+# transport/lifecycle.py
+"""
+Cycle de vie des voyages.
+
+Les transitions autorisées sont déclarées dans TRANSITIONS. Un changement de
+statut verrouille le voyage, enregistre uniquement le statut puis exécute les
+hooks enregistrés par les applications :
+
+- les hooks synchrones tournent dans la même transaction que le changement
+  de statut (une erreur annule tout) ;
+- les hooks différés (deferred=True) sont exécutés après validation de la
+  transaction : notifications, caches, diffusion temps réel.
+
+Les applications déclarent leurs hooks dans un module hooks.py importé dans
+leur AppConfig.ready().
+"""
+from functools import partial
+
+from django.db import transaction
+
+from .models import Trip
+
+Status = Trip.Status
+
+TRANSITIONS = {
+    Status.PLANNED: {Status.BOARDING, Status.IN_PROGRESS, Status.CANCELLED},
+    Status.BOARDING: {Status.PLANNED, Status.IN_PROGRESS, Status.CANCELLED},
+    Status.IN_PROGRESS: {Status.COMPLETED},
+    Status.COMPLETED: set(),
+    Status.CANCELLED: set(),
+}
+
+_hooks = []
+
+
+class InvalidTransition(ValueError):
+    """Transition de statut non autorisée"""
+
+
+class TransitionContext:
+    """Informations transmises aux hooks"""
+    __slots__ = ('trip', 'from_status', 'to_status', 'user')
+
+    def __init__(self, trip, from_status, to_status, user=None):
+        self.trip = trip
+        self.from_status = from_status
+        self.to_status = to_status
+        self.user = user
+
+
+def on_transition(to_status=None, from_status=None, deferred=False):
+    """
+    Enregistre un hook de transition
+
+    Args:
+        to_status (str, optional): Statut d'arrivée (tous si None)
+        from_status (str, optional): Statut de départ (tous si None)
+        deferred (bool): Exécuter après validation de la transaction
+    """
+    def decorator(func):
+        _hooks.append((from_status, to_status, deferred, func))
+        return func
+    return decorator
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, set())
+
+
+def allowed_transitions(trip):
+    return sorted(TRANSITIONS.get(trip.status, set()))
+
+
+def _matching_hooks(context, deferred):
+    for from_status, to_status, is_deferred, func in _hooks:
+        if is_deferred != deferred:
+            continue
+        if from_status is not None and from_status != context.from_status:
+            continue
+        if to_status is not None and to_status != context.to_status:
+            continue
+        yield func
+
+
+def transition(trip, new_status, user=None):
+    """
+    Fait passer un voyage dans un nouveau statut
+
+    Returns:
+        bool: False si le voyage était déjà dans ce statut
+
+    Raises:
+        InvalidTransition: Si la transition n'est pas autorisée
+    """
+    with transaction.atomic():
+        current = Trip.objects.select_for_update().values_list('status', flat=True).get(pk=trip.pk)
+        if current == new_status:
+            trip.status = current
+            return False
+        if not can_transition(current, new_status):
+            raise InvalidTransition(
+                f"Transition impossible de « {Status(current).label} » vers « {Status(new_status).label} »"
+            )
+
+        trip.status = new_status
+        trip.save(update_fields=['status', 'updated'])
+
+        context = TransitionContext(trip, current, new_status, user)
+        for hook in _matching_hooks(context, deferred=False):
+            hook(context)
+        for hook in _matching_hooks(context, deferred=True):
+            transaction.on_commit(partial(hook, context))
+    return True
@@ -0,0 +1,36 @@
+# transport/management/commands/backfill_service_days.py
+from django.core.management.base import BaseCommand
+
+from transport.models import Schedule, ServiceDays
+
+
+class Command(BaseCommand):
+    help = "Calcule le masque service_days des horaires à partir de days_of_week"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Nombre d'horaires mis à jour par requête",
+        )
+
+    def handle(self, *args, **options):
+        to_update = []
+        invalid = []
+
+        for schedule in Schedule.objects.all_with_deleted().only('id', 'days_of_week', 'service_days').iterator():
+            mask = ServiceDays.from_days_of_week(schedule.days_of_week)
+            if not mask:
+                invalid.append(schedule)
+            if mask != schedule.service_days:
+                schedule.service_days = mask
+                to_update.append(schedule)
+
+        Schedule.objects.all_with_deleted().bulk_update(to_update, ['service_days'], batch_size=options['batch_size'])
+
+        for schedule in invalid:
+            self.stdout.write(self.style.WARNING(
+                f"  - Horaire {schedule.id}: jours non reconnus '{schedule.days_of_week}'"
+            ))
+        self.stdout.write(self.style.SUCCESS(f'{len(to_update)} horaires mis à jour'))
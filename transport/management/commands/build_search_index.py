@@ -0,0 +1,33 @@
+# transport/management/commands/build_search_index.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from transport.models import TripSearchIndex, TripSearchIndexDate
+
+
+class Command(BaseCommand):
+    help = "Construit l'index de recherche de voyages pour les prochains jours et purge les dates passées"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.G_TRAVEL_CONFIG.get('SEARCH_INDEX_DAYS', 14),
+            help="Nombre de jours à indexer à partir d'aujourd'hui",
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+
+        purged, _ = TripSearchIndex.objects.filter(service_date__lt=today).delete()
+        TripSearchIndexDate.objects.filter(service_date__lt=today).delete()
+        self.stdout.write(f'  - {purged} entrées passées supprimées')
+
+        total = 0
+        for offset in range(options['days']):
+            total += TripSearchIndex.index_date(today + timedelta(days=offset))
+
+        self.stdout.write(self.style.SUCCESS(f'Index de recherche construit: {total} entrées'))
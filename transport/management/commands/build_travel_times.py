@@ -0,0 +1,12 @@
+# transport/management/commands/build_travel_times.py
+from django.core.management.base import BaseCommand
+
+from transport.models import LegTravelTime
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les temps de parcours (ETA) à partir de l'historique des événements"
+
+    def handle(self, *args, **options):
+        count = LegTravelTime.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{count} temps de parcours reconstruits'))
@@ -0,0 +1,29 @@
+# transport/management/commands/materialize_trips.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from transport.materialization import backfill_service_dates, materialize_trips
+
+
+class Command(BaseCommand):
+    help = "Génère les voyages des prochains jours à partir des horaires actifs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.G_TRAVEL_CONFIG.get('TRIP_MATERIALIZATION_DAYS', 14),
+            help="Nombre de jours à générer à partir d'aujourd'hui",
+        )
+
+    def handle(self, *args, **options):
+        backfilled = backfill_service_dates()
+        if backfilled:
+            self.stdout.write(f'  - {backfilled} voyages existants datés')
+
+        result = materialize_trips(days=options['days'])
+        for schedule_id, service_date in result['unassigned']:
+            self.stdout.write(self.style.WARNING(
+                f'  - Horaire {schedule_id} le {service_date}: aucun véhicule ou chauffeur disponible'
+            ))
+        self.stdout.write(self.style.SUCCESS(f"{result['created']} voyages générés"))
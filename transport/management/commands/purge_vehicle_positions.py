@@ -0,0 +1,25 @@
+# transport/management/commands/purge_vehicle_positions.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from transport.models import VehiclePosition
+
+
+class Command(BaseCommand):
+    help = "Supprime les positions GPS plus anciennes que la durée de conservation"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.G_TRAVEL_CONFIG.get('VEHICLE_POSITION_RETENTION_DAYS', 90),
+            help="Nombre de jours conservés"
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.localdate() - timedelta(days=options['days'])
+        deleted = VehiclePosition.purge_before(cutoff)
+        self.stdout.write(self.style.SUCCESS(f'{deleted} positions antérieures au {cutoff} supprimées'))
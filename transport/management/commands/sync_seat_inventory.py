@@ -0,0 +1,72 @@
+# transport/management/commands/sync_seat_inventory.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from reservations.models import Reservation
+from transport.models import Trip, TripSeatInventory
+from transport.seatmap import SeatMap
+
+
+class Command(BaseCommand):
+    help = "Recalcule l'inventaire des places des voyages à venir à partir des réservations"
+
+    def handle(self, *args, **options):
+        trips = Trip.objects.filter(
+            departure_dt__gte=timezone.now()
+        ).exclude(
+            status=Trip.Status.CANCELLED
+        ).select_related('vehicle')
+
+        linked = 0
+        for trip in trips:
+            with transaction.atomic():
+                # Rattacher les réservations créées avant l'inventaire
+                linked += Reservation.objects.filter(
+                    trip__isnull=True,
+                    schedule_id=trip.schedule_id,
+                    travel_date=trip.service_date
+                ).update(trip=trip)
+
+                totals = Reservation.objects.filter(trip=trip).aggregate(
+                    held=Sum('total_seats', filter=Q(status=Reservation.Status.PENDING)),
+                    sold=Sum('total_seats', filter=Q(status__in=[
+                        Reservation.Status.CONFIRMED, Reservation.Status.PAID
+                    ])),
+                )
+                held = totals['held'] or 0
+                sold = totals['sold'] or 0
+                seats_total = max(trip.vehicle.capacity, held + sold)
+
+                # Reconstruire le plan : sièges déjà attribués d'abord, puis
+                # attribution aux réservations actives qui n'en ont pas
+                active = list(Reservation.objects.filter(trip=trip, status__in=[
+                    Reservation.Status.PENDING, Reservation.Status.CONFIRMED, Reservation.Status.PAID
+                ]).order_by('created'))
+                seat_map = SeatMap(seats_total)
+                unassigned = []
+                for reservation in active:
+                    try:
+                        seat_map.occupy(reservation.seat_numbers or [])
+                    except ValueError:
+                        reservation.seat_numbers = []
+                    if len(reservation.seat_numbers or []) != reservation.total_seats:
+                        seat_map.release(reservation.seat_numbers or [])
+                        unassigned.append(reservation)
+                for reservation in unassigned:
+                    reservation.seat_numbers = seat_map.allocate(reservation.total_seats)
+                Reservation.objects.bulk_update(unassigned, ['seat_numbers'])
+
+                TripSeatInventory.objects.update_or_create(
+                    trip=trip,
+                    defaults={
+                        'seats_total': seats_total,
+                        'seats_held': held,
+                        'seats_sold': sold,
+                        'seat_map': seat_map.to_bytes(),
+                    }
+                )
+
+        self.stdout.write(f'  - {linked} réservations rattachées à leur voyage')
+        self.stdout.write(self.style.SUCCESS(f'{trips.count()} inventaires synchronisés'))
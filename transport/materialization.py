@@ -0,0 +1,264 @@
+# transport/materialization.py
+"""
+Génération des voyages à partir des horaires.
+
+Chaque horaire actif produit un voyage par jour de circulation sur une
+fenêtre glissante (G_TRAVEL_CONFIG['TRIP_MATERIALIZATION_DAYS']). Un voyage
+est identifié par (horaire, date de circulation) : la génération est
+idempotente et un voyage annulé ou supprimé par l'exploitation n'est pas
+recréé.
+
+Véhicules et chauffeurs sont pris dans les ressources actives de l'agence
+de l'horaire, en évitant les chevauchements avec les voyages déjà planifiés
+(durée du tronçon + temps de rotation). Un créneau sans ressource libre est
+laissé vide et signalé.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Schedule, Trip, TripCargoLoad, TripSeatInventory, Vehicle
+
+
+class ResourcePool:
+    """Ressources (véhicules ou chauffeurs) d'une agence et leurs créneaux occupés"""
+
+    def __init__(self, resource_ids):
+        self.resource_ids = list(resource_ids)
+        self.busy = {resource_id: [] for resource_id in self.resource_ids}
+
+    def reserve(self, resource_id, start, end):
+        if resource_id in self.busy:
+            self.busy[resource_id].append((start, end))
+
+    def acquire(self, start, end):
+        """Première ressource libre sur [start, end), réservée ; None si aucune"""
+        for resource_id in self.resource_ids:
+            if all(end <= busy_start or start >= busy_end for busy_start, busy_end in self.busy[resource_id]):
+                self.busy[resource_id].append((start, end))
+                return resource_id
+        return None
+
+
+def _window(start=None, days=None):
+    start = start or timezone.localdate()
+    days = days or settings.G_TRAVEL_CONFIG.get('TRIP_MATERIALIZATION_DAYS', 14)
+    return start, start + timedelta(days=days - 1)
+
+
+def _occupancy(leg_duration):
+    turnaround = settings.G_TRAVEL_CONFIG.get('TRIP_TURNAROUND_MINUTES', 60)
+    return timedelta(minutes=leg_duration + turnaround)
+
+
+def _departure(schedule, service_date):
+    return timezone.make_aware(datetime.combine(service_date, schedule.departure_time))
+
+
+def _build_pools(agency_ids, first_date, last_date):
+    """
+    Pools de véhicules et de chauffeurs par agence, avec les voyages existants
+
+    À appeler dans une transaction : les véhicules des agences sont
+    verrouillés (dans l'ordre des clés, sans interblocage) avant la lecture
+    des voyages planifiés, de sorte que deux générations concurrentes pour
+    une même agence s'exécutent l'une après l'autre et voient leurs
+    affectations respectives.
+    """
+    list(Vehicle.objects.select_for_update().filter(
+        agency_id__in=agency_ids
+    ).order_by('pk').values_list('pk', flat=True))
+
+    User = get_user_model()
+    vehicles = {agency_id: [] for agency_id in agency_ids}
+    for vehicle_id, agency_id in Vehicle.objects.filter(
+        agency_id__in=agency_ids, is_active=True
+    ).order_by('-capacity', 'plate').values_list('pk', 'agency_id'):
+        vehicles[agency_id].append(vehicle_id)
+    drivers = {agency_id: [] for agency_id in agency_ids}
+    for driver_id, agency_id in User.objects.filter(
+        agency_id__in=agency_ids, role=User.Role.CHAUFFEUR, is_active=True
+    ).order_by('pk').values_list('pk', 'agency_id'):
+        drivers[agency_id].append(driver_id)
+
+    vehicle_pools = {agency_id: ResourcePool(ids) for agency_id, ids in vehicles.items()}
+    driver_pools = {agency_id: ResourcePool(ids) for agency_id, ids in drivers.items()}
+
+    # Voyages déjà planifiés sur la fenêtre (marge d'un jour pour les trajets de nuit)
+    existing = Trip.objects.filter(
+        agency_id__in=agency_ids,
+        service_date__range=(first_date - timedelta(days=1), last_date),
+    ).exclude(
+        status__in=[Trip.Status.CANCELLED, Trip.Status.COMPLETED]
+    ).values_list('agency_id', 'vehicle_id', 'driver_id', 'departure_dt', 'schedule__leg__duration_minutes')
+    for agency_id, vehicle_id, driver_id, departure_dt, duration in existing:
+        end = departure_dt + _occupancy(duration)
+        vehicle_pools[agency_id].reserve(vehicle_id, departure_dt, end)
+        driver_pools[agency_id].reserve(driver_id, departure_dt, end)
+
+    return vehicle_pools, driver_pools
+
+
+def backfill_service_dates(schedule_ids=None):
+    """
+    Renseigne la date de circulation des voyages créés avant son ajout
+
+    Sans elle, un ancien voyage échappe à get_trip_for_date et à l'index
+    unique (horaire, date) : la génération créerait un doublon à côté.
+
+    Returns:
+        int: Nombre de voyages datés
+    """
+    trips = Trip.objects.all_with_deleted().filter(service_date__isnull=True)
+    if schedule_ids is not None:
+        trips = trips.filter(schedule_id__in=list(schedule_ids))
+    trips = list(trips.only('departure_dt'))
+    for trip in trips:
+        trip.service_date = timezone.localtime(trip.departure_dt).date()
+    Trip.objects.bulk_update(trips, ['service_date'], batch_size=500)
+    return len(trips)
+
+
+def materialize_trips(schedule_ids=None, start=None, days=None):
+    """
+    Crée les voyages manquants de la fenêtre glissante
+
+    Args:
+        schedule_ids (list, optional): Restreindre à ces horaires
+        start (date, optional): Premier jour (aujourd'hui par défaut)
+        days (int, optional): Taille de la fenêtre
+
+    Returns:
+        dict: {'created': int, 'unassigned': list de (schedule_id, date)}
+    """
+    first_date, last_date = _window(start, days)
+    now = timezone.now()
+
+    schedules = Schedule.objects.filter(
+        is_active=True,
+        leg__is_deleted=False,
+        leg__route__is_deleted=False,
+    ).select_related('leg')
+    if schedule_ids is not None:
+        schedules = schedules.filter(pk__in=list(schedule_ids))
+    schedules = list(schedules)
+    if not schedules:
+        return {'created': 0, 'unassigned': []}
+
+    # Anciens voyages sans date de circulation : datés avant toute comparaison
+    backfill_service_dates([schedule.pk for schedule in schedules])
+
+    # Tous les voyages existants, y compris annulés ou supprimés : ils ne sont pas recréés
+    existing = set(
+        Trip.objects.all_with_deleted().filter(
+            schedule__in=schedules,
+            service_date__range=(first_date, last_date)
+        ).values_list('schedule_id', 'service_date')
+    )
+
+    slots = []
+    for schedule in schedules:
+        service_date = first_date
+        while service_date <= last_date:
+            if schedule.runs_on(service_date) and (schedule.pk, service_date) not in existing:
+                departure_dt = _departure(schedule, service_date)
+                if departure_dt > now:
+                    slots.append((departure_dt, schedule, service_date))
+            service_date += timedelta(days=1)
+    if not slots:
+        return {'created': 0, 'unassigned': []}
+    slots.sort(key=lambda slot: slot[0])
+
+    with transaction.atomic():
+        vehicle_pools, driver_pools = _build_pools(
+            {schedule.agency_id for schedule in schedules}, first_date, last_date
+        )
+        vehicles = Vehicle.objects.filter(agency_id__in=vehicle_pools).only(
+            'capacity', 'cargo_capacity_kg', 'cargo_volume_m3'
+        ).in_bulk()
+
+        trips = []
+        unassigned = []
+        for departure_dt, schedule, service_date in slots:
+            end = departure_dt + _occupancy(schedule.leg.duration_minutes)
+            vehicle_id = vehicle_pools[schedule.agency_id].acquire(departure_dt, end)
+            driver_id = driver_pools[schedule.agency_id].acquire(departure_dt, end) if vehicle_id else None
+            if vehicle_id is None or driver_id is None:
+                if vehicle_id is not None:
+                    vehicle_pools[schedule.agency_id].busy[vehicle_id].remove((departure_dt, end))
+                unassigned.append((schedule.pk, service_date))
+                continue
+            trips.append(Trip(
+                schedule=schedule,
+                agency_id=schedule.agency_id,
+                vehicle_id=vehicle_id,
+                driver_id=driver_id,
+                departure_dt=departure_dt,
+                service_date=service_date,
+                status=Trip.Status.PLANNED,
+            ))
+
+        # Un autre processus a pu créer le même voyage entre-temps : l'index
+        # unique (horaire, date) l'écarte, seuls les voyages écrits reçoivent
+        # leur inventaire de places et leur registre de fret.
+        Trip.objects.bulk_create(trips, batch_size=500, ignore_conflicts=True)
+        created = set(Trip.objects.filter(pk__in=[trip.pk for trip in trips]).values_list('pk', flat=True))
+        written = [trip for trip in trips if trip.pk in created]
+        TripSeatInventory.objects.bulk_create([
+            TripSeatInventory(trip=trip, seats_total=vehicles[trip.vehicle_id].capacity)
+            for trip in written
+        ], batch_size=500, ignore_conflicts=True)
+        TripCargoLoad.objects.bulk_create([
+            TripCargoLoad(trip=trip, **TripCargoLoad._capacities(vehicles[trip.vehicle_id]))
+            for trip in written
+        ], batch_size=500, ignore_conflicts=True)
+
+    return {'created': len(created), 'unassigned': unassigned}
+
+
+def prune_schedule_trips(schedule):
+    """
+    Supprime les voyages futurs d'un horaire qui ne correspondent plus à
+    celui-ci (horaire désactivé, jour retiré, heure modifiée)
+
+    Seuls les voyages planifiés sans réservation, ticket ni colis (manifeste,
+    étape d'acheminement ou colis à bord) sont supprimés ; les autres
+    restent à la charge de l'exploitation.
+
+    Returns:
+        int: Nombre de voyages supprimés
+    """
+    trips = Trip.objects.filter(
+        schedule=schedule,
+        status=Trip.Status.PLANNED,
+        departure_dt__gt=timezone.now(),
+        reservations__isnull=True,
+        tickets__isnull=True,
+        parcel_manifests__isnull=True,
+        parcel_route_steps__isnull=True,
+        parcels__isnull=True,
+    ).values_list('pk', 'service_date', 'departure_dt')
+
+    stale = [
+        pk for pk, service_date, departure_dt in trips
+        if not schedule.is_active
+        or schedule.is_deleted
+        or not schedule.runs_on(service_date)
+        or departure_dt != _departure(schedule, service_date)
+    ]
+    if not stale:
+        return 0
+    # Suppression physique : un voyage supprimé logiquement bloquerait la
+    # régénération du créneau
+    Trip.objects.filter(pk__in=stale).hard_delete()
+    return len(stale)
+
+
+def refresh_schedule(schedule):
+    """Met en cohérence les voyages futurs d'un horaire modifié"""
+    prune_schedule_trips(schedule)
+    if schedule.is_active and not schedule.is_deleted:
+        materialize_trips(schedule_ids=[schedule.pk])
@@ -3,11 +3,93 @@ from django.utils import timezone
 from django.core.validators import MinValueValidator
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
-from django.db.models import Q, Sum, Count
+from django.db.models import Sum, Count, F, Q, Value
+from django.db.models.functions import Greatest
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.cache import cache
+from django.db import transaction
 
-from core.models import TimeStampedModel
+from core.models import TimeStampedModel, SoftDeleteManager, SoftDeleteQuerySet
+from .seatmap import SeatMap
+
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Jours de circulation acceptés dans Schedule.days_of_week (anglais et français)
+SERVICE_DAY_TOKENS = {
+    'mon': 0, 'lun': 0,
+    'tue': 1, 'mar': 1,
+    'wed': 2, 'mer': 2,
+    'thu': 3, 'jeu': 3,
+    'fri': 4, 'ven': 4,
+    'sat': 5, 'sam': 5,
+    'sun': 6, 'dim': 6,
+}
+DAILY_TOKENS = {'daily', 'quotidien'}
+
+
+def parse_service_days(value):
+    """
+    Convertit une valeur de days_of_week en ensemble de jours (0 = lundi)
+
+    Args:
+        value (str): Ex: 'mon,wed,fri', 'lun,mar' ou 'daily'
+
+    Returns:
+        frozenset: Numéros des jours de circulation
+    """
+    tokens = [token.strip().lower() for token in (value or '').split(',') if token.strip()]
+    if any(token in DAILY_TOKENS for token in tokens):
+        return frozenset(range(7))
+    return frozenset(SERVICE_DAY_TOKENS[token] for token in tokens if token in SERVICE_DAY_TOKENS)
+
+
+ALL_SERVICE_DAYS = 0b1111111
+
+# Pour chaque jour, liste des masques qui le contiennent : filtrer avec
+# service_days__in équivaut à "service_days & bit != 0" tout en restant
+# utilisable par l'index. Construite hors de ServiceDays : une compréhension
+# imbriquée ne voit pas les noms du corps de classe.
+MASKS_INCLUDING_WEEKDAY = [
+    tuple(mask for mask in range(ALL_SERVICE_DAYS + 1) if mask & (1 << weekday))
+    for weekday in range(7)
+]
+
+
+class ServiceDays:
+    """Masque 7 bits des jours de circulation (bit 0 = lundi, bit 6 = dimanche)"""
+    ALL = ALL_SERVICE_DAYS
+    LABELS = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+    _MASKS_INCLUDING = MASKS_INCLUDING_WEEKDAY
+
+    @classmethod
+    def from_days_of_week(cls, value):
+        """Convertit 'mon,wed' / 'lun,mer' / 'daily' en masque"""
+        mask = 0
+        for weekday in parse_service_days(value):
+            mask |= 1 << weekday
+        return mask
+
+    @staticmethod
+    def includes(mask, date):
+        """Indique si le masque couvre le jour de la date"""
+        return bool(mask & (1 << date.weekday()))
+
+    @classmethod
+    def masks_including(cls, weekday):
+        return cls._MASKS_INCLUDING[weekday]
+
+    @classmethod
+    def display(cls, mask):
+        """Libellé français des jours de circulation"""
+        if mask == cls.ALL:
+            return 'Tous les jours'
+        return ', '.join(label for weekday, label in enumerate(cls.LABELS) if mask & (1 << weekday))
 
-from django.utils.dateparse import parse_date
 
 class Route(TimeStampedModel):
     """
@@ -91,25 +173,10 @@ class Route(TimeStampedModel):
         elif isinstance(date, str):
             date = parse_date(date)
         
-        # Convertir la date en jour de la semaine
-        day_mapping = {
-            'monday': 'mon',
-            'tuesday': 'tue', 
-            'wednesday': 'wed',
-            'thursday': 'thu',
-            'friday': 'fri',
-            'saturday': 'sat',
-            'sunday': 'sun'
-        }
-        day_of_week = day_mapping[date.strftime('%A').lower()]
-        
         schedules = Schedule.objects.filter(
             leg__route=self,
             is_active=True
-        ).filter(
-            Q(days_of_week__contains=day_of_week) | 
-            Q(days_of_week='daily')
-        ).select_related('leg', 'agency')
+        ).running_on(date).select_related('leg', 'agency')
         
         return schedules
 
@@ -237,6 +304,20 @@ class Leg(TimeStampedModel):
         }
 
 
+class ScheduleQuerySet(SoftDeleteQuerySet):
+    def running_on(self, date):
+        """Horaires qui circulent à la date donnée"""
+        return self.filter(service_days__in=ServiceDays.masks_including(date.weekday()))
+
+
+class ScheduleManager(SoftDeleteManager):
+    def get_queryset(self):
+        return ScheduleQuerySet(self.model, using=self._db).filter(is_deleted=False)
+
+    def running_on(self, date):
+        return self.get_queryset().running_on(date)
+
+
 class Schedule(TimeStampedModel):
     """
     Modèle représentant un horaire de départ pour un tronçon.
@@ -246,6 +327,7 @@ class Schedule(TimeStampedModel):
         agency (Agency): Agence responsable de l'horaire
         departure_time (Time): Heure de départ
         days_of_week (str): Jours de circulation (ex: 'mon,tue,wed' ou 'daily')
+        service_days (int): Masque 7 bits calculé à partir de days_of_week
         is_active (bool): Indique si l'horaire est actif
     """
     leg = models.ForeignKey(
@@ -263,21 +345,43 @@ class Schedule(TimeStampedModel):
     departure_time = models.TimeField(verbose_name=_("Heure de départ"))
     days_of_week = models.CharField(
         max_length=50, 
-        help_text=_("Ex: 'lun,mar,mer' ou 'quotidien'"),
+        help_text=_("Ex: 'mon,tue,wed', 'lun,mar,mer', 'daily' ou 'quotidien'"),
         verbose_name=_("Jours de circulation")
     )
+    service_days = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_("Masque des jours de circulation")
+    )
     is_active = models.BooleanField(
         default=True, 
         verbose_name=_("Actif")
     )
     
+    objects = ScheduleManager()
+    
     class Meta:
         verbose_name = _("Horaire")
         verbose_name_plural = _("Horaires")
+        indexes = [
+            models.Index(fields=["is_active", "service_days"]),
+        ]
 
     def __str__(self):
         return f"{self.leg.origin}→{self.leg.destination} à {self.departure_time}"
     
+    def save(self, *args, **kwargs):
+        """Sauvegarde avec recalcul du masque des jours de circulation"""
+        self.service_days = ServiceDays.from_days_of_week(self.days_of_week)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'days_of_week' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'service_days'}
+        super().save(*args, **kwargs)
+    
+    def runs_on(self, date):
+        """Indique si l'horaire circule à la date donnée"""
+        return ServiceDays.includes(self.service_days, date)
+    
     def get_next_trips(self, date=None, limit=10):
         """
         Retourne les prochains voyages pour cet horaire
@@ -294,10 +398,10 @@ class Schedule(TimeStampedModel):
         
         return Trip.objects.filter(
             schedule=self,
-            departure_dt__date=date,
+            service_date=date,
             departure_dt__gte=timezone.now(),
             status__in=[Trip.Status.PLANNED, Trip.Status.BOARDING]
-        ).select_related('vehicle', 'driver')[:limit]
+        ).select_related('vehicle', 'driver', 'seat_inventory')[:limit]
     
     def get_available_seats(self, trip_date):
         """
@@ -309,17 +413,27 @@ class Schedule(TimeStampedModel):
         Returns:
             int: Nombre de sièges disponibles
         """
-        trips = Trip.objects.filter(
-            schedule=self,
-            departure_dt__date=trip_date
-        )
-        
-        total_capacity = sum(trip.vehicle.capacity for trip in trips)
-        total_passengers = TripPassenger.objects.filter(
-            trip__in=trips
-        ).count()
+        trip = self.get_trip_for_date(trip_date)
+        if trip is None:
+            return 0
+        return trip.get_available_seats()
+    
+    def get_trip_for_date(self, trip_date):
+        """
+        Retourne le voyage de cet horaire pour une date donnée
         
-        return max(0, total_capacity - total_passengers)
+        Args:
+            trip_date (date): Date du voyage
+            
+        Returns:
+            Trip: Voyage correspondant ou None
+        """
+        return Trip.objects.filter(
+            schedule=self,
+            service_date=trip_date
+        ).exclude(
+            status=Trip.Status.CANCELLED
+        ).select_related('seat_inventory', 'vehicle').first()
     
     def to_json(self):
         """Serialise l'horaire en format JSON pour l'API"""
@@ -345,6 +459,8 @@ class Vehicle(TimeStampedModel):
     Attributes:
         plate (str): Numéro d'immatriculation unique
         capacity (int): Capacité maximale de passagers
+        cargo_capacity_kg (Decimal): Charge maximale de colis en soute
+        cargo_volume_m3 (Decimal): Volume de soute
         type (str): Type de véhicule (bus, minibus, etc.)
         agency (Agency): Agence propriétaire du véhicule
         is_active (bool): Indique si le véhicule est actif
@@ -355,6 +471,20 @@ class Vehicle(TimeStampedModel):
         verbose_name=_("Plaque d'immatriculation")
     )
     capacity = models.PositiveIntegerField(verbose_name=_("Capacité"))
+    cargo_capacity_kg = models.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        default=500,
+        validators=[MinValueValidator(0)],
+        verbose_name=_("Capacité de fret (kg)")
+    )
+    cargo_volume_m3 = models.DecimalField(
+        max_digits=6,
+        decimal_places=2,
+        default=8,
+        validators=[MinValueValidator(0)],
+        verbose_name=_("Volume de soute (m³)")
+    )
     type = models.CharField(
         max_length=30, 
         default="bus",
@@ -388,11 +518,9 @@ class Vehicle(TimeStampedModel):
         Returns:
             int: Nombre de sièges disponibles
         """
-        booked_seats = TripPassenger.objects.filter(
-            trip=trip,
-            trip__vehicle=self
-        ).count()
-        return max(0, self.capacity - booked_seats)
+        if trip.vehicle_id != self.pk:
+            return self.capacity
+        return trip.get_available_seats()
     
     def to_json(self):
         """Serialise le véhicule en format JSON pour l'API"""
@@ -400,6 +528,8 @@ class Vehicle(TimeStampedModel):
             'id': self.id,
             'plate': self.plate,
             'capacity': self.capacity,
+            'cargo_capacity_kg': self.cargo_capacity_kg,
+            'cargo_volume_m3': self.cargo_volume_m3,
             'type': self.type,
             'agency': {
                 'id': self.agency.id,
@@ -421,6 +551,7 @@ class Trip(TimeStampedModel):
         vehicle (Vehicle): Véhicule affecté
         driver (User): Chauffeur assigné
         departure_dt (DateTime): Date et heure de départ
+        service_date (date): Date de circulation (jour local du départ)
         status (str): Statut du voyage
     """
     class Status(models.TextChoices):
@@ -453,6 +584,11 @@ class Trip(TimeStampedModel):
         verbose_name=_("Chauffeur")
     )
     departure_dt = models.DateTimeField(verbose_name=_("Date et heure de départ"))
+    service_date = models.DateField(
+        null=True,
+        editable=False,
+        verbose_name=_("Date de circulation")
+    )
     status = models.CharField(
         max_length=20, 
         choices=Status.choices, 
@@ -463,34 +599,116 @@ class Trip(TimeStampedModel):
     class Meta:
         verbose_name = _("Voyage")
         verbose_name_plural = _("Voyages")
+        constraints = [
+            # Un seul voyage actif par horaire et par jour ; un voyage annulé
+            # peut être remplacé
+            models.UniqueConstraint(
+                fields=["schedule", "service_date"],
+                condition=Q(is_deleted=False) & ~Q(status="cancelled"),
+                name="unique_active_trip_per_schedule_day",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.schedule.leg.origin}→{self.schedule.leg.destination} ({self.departure_dt})"
     
+    def save(self, *args, **kwargs):
+        """Sauvegarde avec calcul de la date de circulation"""
+        self.service_date = timezone.localtime(self.departure_dt).date()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'departure_dt' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'service_date'}
+        super().save(*args, **kwargs)
+    
     def get_available_seats(self):
         """Retourne le nombre de sièges disponibles"""
-        booked_count = self.passengers.count()
-        return max(0, self.vehicle.capacity - booked_count)
+        try:
+            inventory = self.seat_inventory
+        except ObjectDoesNotExist:
+            inventory = TripSeatInventory.for_trip(self)
+        return inventory.seats_available
     
     def get_current_passengers(self):
         """Retourne les passagers actuellement à bord"""
         return self.passengers.filter(is_onboard=True)
+
+    def get_eta(self):
+        """
+        Heure d'arrivée estimée à partir des temps de parcours observés
+        
+        Pendant le voyage, l'estimation repart du dernier point de passage
+        (départ réel ou arrêt). Sans historique, la durée théorique du
+        tronçon est utilisée.
+        
+        Returns:
+            dict: {expected, latest, samples, from_city_id}
+        """
+        leg = self.schedule.leg
+        times = LegTravelTime.for_leg(leg.pk)
+        expected, latest, samples = times.get(
+            str(leg.destination_id),
+            (leg.duration_minutes, leg.duration_minutes, 0)
+        )
+        reference, from_city_id = self.departure_dt, leg.origin_id
+        
+        if self.status == self.Status.IN_PROGRESS:
+            checkpoint = self.events.filter(
+                event_type__in=[TripEvent.Type.DEPARTURE, TripEvent.Type.STOP]
+            ).order_by('-timestamp').values_list('event_type', 'city_id', 'timestamp').first()
+            if checkpoint:
+                event_type, city_id, timestamp = checkpoint
+                if event_type == TripEvent.Type.DEPARTURE:
+                    reference = timestamp
+                elif str(city_id) in times:
+                    elapsed_p50, elapsed_p90, _ = times[str(city_id)]
+                    reference, from_city_id = timestamp, city_id
+                    expected = max(expected - elapsed_p50, 0)
+                    latest = max(latest - elapsed_p90, expected)
+        
+        return {
+            'expected': reference + timedelta(minutes=expected),
+            'latest': reference + timedelta(minutes=latest),
+            'samples': samples,
+            'from_city_id': from_city_id,
+        }
+    
+    def get_estimated_arrival(self):
+        """Heure d'arrivée estimée (médiane)"""
+        return self.get_eta()['expected']
+    
+    def get_current_location(self):
+        """
+        Dernière position GPS connue du véhicule (lecture en cache)
+        
+        Returns:
+            dict | None: {type, latitude, longitude, recorded_at, speed_kmh, heading, accuracy_m}
+        """
+        return VehiclePosition.latest_for_trip(self)
     
-    def update_status(self, new_status):
+    def update_status(self, new_status, user=None):
         """
-        Met à jour le statut du voyage
+        Met à jour le statut du voyage via le cycle de vie (transport.lifecycle)
+        
+        Les effets de bord (tickets non embarqués, colis en transit,
+        événements, notifications) sont exécutés par les hooks enregistrés.
         
         Args:
             new_status (str): Nouveau statut
+            user (User, optional): Utilisateur à l'origine du changement
             
         Returns:
-            bool: True si la mise à jour a réussi
+            bool: True si le statut a changé, False si le statut est inconnu
+            ou si le voyage y était déjà (aucun hook exécuté)
+            
+        Raises:
+            InvalidTransition: Si la transition n'est pas autorisée
         """
-        if new_status in dict(self.Status.choices):
-            self.status = new_status
-            self.save()
-            return True
-        return False
+        from .lifecycle import transition
+        
+        if new_status not in dict(self.Status.choices):
+            return False
+        
+        return transition(self, new_status, user=user)
     
     def to_json(self):
         """Serialise le voyage en format JSON pour l'API"""
@@ -515,6 +733,312 @@ class Trip(TimeStampedModel):
         }
 
 
+class TripSeatInventory(models.Model):
+    """
+    Compteurs de places d'un voyage.
+
+    Les réservations en attente bloquent des places (seats_held), les
+    réservations confirmées les vendent (seats_sold). Toutes les mises à jour
+    verrouillent la ligne et passent par des expressions F() : deux caissiers
+    ne peuvent pas vendre la même dernière place.
+
+    Attributes:
+        trip (Trip): Voyage concerné
+        seats_total (int): Capacité du véhicule affecté
+        seats_held (int): Places bloquées par des réservations en attente
+        seats_sold (int): Places vendues
+        seat_map (bytes): Bitmap des sièges bloqués ou vendus (voir SeatMap)
+    """
+    trip = models.OneToOneField(
+        Trip,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="seat_inventory",
+        verbose_name=_("Voyage")
+    )
+    seats_total = models.PositiveIntegerField(verbose_name=_("Places totales"))
+    seats_held = models.PositiveIntegerField(default=0, verbose_name=_("Places bloquées"))
+    seats_sold = models.PositiveIntegerField(default=0, verbose_name=_("Places vendues"))
+    seat_map = models.BinaryField(default=b'', verbose_name=_("Plan des sièges"))
+    updated = models.DateTimeField(auto_now=True, verbose_name=_("Mis à jour"))
+
+    class Meta:
+        verbose_name = _("Inventaire des places")
+        verbose_name_plural = _("Inventaires des places")
+        constraints = [
+            models.CheckConstraint(
+                condition=Q(seats_total__gte=F('seats_held') + F('seats_sold')),
+                name="trip_seat_inventory_no_overbooking",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.trip_id}: {self.seats_available}/{self.seats_total}"
+
+    @property
+    def seats_available(self):
+        return max(0, self.seats_total - self.seats_held - self.seats_sold)
+
+    def get_seat_map(self):
+        return SeatMap.from_bytes(self.seats_total, self.seat_map)
+
+    @classmethod
+    def for_trip(cls, trip):
+        """Retourne l'inventaire du voyage, créé à partir de la capacité du véhicule si besoin"""
+        inventory, _ = cls.objects.get_or_create(
+            trip=trip,
+            defaults={'seats_total': trip.vehicle.capacity}
+        )
+        return inventory
+
+    @classmethod
+    def _locked(cls, trip):
+        cls.for_trip(trip)
+        return cls.objects.select_for_update().get(trip=trip)
+
+    @classmethod
+    def hold(cls, trip, seats):
+        """
+        Bloque des places pour une réservation en attente
+
+        Les sièges sont attribués sur le plan, contigus si possible pour
+        un groupe.
+
+        Returns:
+            list: Numéros des sièges bloqués
+
+        Raises:
+            ValueError: Si le voyage n'a plus assez de places
+        """
+        with transaction.atomic():
+            inventory = cls._locked(trip)
+            if seats > inventory.seats_available:
+                raise ValueError(f"Seulement {inventory.seats_available} sièges disponibles")
+            seat_map = inventory.get_seat_map()
+            seat_numbers = seat_map.allocate(seats)
+            cls.objects.filter(trip=trip).update(
+                seats_held=F('seats_held') + seats,
+                seat_map=seat_map.to_bytes(),
+                updated=timezone.now()
+            )
+        return seat_numbers
+
+    @classmethod
+    def sell_held(cls, trip, seats):
+        """Transforme des places bloquées en places vendues (confirmation)"""
+        with transaction.atomic():
+            inventory = cls._locked(trip)
+            seats = min(seats, inventory.seats_held)
+            cls.objects.filter(trip=trip).update(
+                seats_held=F('seats_held') - seats,
+                seats_sold=F('seats_sold') + seats,
+                updated=timezone.now()
+            )
+
+    @classmethod
+    def release(cls, trip, seats, sold=False, seat_numbers=()):
+        """Libère des places bloquées (expiration) ou vendues (annulation)"""
+        field = 'seats_sold' if sold else 'seats_held'
+        with transaction.atomic():
+            inventory = cls._locked(trip)
+            seats = min(seats, getattr(inventory, field))
+            seat_map = inventory.get_seat_map()
+            seat_map.release(seat_numbers)
+            cls.objects.filter(trip=trip).update(
+                **{field: F(field) - seats},
+                seat_map=seat_map.to_bytes(),
+                updated=timezone.now()
+            )
+
+    @classmethod
+    def release_batch(cls, releases, sold=False):
+        """
+        Libère en une passe les places de plusieurs réservations
+
+        Args:
+            releases (dict): {trip_id: (nombre de places, [numéros de sièges])}
+            sold (bool): Places vendues plutôt que bloquées
+        """
+        field = 'seats_sold' if sold else 'seats_held'
+        with transaction.atomic():
+            # Verrous pris dans l'ordre des clés : deux lots qui partagent
+            # des voyages ne peuvent pas s'attendre mutuellement.
+            inventories = cls.objects.select_for_update().filter(trip_id__in=list(releases)).order_by('pk')
+            for inventory in inventories:
+                seats, seat_numbers = releases[inventory.trip_id]
+                seat_map = inventory.get_seat_map()
+                seat_map.release(seat_numbers)
+                cls.objects.filter(pk=inventory.pk).update(
+                    **{field: F(field) - min(seats, getattr(inventory, field))},
+                    seat_map=seat_map.to_bytes(),
+                    updated=timezone.now()
+                )
+
+    @classmethod
+    def release_all(cls, trip):
+        """Rend toutes les places d'un voyage annulé (bloquées, vendues et plan des sièges)"""
+        cls.objects.filter(trip=trip).update(
+            seats_held=0,
+            seats_sold=0,
+            seat_map=b'',
+            updated=timezone.now()
+        )
+
+    @classmethod
+    def sync_capacity(cls, trip):
+        """
+        Aligne la capacité sur le véhicule affecté sans passer sous les places déjà prises
+
+        Un véhicule plus petit ne retire aucun siège attribué : la capacité
+        ne descend pas sous le plus haut siège occupé, et les sièges au-delà
+        de la capacité du véhicule sont signalés pour être réattribués
+        (commande sync_seat_inventory).
+
+        Returns:
+            list: Sièges occupés au-delà de la capacité du véhicule
+        """
+        capacity = trip.vehicle.capacity
+        with transaction.atomic():
+            inventory = cls.objects.select_for_update().filter(trip=trip).first()
+            if inventory is None or inventory.seats_total == capacity:
+                return []
+            occupied = inventory.get_seat_map().occupied
+            stranded = [seat for seat in SeatMap.seats(occupied) if seat > capacity]
+            seats_total = max(capacity, inventory.seats_held + inventory.seats_sold, max(stranded, default=0))
+            cls.objects.filter(pk=inventory.pk).update(
+                seats_total=seats_total,
+                seat_map=SeatMap(seats_total, occupied).to_bytes(),
+                updated=timezone.now()
+            )
+
+        if stranded:
+            logger.warning(
+                "Voyage %s : sièges %s attribués au-delà des %s places du véhicule",
+                trip.pk, stranded, capacity
+            )
+        return stranded
+
+
+class TripCargoLoad(models.Model):
+    """
+    Registre de fret d'un voyage : totaux courants des colis à bord.
+
+    Chaque chargement ou déchargement met à jour les totaux par une seule
+    requête UPDATE conditionnelle sur la ligne du voyage : le contrôle de
+    capacité et l'incrément sont atomiques, sans relire la table des colis.
+    Les capacités sont recopiées du véhicule affecté.
+
+    Attributes:
+        trip (Trip): Voyage concerné
+        weight_kg (Decimal): Poids chargé
+        volume_cm3 (int): Volume chargé (dimensions des colis)
+        parcels (int): Nombre de colis à bord
+        weight_capacity_kg (Decimal): Charge maximale du véhicule
+        volume_capacity_cm3 (int): Volume de soute du véhicule
+    """
+    trip = models.OneToOneField(
+        Trip,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="cargo_load",
+        verbose_name=_("Voyage")
+    )
+    weight_kg = models.DecimalField(max_digits=10, decimal_places=3, default=0, verbose_name=_("Poids chargé (kg)"))
+    volume_cm3 = models.PositiveBigIntegerField(default=0, verbose_name=_("Volume chargé (cm³)"))
+    parcels = models.PositiveIntegerField(default=0, verbose_name=_("Colis à bord"))
+    weight_capacity_kg = models.DecimalField(max_digits=8, decimal_places=2, verbose_name=_("Charge maximale (kg)"))
+    volume_capacity_cm3 = models.PositiveBigIntegerField(verbose_name=_("Volume maximal (cm³)"))
+    updated = models.DateTimeField(auto_now=True, verbose_name=_("Mis à jour"))
+
+    class Meta:
+        verbose_name = _("Fret du voyage")
+        verbose_name_plural = _("Fret des voyages")
+
+    def __str__(self):
+        return f"{self.trip_id}: {self.weight_kg}/{self.weight_capacity_kg} kg"
+
+    @property
+    def remaining_weight_kg(self):
+        return self.weight_capacity_kg - self.weight_kg
+
+    @property
+    def remaining_volume_cm3(self):
+        return self.volume_capacity_cm3 - self.volume_cm3
+
+    @staticmethod
+    def _capacities(vehicle):
+        return {
+            'weight_capacity_kg': vehicle.cargo_capacity_kg,
+            'volume_capacity_cm3': int(vehicle.cargo_volume_m3 * 1_000_000),
+        }
+
+    @classmethod
+    def for_trip(cls, trip):
+        """Registre du voyage, créé à partir des capacités du véhicule si besoin"""
+        cargo, _ = cls.objects.get_or_create(trip=trip, defaults=cls._capacities(trip.vehicle))
+        return cargo
+
+    @classmethod
+    def remaining(cls, trip):
+        """
+        Capacité restante du voyage (une lecture de clé primaire)
+
+        Returns:
+            dict: {weight_kg, volume_cm3, parcels}
+        """
+        try:
+            cargo = trip.cargo_load
+        except ObjectDoesNotExist:
+            cargo = cls.for_trip(trip)
+        return {
+            'weight_kg': cargo.remaining_weight_kg,
+            'volume_cm3': cargo.remaining_volume_cm3,
+            'parcels': cargo.parcels,
+        }
+
+    @classmethod
+    def load(cls, trip, weight_kg, volume_cm3=0, parcels=1):
+        """
+        Ajoute des colis au registre si la capacité le permet
+
+        Raises:
+            ValueError: Si le poids ou le volume dépasse la capacité restante
+        """
+        cls.for_trip(trip)
+        updated = cls.objects.filter(
+            trip=trip,
+            weight_kg__lte=F('weight_capacity_kg') - weight_kg,
+            volume_cm3__lte=F('volume_capacity_cm3') - volume_cm3,
+        ).update(
+            weight_kg=F('weight_kg') + weight_kg,
+            volume_cm3=F('volume_cm3') + volume_cm3,
+            parcels=F('parcels') + parcels,
+            updated=timezone.now()
+        )
+        if not updated:
+            cargo = cls.objects.get(trip=trip)
+            raise ValueError(
+                f"Capacité de fret dépassée: {cargo.remaining_weight_kg} kg et "
+                f"{cargo.remaining_volume_cm3 / 1_000_000:.2f} m³ disponibles"
+            )
+
+    @classmethod
+    def unload(cls, trip, weight_kg, volume_cm3=0, parcels=1):
+        """Retire des colis du registre"""
+        cls.objects.filter(trip=trip).update(
+            weight_kg=Greatest(F('weight_kg') - weight_kg, Value(0), output_field=models.DecimalField()),
+            volume_cm3=Greatest(F('volume_cm3') - volume_cm3, Value(0)),
+            parcels=Greatest(F('parcels') - parcels, Value(0)),
+            updated=timezone.now()
+        )
+
+    @classmethod
+    def sync_capacity(cls, trip):
+        """Aligne les capacités sur le véhicule affecté"""
+        capacities = cls._capacities(trip.vehicle)
+        cls.objects.filter(trip=trip).exclude(**capacities).update(**capacities, updated=timezone.now())
+
+
 class TripPassenger(TimeStampedModel):
     """
     Modèle représentant un passager dans un voyage.
@@ -648,6 +1172,7 @@ class TripEvent(TimeStampedModel):
         INCIDENT = "incident", _("Incident")
         ACCIDENT = "accident", _("Accident")
         ARRIVAL = "arrival", _("Arrivée finale")
+        MISSED_PASSENGERS = "missed_passengers", _("Passagers non embarqués")
 
     trip = models.ForeignKey(
         Trip, 
@@ -689,6 +1214,31 @@ class TripEvent(TimeStampedModel):
 
     def __str__(self):
         return f"{self.trip} - {self.get_event_type_display()} ({self.timestamp.strftime('%d/%m %H:%M')})"
+
+    @classmethod
+    def publish(cls, events):
+        """
+        Diffuse de nouveaux événements aux abonnés du voyage et de son agence
+
+        L'agence est lue sur le voyage déjà chargé ; une seule requête pour
+        les événements dont le voyage ne l'est pas.
+        """
+        from core.realtime import agency_group, broadcast, trip_group
+
+        agency_ids = {event.trip_id: event.trip.agency_id for event in events if cls.trip.is_cached(event)}
+        missing = {event.trip_id for event in events} - agency_ids.keys()
+        if missing:
+            agency_ids.update(Trip.objects.filter(pk__in=missing).values_list('pk', 'agency_id'))
+
+        for event in events:
+            broadcast([trip_group(event.trip_id), agency_group(agency_ids.get(event.trip_id))], 'trip.event', {
+                'trip_id': event.trip_id,
+                'event_id': event.pk,
+                'event_type': event.event_type,
+                'city_id': event.city_id,
+                'note': event.note,
+                'created': event.created,
+            })
     
     def to_json(self):
         """Serialise l'événement en format JSON pour l'API"""
@@ -709,4 +1259,549 @@ class TripEvent(TimeStampedModel):
             } if self.created_by else None,
             'created': self.created.isoformat() if self.created else None,
             'updated': self.updated.isoformat() if self.updated else None,
-        }
\ No newline at end of file
+        }
+
+class TripSearchIndexDate(models.Model):
+    """
+    Date de circulation entièrement construite dans TripSearchIndex.
+
+    Une ligne est écrite par TripSearchIndex.index_date, y compris pour une
+    date sans aucun départ : l'état de l'index est ainsi partagé par tous
+    les processus, quel que soit le cache configuré.
+    """
+    service_date = models.DateField(primary_key=True, verbose_name=_("Date de circulation"))
+    indexed_at = models.DateTimeField(verbose_name=_("Indexée le"))
+
+    class Meta:
+        verbose_name = _("Date indexée")
+        verbose_name_plural = _("Dates indexées")
+        ordering = ["service_date"]
+
+    def __str__(self):
+        return str(self.service_date)
+
+
+class TripSearchIndex(models.Model):
+    """
+    Index dénormalisé de recherche de voyages par (ville de départ, ville d'arrivée, date).
+
+    Chaque ligne correspond à un horaire qui circule à une date donnée. Les lignes
+    sont des données dérivées : elles sont reconstruites par les signaux sur
+    Route, Leg et Schedule et peuvent être supprimées sans perte.
+
+    Attributes:
+        origin (City): Ville de départ du tronçon
+        destination (City): Ville d'arrivée du tronçon
+        service_date (date): Date de circulation
+        schedule (Schedule): Horaire indexé
+        departure_time (Time): Heure de départ
+        price (Decimal): Prix du tronçon
+        duration_minutes (int): Durée du trajet en minutes
+    """
+    origin = models.ForeignKey(
+        "locations.City",
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name=_("Ville de départ")
+    )
+    destination = models.ForeignKey(
+        "locations.City",
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name=_("Ville d'arrivée")
+    )
+    service_date = models.DateField(verbose_name=_("Date de circulation"))
+    schedule = models.ForeignKey(
+        Schedule,
+        on_delete=models.CASCADE,
+        related_name="search_entries",
+        verbose_name=_("Horaire")
+    )
+    route = models.ForeignKey(
+        Route,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name=_("Route")
+    )
+    leg = models.ForeignKey(
+        Leg,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name=_("Tronçon")
+    )
+    agency = models.ForeignKey(
+        "locations.Agency",
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name=_("Agence")
+    )
+    departure_time = models.TimeField(verbose_name=_("Heure de départ"))
+    price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name=_("Prix (FCFA)")
+    )
+    duration_minutes = models.PositiveIntegerField(verbose_name=_("Durée (minutes)"))
+
+    class Meta:
+        verbose_name = _("Index de recherche")
+        verbose_name_plural = _("Index de recherche")
+        ordering = ["departure_time"]
+        unique_together = ("schedule", "service_date")
+        indexes = [
+            models.Index(fields=["origin", "destination", "service_date", "departure_time"]),
+        ]
+
+    def __str__(self):
+        return f"{self.origin_id}→{self.destination_id} le {self.service_date} à {self.departure_time}"
+
+    @staticmethod
+    def _indexable_schedules():
+        """Horaires actifs dont le tronçon et la route ne sont pas supprimés"""
+        return Schedule.objects.filter(
+            is_active=True,
+            leg__is_deleted=False,
+            leg__route__is_deleted=False
+        ).select_related('leg')
+
+    @classmethod
+    def _build_rows(cls, schedules, dates):
+        return [
+            cls(
+                origin_id=schedule.leg.origin_id,
+                destination_id=schedule.leg.destination_id,
+                service_date=service_date,
+                schedule=schedule,
+                route_id=schedule.leg.route_id,
+                leg_id=schedule.leg_id,
+                agency_id=schedule.agency_id,
+                departure_time=schedule.departure_time,
+                price=schedule.leg.price,
+                duration_minutes=schedule.leg.duration_minutes,
+            )
+            for schedule in schedules
+            for service_date in dates
+            if schedule.runs_on(service_date)
+        ]
+
+    @classmethod
+    def index_date(cls, service_date):
+        """
+        (Re)construit l'index pour une date de circulation
+
+        La date est marquée indexée (TripSearchIndexDate) même sans horaire :
+        reindex_schedules couvre toutes les dates jusqu'à la dernière date
+        indexée, un horaire ajouté plus tard y apparaît donc sans invalidation.
+
+        Returns:
+            int: Nombre de lignes indexées
+        """
+        rows = cls._build_rows(cls._indexable_schedules().running_on(service_date), [service_date])
+        with transaction.atomic():
+            cls.objects.filter(service_date=service_date).delete()
+            cls.objects.bulk_create(rows, ignore_conflicts=True)
+            TripSearchIndexDate.objects.update_or_create(
+                service_date=service_date,
+                defaults={'indexed_at': timezone.now()}
+            )
+        return len(rows)
+
+    @classmethod
+    def is_indexed(cls, service_date):
+        """Indique si la date a été construite par index_date (commande build_search_index)"""
+        return TripSearchIndexDate.objects.filter(service_date=service_date).exists()
+
+    @classmethod
+    def reindex_schedules(cls, schedule_ids):
+        """
+        Reconstruit les lignes futures des horaires modifiés pour toutes les
+        dates jusqu'à la dernière date indexée et la fenêtre de recherche
+        configurée
+        """
+        schedule_ids = list(schedule_ids)
+        if not schedule_ids:
+            return
+
+        today = timezone.localdate()
+        window = settings.G_TRAVEL_CONFIG.get('SEARCH_INDEX_DAYS', 14)
+        last_date = today + timedelta(days=window - 1)
+        last_indexed = TripSearchIndexDate.objects.aggregate(last=models.Max('service_date'))['last']
+        if last_indexed is not None and last_indexed > last_date:
+            last_date = last_indexed
+        dates = [today + timedelta(days=offset) for offset in range((last_date - today).days + 1)]
+
+        schedules = cls._indexable_schedules().filter(pk__in=schedule_ids)
+        rows = cls._build_rows(schedules, dates)
+        with transaction.atomic():
+            cls.objects.filter(schedule_id__in=schedule_ids, service_date__gte=today).delete()
+            cls.objects.bulk_create(rows, ignore_conflicts=True)
+
+    @classmethod
+    def search(cls, origin_id, destination_id, service_date):
+        """
+        Recherche les départs entre deux villes pour une date
+
+        Une date que la commande build_search_index n'a pas encore construite
+        est calculée directement depuis les horaires, sans écriture : une
+        recherche ne reconstruit jamais l'index.
+
+        Returns:
+            list | QuerySet: Entrées d'index triées par heure de départ
+        """
+        if cls.is_indexed(service_date):
+            return cls.objects.filter(
+                origin_id=origin_id,
+                destination_id=destination_id,
+                service_date=service_date
+            ).select_related('origin', 'destination', 'agency')
+
+        schedules = cls._indexable_schedules().running_on(service_date).filter(
+            leg__origin_id=origin_id,
+            leg__destination_id=destination_id
+        ).select_related('leg__origin', 'leg__destination', 'agency')
+        entries = []
+        for entry in cls._build_rows(schedules, [service_date]):
+            entry.origin = entry.schedule.leg.origin
+            entry.destination = entry.schedule.leg.destination
+            entry.agency = entry.schedule.agency
+            entries.append(entry)
+        return sorted(entries, key=lambda entry: entry.departure_time)
+
+
+class VehiclePosition(models.Model):
+    """
+    Point GPS remonté par le chauffeur pendant un voyage.
+
+    Table en ajout seul, volontairement compacte : coordonnées en
+    micro-degrés entiers, pas d'horodatage de mise à jour ni de suppression
+    logique. Les lignes sont regroupées par (voyage, jour de circulation),
+    ce qui permet de lire l'historique d'un trajet sur l'index et de purger
+    les anciennes journées en une requête.
+
+    La dernière position de chaque voyage est gardée en cache : les lectures
+    fréquentes (tickets, colis) ne parcourent jamais l'historique.
+
+    Attributes:
+        trip (Trip): Voyage suivi
+        service_date (date): Jour du relevé (partition)
+        recorded_at (DateTime): Horodatage du relevé côté appareil
+        lat_e6 (int): Latitude en micro-degrés
+        lon_e6 (int): Longitude en micro-degrés
+        speed_kmh (int): Vitesse en km/h
+        heading (int): Cap en degrés (0-359)
+        accuracy_m (int): Précision en mètres
+    """
+    id = models.BigAutoField(primary_key=True)
+    trip = models.ForeignKey(
+        Trip,
+        on_delete=models.CASCADE,
+        related_name="positions",
+        db_index=False,
+        verbose_name=_("Voyage")
+    )
+    service_date = models.DateField(verbose_name=_("Jour"))
+    recorded_at = models.DateTimeField(verbose_name=_("Horodatage"))
+    lat_e6 = models.IntegerField(verbose_name=_("Latitude (µ°)"))
+    lon_e6 = models.IntegerField(verbose_name=_("Longitude (µ°)"))
+    speed_kmh = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name=_("Vitesse (km/h)"))
+    heading = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name=_("Cap"))
+    accuracy_m = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name=_("Précision (m)"))
+
+    class Meta:
+        verbose_name = _("Position du véhicule")
+        verbose_name_plural = _("Positions des véhicules")
+        constraints = [
+            # Un lot renvoyé après une coupure ne duplique pas ses points
+            models.UniqueConstraint(fields=["trip", "recorded_at"], name="unique_vehicle_position_per_instant"),
+        ]
+        indexes = [
+            models.Index(fields=["trip", "service_date", "recorded_at"]),
+            models.Index(fields=["service_date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.trip_id} @ {self.recorded_at}: {self.latitude}, {self.longitude}"
+
+    @property
+    def latitude(self):
+        return self.lat_e6 / 1_000_000
+
+    @property
+    def longitude(self):
+        return self.lon_e6 / 1_000_000
+
+    @staticmethod
+    def _cache_key(trip_id):
+        return f"vehicle_position:{trip_id}"
+
+    @staticmethod
+    def _cache_timeout():
+        return settings.G_TRAVEL_CONFIG.get('VEHICLE_POSITION_CACHE_SECONDS', 6 * 3600)
+
+    def to_location(self):
+        """Position au format renvoyé par Trip.get_current_location"""
+        return {
+            'type': 'gps',
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'recorded_at': self.recorded_at.isoformat(),
+            'speed_kmh': self.speed_kmh,
+            'heading': self.heading,
+            'accuracy_m': self.accuracy_m,
+        }
+
+    @classmethod
+    def ingest(cls, trip, points):
+        """
+        Enregistre un lot de points GPS d'un voyage
+
+        Les points sont triés par horodatage ; un point déjà reçu (même
+        horodatage) ou daté dans le futur est ignoré. La position en cache
+        n'est remplacée que par un point plus récent, les lots pouvant
+        arriver dans le désordre après une coupure réseau.
+
+        Args:
+            trip (Trip): Voyage suivi
+            points (list): Dicts {latitude, longitude, recorded_at, speed_kmh, heading, accuracy_m}
+
+        Returns:
+            int: Nombre de points enregistrés
+        """
+        from core.realtime import broadcast_trip
+
+        now = timezone.now()
+        max_skew = timedelta(seconds=settings.G_TRAVEL_CONFIG.get('VEHICLE_POSITION_MAX_SKEW_SECONDS', 120))
+        by_time = {}
+        for point in points:
+            if point['recorded_at'] <= now + max_skew:
+                by_time.setdefault(point['recorded_at'], point)
+        if not by_time:
+            return 0
+
+        # Points déjà reçus (lot renvoyé) : lus sur l'index unique ; la
+        # contrainte écarte ceux d'un envoi concurrent
+        received = cls.objects.filter(
+            trip_id=trip.pk, recorded_at__in=list(by_time)
+        ).values_list('recorded_at', flat=True)
+        for recorded_at in received:
+            by_time.pop(recorded_at, None)
+        if not by_time:
+            return 0
+
+        rows = [
+            cls(
+                trip_id=trip.pk,
+                service_date=timezone.localdate(recorded_at),
+                recorded_at=recorded_at,
+                lat_e6=round(float(point['latitude']) * 1_000_000),
+                lon_e6=round(float(point['longitude']) * 1_000_000),
+                speed_kmh=point.get('speed_kmh'),
+                heading=point.get('heading'),
+                accuracy_m=point.get('accuracy_m'),
+            )
+            for recorded_at, point in sorted(by_time.items())
+        ]
+        cls.objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+
+        latest = rows[-1]
+        cached = cache.get(cls._cache_key(trip.pk))
+        if cached is None or parse_datetime(cached['recorded_at']) < latest.recorded_at:
+            location = latest.to_location()
+            cache.set(cls._cache_key(trip.pk), location, cls._cache_timeout())
+            broadcast_trip(trip, 'trip.position', dict(location, trip_id=trip.pk))
+        return len(rows)
+
+    @classmethod
+    def latest_for_trip(cls, trip):
+        """
+        Dernière position connue d'un voyage
+
+        Lue dans le cache ; en cas d'absence (redémarrage, expiration), le
+        dernier point est relu sur l'index (voyage, jour, horodatage) puis
+        remis en cache.
+
+        Returns:
+            dict | None: Position (voir to_location)
+        """
+        location = cache.get(cls._cache_key(trip.pk))
+        if location is not None:
+            return location
+
+        position = cls.objects.filter(
+            trip_id=trip.pk,
+            service_date__gte=timezone.localdate(trip.departure_dt)
+        ).order_by('-service_date', '-recorded_at').first()
+        if position is None:
+            return None
+
+        location = position.to_location()
+        cache.set(cls._cache_key(trip.pk), location, cls._cache_timeout())
+        return location
+
+    @classmethod
+    def purge_before(cls, service_date):
+        """Supprime les journées antérieures à service_date"""
+        deleted, _ = cls.objects.filter(service_date__lt=service_date).delete()
+        return deleted
+
+
+class LegTravelTime(models.Model):
+    """
+    Distribution des temps de parcours d'un tronçon jusqu'à un point de passage.
+
+    Pour chaque tronçon, une ligne par ville atteinte (arrêts intermédiaires et
+    destination) résume le temps écoulé depuis le départ réel, calculé à
+    partir des événements DEPARTURE / STOP / ARRIVAL. Le résumé est mis à jour
+    à chaque nouvel événement ; la médiane et le 90e centile sont
+    dénormalisés pour une lecture directe.
+
+    Attributes:
+        leg (Leg): Tronçon
+        city (City): Ville atteinte
+        samples (int): Nombre d'observations
+        p50_minutes (float): Temps médian depuis le départ
+        p90_minutes (float): 90e centile
+        summary (list): Centroïdes [moyenne, effectif] (voir transport.quantiles)
+    """
+    leg = models.ForeignKey(
+        Leg,
+        on_delete=models.CASCADE,
+        related_name="travel_times",
+        verbose_name=_("Tronçon")
+    )
+    city = models.ForeignKey(
+        "locations.City",
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name=_("Ville atteinte")
+    )
+    samples = models.PositiveIntegerField(default=0, verbose_name=_("Observations"))
+    p50_minutes = models.FloatField(default=0, verbose_name=_("Médiane (minutes)"))
+    p90_minutes = models.FloatField(default=0, verbose_name=_("90e centile (minutes)"))
+    summary = models.JSONField(default=list, verbose_name=_("Résumé"))
+    updated = models.DateTimeField(auto_now=True, verbose_name=_("Mis à jour le"))
+
+    class Meta:
+        verbose_name = _("Temps de parcours")
+        verbose_name_plural = _("Temps de parcours")
+        unique_together = ("leg", "city")
+
+    def __str__(self):
+        return f"{self.leg_id} → {self.city_id}: {self.p50_minutes:.0f} min ({self.samples})"
+
+    # Observations aberrantes (événement oublié, voyage de plusieurs jours)
+    MAX_MINUTES = 48 * 60
+
+    @staticmethod
+    def _cache_key(leg_id):
+        return f"leg_travel_times:{leg_id}"
+
+    def _apply(self, summary):
+        self.summary = summary.to_list()
+        self.samples = summary.count
+        self.p50_minutes = summary.quantile(0.5)
+        self.p90_minutes = summary.quantile(0.9)
+
+    @classmethod
+    def for_leg(cls, leg_id):
+        """
+        Temps de parcours d'un tronçon, en cache
+
+        Returns:
+            dict: {city_id (str): (p50_minutes, p90_minutes, samples)}
+        """
+        key = cls._cache_key(leg_id)
+        times = cache.get(key)
+        if times is None:
+            times = {
+                str(city_id): (p50, p90, samples)
+                for city_id, p50, p90, samples in cls.objects.filter(leg_id=leg_id).values_list(
+                    'city_id', 'p50_minutes', 'p90_minutes', 'samples'
+                )
+            }
+            cache.set(key, times, 24 * 3600)
+        return times
+
+    @classmethod
+    def record(cls, leg_id, city_id, minutes):
+        """Ajoute une observation au résumé (leg, city)"""
+        if not 0 < minutes <= cls.MAX_MINUTES:
+            return
+        from .quantiles import QuantileSummary
+
+        with transaction.atomic():
+            travel_time, _ = cls.objects.select_for_update().get_or_create(leg_id=leg_id, city_id=city_id)
+            summary = QuantileSummary.from_list(travel_time.summary)
+            summary.add(minutes)
+            travel_time._apply(summary)
+            travel_time.save()
+        cache.delete(cls._cache_key(leg_id))
+
+    @classmethod
+    def record_event(cls, event):
+        """Met à jour les temps de parcours à partir d'un événement STOP ou ARRIVAL"""
+        if event.event_type not in [TripEvent.Type.STOP, TripEvent.Type.ARRIVAL]:
+            return
+
+        leg_id, destination_id = Trip.objects.filter(pk=event.trip_id).values_list(
+            'schedule__leg_id', 'schedule__leg__destination_id'
+        ).first() or (None, None)
+        city_id = event.city_id or (destination_id if event.event_type == TripEvent.Type.ARRIVAL else None)
+        if leg_id is None or city_id is None:
+            return
+
+        departed_at = TripEvent.objects.filter(
+            trip_id=event.trip_id,
+            event_type=TripEvent.Type.DEPARTURE
+        ).order_by('timestamp').values_list('timestamp', flat=True).first()
+        if departed_at is None:
+            return
+
+        cls.record(leg_id, city_id, (event.timestamp - departed_at).total_seconds() / 60)
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Reconstruit tous les résumés en un seul parcours de l'historique
+
+        Returns:
+            int: Nombre de résumés écrits
+        """
+        from .quantiles import QuantileSummary
+
+        summaries = {}
+        departed_at = None
+        current_trip = None
+        events = TripEvent.objects.filter(
+            event_type__in=[TripEvent.Type.DEPARTURE, TripEvent.Type.STOP, TripEvent.Type.ARRIVAL]
+        ).order_by('trip_id', 'timestamp').values_list(
+            'trip_id', 'event_type', 'city_id', 'timestamp',
+            'trip__schedule__leg_id', 'trip__schedule__leg__destination_id'
+        )
+        for trip_id, event_type, city_id, timestamp, leg_id, destination_id in events.iterator():
+            if trip_id != current_trip:
+                current_trip, departed_at = trip_id, None
+            if event_type == TripEvent.Type.DEPARTURE:
+                departed_at = departed_at or timestamp
+                continue
+            if event_type == TripEvent.Type.ARRIVAL:
+                city_id = city_id or destination_id
+            if departed_at is None or city_id is None:
+                continue
+            minutes = (timestamp - departed_at).total_seconds() / 60
+            if 0 < minutes <= cls.MAX_MINUTES:
+                summaries.setdefault((leg_id, city_id), QuantileSummary()).add(minutes)
+
+        rows = []
+        for (leg_id, city_id), summary in summaries.items():
+            row = cls(leg_id=leg_id, city_id=city_id)
+            row._apply(summary)
+            rows.append(row)
+
+        leg_ids = set(cls.objects.values_list('leg_id', flat=True).distinct())
+        leg_ids.update(leg_id for leg_id, _ in summaries)
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(rows, batch_size=500)
+        cache.delete_many([cls._cache_key(leg_id) for leg_id in leg_ids])
+        return len(rows)
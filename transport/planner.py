@@ -0,0 +1,317 @@
+# transport/planner.py
+"""
+Planificateur d'itinéraires multi-tronçons.
+
+Le réseau (tronçons + horaires actifs) est chargé une fois en mémoire par
+processus. Les signaux de transport.signals appliquent les modifications de
+manière incrémentale ; un numéro de version stocké en base (séquence
+core.CodeSequence, lue à chaque recherche) permet aux autres processus de
+détecter qu'ils doivent recharger leur graphe, quel que soit le cache configuré.
+"""
+import heapq
+import threading
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.models import CodeSequence
+from .models import Schedule, ServiceDays
+
+VERSION_SEQUENCE = 'journey_planner_version'
+MINUTES_PER_DAY = 24 * 60
+
+
+class Connection:
+    """Départ quotidien d'un horaire sur un tronçon"""
+    __slots__ = (
+        'schedule_id', 'leg_id', 'agency_id', 'origin_id', 'destination_id',
+        'departure_minute', 'duration', 'price', 'days'
+    )
+
+    def __init__(self, schedule):
+        leg = schedule.leg
+        self.schedule_id = str(schedule.pk)
+        self.leg_id = str(leg.pk)
+        self.agency_id = str(schedule.agency_id)
+        self.origin_id = str(leg.origin_id)
+        self.destination_id = str(leg.destination_id)
+        self.departure_minute = schedule.departure_time.hour * 60 + schedule.departure_time.minute
+        self.duration = leg.duration_minutes
+        self.price = leg.price
+        self.days = schedule.service_days
+
+    def runs_on(self, date):
+        return ServiceDays.includes(self.days, date)
+
+
+class LegGraph:
+    """Graphe des départs, indexé par ville de départ et trié par heure"""
+
+    def __init__(self):
+        self.connections = {}
+        self.by_origin = {}
+        self.minutes_by_origin = {}
+        self.city_names = {}
+
+    @staticmethod
+    def _schedules():
+        return Schedule.objects.filter(
+            is_active=True,
+            leg__is_deleted=False,
+            leg__route__is_deleted=False
+        ).select_related('leg', 'leg__origin', 'leg__destination')
+
+    @classmethod
+    def build(cls):
+        graph = cls()
+        for schedule in cls._schedules():
+            graph._add(schedule)
+        for origin_id in graph.by_origin:
+            graph._sort(origin_id)
+        return graph
+
+    def _add(self, schedule):
+        connection = Connection(schedule)
+        self.connections[connection.schedule_id] = connection
+        self.by_origin.setdefault(connection.origin_id, []).append(connection)
+        self.city_names[connection.origin_id] = schedule.leg.origin.name
+        self.city_names[connection.destination_id] = schedule.leg.destination.name
+        return connection
+
+    def _sort(self, origin_id):
+        connections = self.by_origin[origin_id]
+        connections.sort(key=lambda c: c.departure_minute)
+        self.minutes_by_origin[origin_id] = [c.departure_minute for c in connections]
+
+    def _remove(self, schedule_id):
+        connection = self.connections.pop(schedule_id, None)
+        if connection:
+            self.by_origin[connection.origin_id].remove(connection)
+
+    def refresh_schedules(self, schedule_ids):
+        """Recharge uniquement les horaires indiqués (ajout, modification ou retrait)"""
+        schedule_ids = {str(schedule_id) for schedule_id in schedule_ids}
+        touched = set()
+        for schedule_id in schedule_ids:
+            connection = self.connections.get(schedule_id)
+            if connection:
+                touched.add(connection.origin_id)
+            self._remove(schedule_id)
+        for schedule in self._schedules().filter(pk__in=schedule_ids):
+            touched.add(self._add(schedule).origin_id)
+        for origin_id in touched:
+            self._sort(origin_id)
+
+    def departures(self, city_id, ready_at, base_date, horizon):
+        """
+        Départs depuis une ville à partir de ready_at (minutes depuis minuit de base_date)
+
+        Yields:
+            tuple: (minute absolue de départ, Connection)
+        """
+        connections = self.by_origin.get(city_id)
+        if not connections:
+            return
+        minutes = self.minutes_by_origin[city_id]
+        day = ready_at // MINUTES_PER_DAY
+        while day * MINUTES_PER_DAY <= horizon:
+            date = base_date + timedelta(days=day)
+            offset = day * MINUTES_PER_DAY
+            start = bisect_left(minutes, ready_at - offset) if offset <= ready_at else 0
+            for connection in connections[start:]:
+                departure = offset + connection.departure_minute
+                if departure > horizon:
+                    return
+                if connection.runs_on(date):
+                    yield departure, connection
+            day += 1
+
+
+class JourneyPlanner:
+    """Recherche des meilleurs itinéraires (arrivée au plus tôt) sur le graphe"""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def plan(self, origin_id, destination_id, depart_after, max_transfers=2, limit=5):
+        """
+        Calcule les itinéraires classés par heure d'arrivée, correspondances puis prix
+
+        Args:
+            origin_id: Ville de départ
+            destination_id: Ville d'arrivée
+            depart_after (datetime): Heure de départ au plus tôt
+            max_transfers (int): Nombre maximum de correspondances
+            limit (int): Nombre maximum d'itinéraires retournés
+
+        Returns:
+            list: Itinéraires sous forme de dictionnaires
+        """
+        config = settings.G_TRAVEL_CONFIG
+        min_transfer = config.get('PLANNER_MIN_TRANSFER_MINUTES', 15)
+        horizon_hours = config.get('PLANNER_HORIZON_HOURS', 36)
+
+        depart_after = timezone.localtime(depart_after)
+        base_date = depart_after.date()
+        start = depart_after.hour * 60 + depart_after.minute
+        horizon = start + horizon_hours * 60
+
+        origin_id, destination_id = str(origin_id), str(destination_id)
+        graph = self.graph
+        results = []
+        settled = {}
+        counter = 0
+        heap = [(start, 0, 0, counter, origin_id, ())]
+
+        # On collecte plus de candidats que demandé pour pouvoir écarter les
+        # itinéraires dominés (partir plus tôt pour arriver au même moment).
+        wanted = limit * 3
+        while heap and len(results) < wanted:
+            arrival, transfers, price, _, city_id, path = heapq.heappop(heap)
+
+            if city_id == destination_id:
+                results.append(path)
+                continue
+
+            # Chaque ville n'est développée qu'au plus `wanted` fois : on garde
+            # les meilleures arrivées, ce qui borne la recherche.
+            settled[city_id] = settled.get(city_id, 0) + 1
+            if settled[city_id] > wanted:
+                continue
+
+            # Repartir d'une ville atteinte ajoute une correspondance
+            next_transfers = transfers + 1 if path else 0
+            if next_transfers > max_transfers:
+                continue
+
+            visited = {origin_id} | {step[1].destination_id for step in path}
+            ready_at = arrival + (min_transfer if path else 0)
+            for departure, connection in graph.departures(city_id, ready_at, base_date, horizon):
+                if connection.destination_id in visited:
+                    continue
+                counter += 1
+                heapq.heappush(heap, (
+                    departure + connection.duration,
+                    next_transfers,
+                    price + connection.price,
+                    counter,
+                    connection.destination_id,
+                    path + ((departure, connection),),
+                ))
+
+        return [self._describe(path, base_date) for path in self._pareto(results)[:limit]]
+
+    @staticmethod
+    def _pareto(paths):
+        """Écarte les itinéraires dominés et trie par arrivée, correspondances puis prix"""
+        def key(path):
+            departure = path[0][0]
+            arrival = path[-1][0] + path[-1][1].duration
+            price = sum(connection.price for _, connection in path)
+            return departure, arrival, len(path), price
+
+        keyed = [(key(path), path) for path in paths]
+        kept = []
+        for (departure, arrival, legs, price), path in keyed:
+            dominated = any(
+                other_departure >= departure and other_arrival <= arrival
+                and other_legs <= legs and other_price <= price
+                and (other_departure, other_arrival, other_legs, other_price) != (departure, arrival, legs, price)
+                for (other_departure, other_arrival, other_legs, other_price), _ in keyed
+            )
+            if not dominated:
+                kept.append(((arrival, legs, price), path))
+        kept.sort(key=lambda item: item[0])
+        return [path for _, path in kept]
+
+    def _describe(self, path, base_date):
+        midnight = timezone.make_aware(datetime.combine(base_date, datetime.min.time()))
+        names = self.graph.city_names
+        legs = []
+        transfers = []
+        previous_arrival = None
+
+        for departure, connection in path:
+            arrival = departure + connection.duration
+            if previous_arrival is not None:
+                transfers.append({
+                    'city_id': connection.origin_id,
+                    'city_name': names.get(connection.origin_id),
+                    'wait_minutes': departure - previous_arrival,
+                })
+            legs.append({
+                'schedule_id': connection.schedule_id,
+                'leg_id': connection.leg_id,
+                'agency_id': connection.agency_id,
+                'origin_id': connection.origin_id,
+                'origin_name': names.get(connection.origin_id),
+                'destination_id': connection.destination_id,
+                'destination_name': names.get(connection.destination_id),
+                'departure_dt': midnight + timedelta(minutes=departure),
+                'arrival_dt': midnight + timedelta(minutes=arrival),
+                'duration_minutes': connection.duration,
+                'price': connection.price,
+            })
+            previous_arrival = arrival
+
+        return {
+            'departure_dt': legs[0]['departure_dt'],
+            'arrival_dt': legs[-1]['arrival_dt'],
+            'total_duration_minutes': previous_arrival - path[0][0],
+            'total_price': sum(leg['price'] for leg in legs),
+            'transfers_count': len(transfers),
+            'transfers': transfers,
+            'legs': legs,
+        }
+
+
+_lock = threading.Lock()
+_graph = None
+_graph_version = None
+
+
+def _shared_version():
+    version = CodeSequence.objects.filter(name=VERSION_SEQUENCE).values_list('next_value', flat=True).first()
+    return version or 0
+
+
+def get_graph():
+    """Retourne le graphe du processus, rechargé si un autre processus l'a modifié"""
+    global _graph, _graph_version
+    version = _shared_version()
+    with _lock:
+        if _graph is None or _graph_version != version:
+            _graph = LegGraph.build()
+            _graph_version = version
+        return _graph
+
+
+def refresh_schedules(schedule_ids):
+    """
+    Applique une modification d'horaires : mise à jour incrémentale du graphe
+    local et incrément de la version partagée pour les autres processus
+
+    Appelé après validation (transaction.on_commit) ; dans une transaction,
+    l'incrément est annulé avec elle.
+    """
+    global _graph_version
+    schedule_ids = list(schedule_ids)
+    if not schedule_ids:
+        return
+    previous, version, _ = CodeSequence.allocate_in_transaction(VERSION_SEQUENCE, 1)
+    with _lock:
+        # Incrément atomique : `previous` est exactement la version que
+        # d'autres modifications ont pu produire avant la nôtre.
+        if _graph is not None and _graph_version == previous:
+            _graph.refresh_schedules(schedule_ids)
+            _graph_version = version
+
+
+def plan_journeys(origin_id, destination_id, depart_after, max_transfers=2, limit=5):
+    """Point d'entrée du planificateur pour les vues"""
+    return JourneyPlanner(get_graph()).plan(
+        origin_id, destination_id, depart_after,
+        max_transfers=max_transfers, limit=limit
+    )
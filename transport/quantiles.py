@@ -0,0 +1,79 @@
+# transport/quantiles.py
+"""
+Résumé compact d'une distribution de durées.
+
+Les observations sont regroupées en centroïdes (moyenne, effectif) triés ;
+au-delà de `max_centroids`, les deux voisins dont l'effectif cumulé est le
+plus faible sont fusionnés. Les extrêmes restent donc précis et la taille
+stockée est bornée quelle que soit la longueur de l'historique.
+"""
+
+
+class QuantileSummary:
+    """Distribution approchée, mise à jour observation par observation"""
+
+    def __init__(self, centroids=(), max_centroids=32):
+        self.centroids = [[float(mean), int(count)] for mean, count in centroids]
+        self.max_centroids = max_centroids
+
+    @classmethod
+    def from_list(cls, data, max_centroids=32):
+        return cls(data or (), max_centroids)
+
+    def to_list(self):
+        return [[round(mean, 2), count] for mean, count in self.centroids]
+
+    @property
+    def count(self):
+        return sum(count for _, count in self.centroids)
+
+    def add(self, value, count=1):
+        value = float(value)
+        index = 0
+        while index < len(self.centroids) and self.centroids[index][0] < value:
+            index += 1
+        if index < len(self.centroids) and self.centroids[index][0] == value:
+            self.centroids[index][1] += count
+        else:
+            self.centroids.insert(index, [value, count])
+        if len(self.centroids) > self.max_centroids:
+            self._compress()
+
+    def _compress(self):
+        while len(self.centroids) > self.max_centroids:
+            # Paire voisine de plus faible effectif cumulé (hors extrêmes si possible)
+            index = min(
+                range(len(self.centroids) - 1),
+                key=lambda i: self.centroids[i][1] + self.centroids[i + 1][1]
+            )
+            (left_mean, left_count), (right_mean, right_count) = self.centroids[index:index + 2]
+            total = left_count + right_count
+            self.centroids[index:index + 2] = [
+                [(left_mean * left_count + right_mean * right_count) / total, total]
+            ]
+
+    def quantile(self, q):
+        """
+        Valeur au quantile q (0 à 1) par interpolation entre centroïdes
+
+        Returns:
+            float | None: None si aucune observation
+        """
+        if not self.centroids:
+            return None
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+
+        target = q * self.count
+        cumulative = 0
+        previous_mid, previous_mean = None, None
+        for mean, count in self.centroids:
+            mid = cumulative + count / 2
+            if target <= mid:
+                if previous_mid is None:
+                    return mean
+                ratio = (target - previous_mid) / (mid - previous_mid)
+                return previous_mean + ratio * (mean - previous_mean)
+            previous_mid, previous_mean = mid, mean
+            cumulative += count
+        return self.centroids[-1][0]
@@ -0,0 +1,9 @@
+# transport/routing.py
+from django.urls import path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/trips/<uuid:trip_id>/', consumers.TripFeedConsumer.as_asgi()),
+    path('ws/agencies/<uuid:agency_id>/', consumers.AgencyFeedConsumer.as_asgi()),
+]
@@ -0,0 +1,117 @@
+# transport/seatmap.py
+"""
+Plan de salle d'un voyage sous forme de bitmap.
+
+Le bit i correspond au siège i + 1 ; un bit à 1 indique un siège bloqué ou
+vendu. Le bitmap est stocké en octets (petit-boutiste) dans
+TripSeatInventory.seat_map : 9 octets suffisent pour un bus de 70 places.
+"""
+
+
+class SeatMap:
+    """Allocation de sièges sur un bitmap de la taille du véhicule"""
+
+    def __init__(self, capacity, occupied=0):
+        self.capacity = capacity
+        self.full = (1 << capacity) - 1
+        self.occupied = occupied & self.full
+
+    @classmethod
+    def from_bytes(cls, capacity, data):
+        return cls(capacity, int.from_bytes(bytes(data or b''), 'little'))
+
+    def to_bytes(self):
+        return self.occupied.to_bytes((self.capacity + 7) // 8, 'little')
+
+    def _mask(self, seat_numbers):
+        """
+        Raises:
+            ValueError: Si un numéro n'est pas un siège du plan (1 à capacity)
+        """
+        mask = 0
+        for seat in seat_numbers:
+            if not isinstance(seat, int) or not 1 <= seat <= self.capacity:
+                raise ValueError(f"Siège {seat} hors du plan (1 à {self.capacity})")
+            mask |= 1 << (seat - 1)
+        return mask
+
+    @property
+    def free(self):
+        return ~self.occupied & self.full
+
+    @property
+    def available(self):
+        return bin(self.free).count('1')
+
+    def is_free(self, seat_number):
+        return 1 <= seat_number <= self.capacity and not self.occupied >> (seat_number - 1) & 1
+
+    def _contiguous_start(self, count):
+        """
+        Premier bit d'une suite de `count` sièges libres consécutifs, ou None
+
+        Après l'étape k, le bit i de `runs` vaut 1 si les sièges i à
+        i + width - 1 sont libres ; la largeur double à chaque étape, le coût
+        est donc logarithmique en `count`.
+        """
+        runs = self.free
+        width = 1
+        while width < count and runs:
+            step = min(width, count - width)
+            runs &= runs >> step
+            width += step
+        if not runs:
+            return None
+        return (runs & -runs).bit_length() - 1
+
+    def allocate(self, count):
+        """
+        Réserve `count` sièges, contigus si possible
+
+        Returns:
+            list: Numéros de sièges attribués
+
+        Raises:
+            ValueError: Si le plan n'a pas assez de sièges libres
+        """
+        if count > self.available:
+            raise ValueError(f"Seulement {self.available} sièges disponibles")
+
+        start = self._contiguous_start(count)
+        if start is not None:
+            mask = ((1 << count) - 1) << start
+        else:
+            # Pas de bloc contigu : les premiers sièges libres
+            mask = 0
+            free = self.free
+            for _ in range(count):
+                lowest = free & -free
+                mask |= lowest
+                free ^= lowest
+
+        self.occupied |= mask
+        return self.seats(mask)
+
+    def occupy(self, seat_numbers):
+        """Marque des sièges précis comme pris"""
+        mask = self._mask(seat_numbers)
+        if mask & self.occupied:
+            raise ValueError("Siège déjà attribué")
+        self.occupied |= mask
+
+    def release(self, seat_numbers):
+        """Libère des sièges ; un numéro au-delà du plan n'a rien à libérer"""
+        self.occupied &= ~self._mask([
+            seat for seat in seat_numbers
+            if not isinstance(seat, int) or seat <= self.capacity
+        ])
+
+    @staticmethod
+    def seats(mask):
+        """Numéros de sièges correspondant à un masque"""
+        seats = []
+        while mask:
+            lowest = mask & -mask
+            seats.append(lowest.bit_length())
+            mask ^= lowest
+        return seats
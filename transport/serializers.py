@@ -1,7 +1,8 @@
 # transport/serializers.py
 from rest_framework import serializers
+from django.conf import settings
 
-from .models import Route, Leg, Schedule, Vehicle, Trip, TripPassenger, TripEvent
+from .models import Route, Leg, Schedule, Vehicle, Trip, TripPassenger, TripEvent, TripSearchIndex, ServiceDays
 
 from django.utils import timezone
 from rest_framework import serializers
@@ -60,8 +61,15 @@ class ScheduleSerializer(serializers.ModelSerializer):
         model = Schedule
         fields = [
             'id', 'leg', 'leg_info', 'agency', 'agency_name', 'departure_time',
-            'days_of_week', 'is_active', 'created', 'updated'
+            'days_of_week', 'service_days', 'is_active', 'created', 'updated'
         ]
+    
+    def validate_days_of_week(self, value):
+        if not ServiceDays.from_days_of_week(value):
+            raise serializers.ValidationError(
+                "Jours invalides. Ex: 'mon,tue,wed', 'lun,mar,mer', 'daily' ou 'quotidien'"
+            )
+        return value
 
 
 class VehicleSerializer(serializers.ModelSerializer):
@@ -70,7 +78,7 @@ class VehicleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Vehicle
         fields = [
-            'id', 'plate', 'capacity', 'type', 'agency', 'agency_name',
+            'id', 'plate', 'capacity', 'cargo_capacity_kg', 'cargo_volume_m3', 'type', 'agency', 'agency_name',
             'is_active', 'created', 'updated'
         ]
 
@@ -169,24 +177,10 @@ class ScheduleForLegSerializer(serializers.ModelSerializer):
         ]
     
     def get_days_of_week_display(self, obj):
-        day_mapping = {
-            'mon': 'Lundi', 'tue': 'Mardi', 'wed': 'Mercredi',
-            'thu': 'Jeudi', 'fri': 'Vendredi', 'sat': 'Samedi', 'sun': 'Dimanche'
-        }
-        if obj.days_of_week == 'daily':
-            return 'Tous les jours'
-        days = [day_mapping.get(day.strip(), day) for day in obj.days_of_week.split(',')]
-        return ', '.join(days)
+        return ServiceDays.display(obj.service_days)
     
     def get_is_available_today(self, obj):
-        
-        today = timezone.now().date()
-        day_mapping = {
-            'monday': 'mon', 'tuesday': 'tue', 'wednesday': 'wed',
-            'thursday': 'thu', 'friday': 'fri', 'saturday': 'sat', 'sunday': 'sun'
-        }
-        day_of_week = day_mapping[today.strftime('%A').lower()]
-        return obj.days_of_week == 'daily' or day_of_week in obj.days_of_week
+        return obj.runs_on(timezone.localdate())
     
 
 
@@ -194,3 +188,49 @@ class LegScheduleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Schedule
         fields = '__all__'
+
+
+class TripSearchResultSerializer(serializers.ModelSerializer):
+    origin_name = serializers.CharField(source='origin.name', read_only=True)
+    destination_name = serializers.CharField(source='destination.name', read_only=True)
+    agency_name = serializers.CharField(source='agency.name', read_only=True)
+    departure_time = serializers.TimeField(format='%H:%M')
+
+    class Meta:
+        model = TripSearchIndex
+        fields = [
+            'schedule', 'route', 'leg', 'origin', 'origin_name',
+            'destination', 'destination_name', 'agency', 'agency_name',
+            'service_date', 'departure_time', 'price', 'duration_minutes'
+        ]
+
+
+class TripSearchQuerySerializer(serializers.Serializer):
+    origin_id = serializers.UUIDField()
+    destination_id = serializers.UUIDField()
+    travel_date = serializers.DateField(required=False)
+
+
+class JourneyPlanQuerySerializer(serializers.Serializer):
+    origin_id = serializers.UUIDField()
+    destination_id = serializers.UUIDField()
+    travel_date = serializers.DateField(required=False)
+    max_transfers = serializers.IntegerField(required=False, default=2, min_value=0, max_value=4)
+    limit = serializers.IntegerField(required=False, default=5, min_value=1, max_value=10)
+
+
+class VehiclePositionSerializer(serializers.Serializer):
+    latitude = serializers.DecimalField(max_digits=9, decimal_places=6, min_value=-90, max_value=90)
+    longitude = serializers.DecimalField(max_digits=9, decimal_places=6, min_value=-180, max_value=180)
+    recorded_at = serializers.DateTimeField()
+    speed_kmh = serializers.IntegerField(required=False, allow_null=True, min_value=0, max_value=300)
+    heading = serializers.IntegerField(required=False, allow_null=True, min_value=0, max_value=359)
+    accuracy_m = serializers.IntegerField(required=False, allow_null=True, min_value=0, max_value=32767)
+
+
+class VehiclePositionBatchSerializer(serializers.Serializer):
+    points = serializers.ListField(
+        child=VehiclePositionSerializer(),
+        min_length=1,
+        max_length=settings.G_TRAVEL_CONFIG.get('VEHICLE_POSITION_MAX_BATCH', 500)
+    )
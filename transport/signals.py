@@ -0,0 +1,91 @@
+# transport/signals.py
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Route, Leg, Schedule, Trip, TripEvent, TripSearchIndex, TripSeatInventory, TripCargoLoad, LegTravelTime
+from . import materialization, planner
+
+
+def _reindex_on_commit(schedule_ids):
+    """
+    Réindexe après validation de la transaction : une annulation ne laisse
+    ni index ni graphe décrits d'après des horaires qui n'existent pas
+    """
+    schedule_ids = list(schedule_ids)
+    if not schedule_ids:
+        return
+
+    def reindex():
+        TripSearchIndex.reindex_schedules(schedule_ids)
+        planner.refresh_schedules(schedule_ids)
+
+    transaction.on_commit(reindex)
+
+
+@receiver([post_save, post_delete], sender=Schedule)
+def reindex_schedule(sender, instance, **kwargs):
+    """Resynchronise l'index de recherche et le planificateur après modification d'un horaire"""
+    _reindex_on_commit([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Leg)
+def reindex_leg(sender, instance, **kwargs):
+    """Prix, durée ou villes d'un tronçon : réindexer ses horaires"""
+    _reindex_on_commit(Schedule.objects.all_with_deleted().filter(leg_id=instance.pk).values_list('pk', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Route)
+def reindex_route(sender, instance, **kwargs):
+    """Suppression ou modification d'une route : réindexer les horaires de ses tronçons"""
+    _reindex_on_commit(Schedule.objects.all_with_deleted().filter(leg__route_id=instance.pk).values_list('pk', flat=True))
+
+
+def backfill_service_dates_after_migrate(sender, apps, using, **kwargs):
+    """
+    Date les voyages antérieurs à service_date dès la migration qui l'ajoute
+
+    Connecté dans TransportConfig.ready ; modèle historique, le schéma
+    pouvant ne pas être à jour si la migration visée est antérieure.
+    """
+    Trip = apps.get_model('transport', 'Trip')
+    if not any(field.name == 'service_date' for field in Trip._meta.get_fields()):
+        return
+    trips = list(Trip._base_manager.using(using).filter(service_date__isnull=True).only('departure_dt'))
+    for trip in trips:
+        trip.service_date = timezone.localtime(trip.departure_dt).date()
+    Trip._base_manager.using(using).bulk_update(trips, ['service_date'], batch_size=500)
+
+
+@receiver(post_save, sender=Schedule)
+def materialize_schedule_trips(sender, instance, **kwargs):
+    """Régénère les voyages futurs d'un horaire créé ou modifié"""
+    if settings.G_TRAVEL_CONFIG.get('TRIP_MATERIALIZATION_ON_SAVE', True):
+        materialization.refresh_schedule(instance)
+
+
+@receiver(post_save, sender=Trip)
+def sync_seat_inventory(sender, instance, created, **kwargs):
+    """Crée l'inventaire des places du voyage ; places et fret suivent un changement de véhicule"""
+    update_fields = kwargs.get('update_fields')
+    if created:
+        TripSeatInventory.for_trip(instance)
+    elif update_fields is None or 'vehicle' in update_fields:
+        TripSeatInventory.sync_capacity(instance)
+        TripCargoLoad.sync_capacity(instance)
+
+
+@receiver(post_save, sender=TripEvent)
+def publish_trip_event(sender, instance, created, **kwargs):
+    """Pousse chaque nouvel événement de voyage aux abonnés WebSocket"""
+    if created:
+        TripEvent.publish([instance])
+
+
+@receiver(post_save, sender=TripEvent)
+def record_travel_time(sender, instance, created, **kwargs):
+    """Alimente les temps de parcours à chaque arrêt ou arrivée"""
+    if created:
+        LegTravelTime.record_event(instance)
@@ -1,3 +1,126 @@
-from django.test import TestCase
+import random
+from datetime import date
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from .models import ServiceDays
+from .quantiles import QuantileSummary
+from .seatmap import SeatMap
+
+
+class ServiceDaysTests(SimpleTestCase):
+
+    def test_masks_including_lists_every_mask_with_the_day(self):
+        for weekday in range(7):
+            masks = ServiceDays.masks_including(weekday)
+            self.assertEqual(len(masks), 64)
+            self.assertEqual(set(masks), {mask for mask in range(128) if mask & (1 << weekday)})
+
+    def test_from_days_of_week_accepts_english_french_and_daily(self):
+        self.assertEqual(ServiceDays.from_days_of_week('mon,wed'), 0b101)
+        self.assertEqual(ServiceDays.from_days_of_week('lun, mer'), 0b101)
+        self.assertEqual(ServiceDays.from_days_of_week('daily'), ServiceDays.ALL)
+
+    def test_includes_matches_the_weekday_of_the_date(self):
+        mask = ServiceDays.from_days_of_week('sat,sun')
+        self.assertTrue(ServiceDays.includes(mask, date(2026, 1, 10)))
+        self.assertFalse(ServiceDays.includes(mask, date(2026, 1, 12)))
+
+
+class SeatMapTests(SimpleTestCase):
+
+    def test_allocates_contiguous_block_when_possible(self):
+        seat_map = SeatMap(10)
+        seat_map.occupy([1, 2, 4])
+        self.assertEqual(seat_map.allocate(3), [5, 6, 7])
+        self.assertEqual(seat_map.available, 4)
+
+    def test_falls_back_to_first_free_seats(self):
+        seat_map = SeatMap(6)
+        seat_map.occupy([2, 4, 6])
+        self.assertEqual(seat_map.allocate(2), [1, 3])
+
+    def test_refuses_more_seats_than_available(self):
+        seat_map = SeatMap(3)
+        seat_map.allocate(2)
+        with self.assertRaises(ValueError):
+            seat_map.allocate(2)
+
+    def test_allocations_never_overlap(self):
+        seat_map = SeatMap(70)
+        taken = []
+        for count in (3, 1, 4, 1, 5, 9, 2, 6, 5, 3):
+            taken += seat_map.allocate(count)
+        self.assertEqual(len(set(taken)), len(taken))
+        self.assertTrue(all(1 <= seat <= 70 for seat in taken))
+        self.assertEqual(seat_map.available, 70 - len(taken))
+
+    def test_occupy_rejects_taken_and_out_of_plan_seats(self):
+        seat_map = SeatMap(10)
+        seat_map.occupy([3])
+        for seats in ([3], [0], [11], [-1]):
+            with self.assertRaises(ValueError, msg=seats):
+                seat_map.occupy(seats)
+        self.assertEqual(SeatMap.seats(seat_map.occupied), [3])
+
+    def test_release_ignores_seats_beyond_the_plan(self):
+        seat_map = SeatMap(10)
+        seat_map.occupy([2, 9])
+        seat_map.release([9, 12])
+        self.assertEqual(SeatMap.seats(seat_map.occupied), [2])
+        with self.assertRaises(ValueError):
+            seat_map.release([0])
+
+    def test_bytes_round_trip(self):
+        seat_map = SeatMap(70)
+        seat_map.occupy([1, 8, 9, 70])
+        restored = SeatMap.from_bytes(70, seat_map.to_bytes())
+        self.assertEqual(SeatMap.seats(restored.occupied), [1, 8, 9, 70])
+        self.assertEqual(len(seat_map.to_bytes()), 9)
+
+
+class QuantileSummaryTests(SimpleTestCase):
+
+    def test_empty_summary_has_no_quantile(self):
+        self.assertIsNone(QuantileSummary().quantile(0.5))
+
+    def test_small_samples_are_exact(self):
+        summary = QuantileSummary()
+        for value in (30, 10, 20):
+            summary.add(value)
+        self.assertEqual(summary.quantile(0.5), 20)
+        self.assertEqual(summary.to_list(), [[10.0, 1], [20.0, 1], [30.0, 1]])
+
+    def test_size_is_bounded_and_count_preserved(self):
+        summary = QuantileSummary(max_centroids=16)
+        for value in range(1000):
+            summary.add(value)
+        self.assertLessEqual(len(summary.centroids), 16)
+        self.assertEqual(summary.count, 1000)
+
+    def test_rank_error_stays_within_two_percent(self):
+        rng = random.Random(42)
+        values = [rng.gauss(240, 30) for _ in range(5000)]
+        summary = QuantileSummary()
+        for value in values:
+            summary.add(value)
+        values.sort()
+        for q in (0.1, 0.25, 0.5, 0.75, 0.9):
+            estimate = summary.quantile(q)
+            rank = sum(1 for value in values if value <= estimate) / len(values)
+            self.assertAlmostEqual(rank, q, delta=0.02, msg=f"q={q}")
+
+    def test_quantiles_are_monotonic(self):
+        rng = random.Random(7)
+        summary = QuantileSummary()
+        for _ in range(2000):
+            summary.add(rng.expovariate(1 / 60))
+        estimates = [summary.quantile(q / 20) for q in range(21)]
+        self.assertEqual(estimates, sorted(estimates))
+
+    def test_list_round_trip_keeps_quantiles(self):
+        summary = QuantileSummary()
+        for value in range(1, 501):
+            summary.add(value)
+        restored = QuantileSummary.from_list(summary.to_list())
+        self.assertAlmostEqual(restored.quantile(0.5), summary.quantile(0.5), delta=0.1)
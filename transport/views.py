@@ -5,11 +5,14 @@ from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
 from django.db.models import Count, Sum, Avg 
-from .models import Route, Leg, Schedule, Vehicle, Trip, TripPassenger, TripEvent
+from .models import Route, Leg, Schedule, Vehicle, Trip, TripPassenger, TripEvent, TripSearchIndex, VehiclePosition, TripCargoLoad
 from .serializers import (
     LegScheduleSerializer, LegSearchSerializer, RouteSerializer, LegSerializer, ScheduleForLegSerializer, ScheduleSerializer, VehicleSerializer,
-    TripSerializer, TripPassengerSerializer, TripEventSerializer, AvailableTripSerializer
+    TripSerializer, TripPassengerSerializer, TripEventSerializer, AvailableTripSerializer,
+    TripSearchResultSerializer, TripSearchQuerySerializer, JourneyPlanQuerySerializer, VehiclePositionBatchSerializer
 )
+from .planner import plan_journeys
+from .lifecycle import InvalidTransition
 from core.permissions import (
     IsAuthenticatedAndVerified, IsAdmin, IsManager, IsClient,
     IsDriverOrAgencyStaff, IsCashierOrAgencyStaff, IsAgencyStaff,
@@ -22,6 +25,7 @@ from django_filters import rest_framework as django_filters
 
 from rest_framework import serializers
 from django.db import models
+from datetime import datetime
 
 class RouteViewSet(viewsets.ModelViewSet):
     queryset = Route.objects.all()
@@ -91,6 +95,20 @@ class RouteViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(detail=False, methods=['get'])
+    def search_trips(self, request):
+        """Recherche de départs via l'index (ville de départ, ville d'arrivée, date)"""
+        query = TripSearchQuerySerializer(data=request.GET)
+        query.is_valid(raise_exception=True)
+        
+        entries = TripSearchIndex.search(
+            query.validated_data['origin_id'],
+            query.validated_data['destination_id'],
+            query.validated_data.get('travel_date') or timezone.localdate()
+        )
+        serializer = TripSearchResultSerializer(entries, many=True)
+        return Response(serializer.data)
+
 
 # transport/views.py - Modifiez ScheduleViewSet
 class ScheduleViewSet(viewsets.ModelViewSet):
@@ -239,6 +257,8 @@ class TripViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAuthenticatedAndVerified, IsAdmin]
         elif self.action in ['update_status', 'add_event']:
             permission_classes = [IsAuthenticatedAndVerified, IsDriverOrAgencyStaff]
+        elif self.action == 'positions':
+            permission_classes = [IsAuthenticatedAndVerified, IsChauffeur]
         else:
             permission_classes = [IsAuthenticatedAndVerified]
         return [permission() for permission in permission_classes]
@@ -282,13 +302,63 @@ class TripViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        if trip.update_status(new_status):
-            return Response({'status': 'Statut mis à jour'})
-        else:
+        if new_status not in Trip.Status.values:
             return Response(
                 {'error': 'Statut invalide'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+        
+        try:
+            updated = trip.update_status(new_status, user=request.user)
+        except InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if updated:
+            return Response({'status': 'Statut mis à jour', 'changed': True})
+        return Response({'status': 'Statut inchangé', 'changed': False})
+    
+    @action(detail=True, methods=['post'])
+    def positions(self, request, pk=None):
+        """Réception d'un lot de points GPS du chauffeur"""
+        trip = self.get_object()
+        
+        if trip.driver_id != request.user.pk:
+            return Response(
+                {'error': 'Vous ne pouvez envoyer des positions que pour vos propres voyages'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        if trip.status not in [Trip.Status.BOARDING, Trip.Status.IN_PROGRESS]:
+            return Response(
+                {'error': 'Le voyage n\'est pas en cours'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        serializer = VehiclePositionBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        stored = VehiclePosition.ingest(trip, serializer.validated_data['points'])
+        return Response({'stored': stored}, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['get'])
+    def eta(self, request, pk=None):
+        """Heure d'arrivée estimée (médiane et 90e centile)"""
+        trip = self.get_object()
+        return Response(trip.get_eta())
+    
+    @action(detail=True, methods=['get'])
+    def cargo(self, request, pk=None):
+        """Capacité de fret restante (poids, volume) et nombre de colis à bord"""
+        trip = self.get_object()
+        return Response(TripCargoLoad.remaining(trip))
+    
+    @action(detail=True, methods=['get'])
+    def current_location(self, request, pk=None):
+        """Dernière position connue du véhicule"""
+        trip = self.get_object()
+        location = trip.get_current_location()
+        if location is None:
+            return Response({'error': 'Position non disponible'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(location)
     
     @action(detail=True, methods=['get'])
     def passengers(self, request, pk=None):
@@ -328,9 +398,8 @@ class TripViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        today = timezone.now().date()
         trips = Trip.objects.filter(
-            departure_dt__date=today,
+            service_date=timezone.localdate(),
             agency=request.user.agency
         )
         serializer = TripSerializer(trips, many=True)
@@ -574,6 +643,28 @@ class LegViewSet(viewsets.ReadOnlyModelViewSet):
         schedules = leg.schedules.filter(is_active=True)
         serializer = ScheduleForLegSerializer(schedules, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def plan(self, request):
+        """Itinéraires avec correspondances entre deux villes - Accessible aux clients"""
+        query = JourneyPlanQuerySerializer(data=request.GET)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        
+        now = timezone.now()
+        travel_date = params.get('travel_date')
+        depart_after = now
+        if travel_date and travel_date > timezone.localdate():
+            depart_after = timezone.make_aware(datetime.combine(travel_date, datetime.min.time()))
+        
+        itineraries = plan_journeys(
+            params['origin_id'],
+            params['destination_id'],
+            depart_after,
+            max_transfers=params['max_transfers'],
+            limit=params['limit']
+        )
+        return Response(itineraries)
 
 class LegScheduleViewSet(viewsets.ModelViewSet):
     queryset = Schedule.objects.all()
@@ -770,7 +770,13 @@ class Command(BaseCommand):
         
         self.trips = []
         for data in trips_data:
-            trip = Trip.objects.create(**data)
+            # L'horaire a pu générer ce voyage : on le reprend à l'identique
+            schedule = data.pop('schedule')
+            trip, _ = Trip.objects.update_or_create(
+                schedule=schedule,
+                service_date=timezone.localtime(data['departure_dt']).date(),
+                defaults=data
+            )
             self.trips.append(trip)
             self.stdout.write(f'  - Trip {trip} créé')
             
@@ -517,7 +517,7 @@ class User(AbstractBaseUser, PermissionsMixin, TimeStampedModel):
 
     def _calculate_on_time_rate(self, trips):
         """Calcule le taux de ponctualité d'un chauffeur"""
-        completed_trips = trips.filter(status='completed')
+        completed_trips = trips.filter(status='completed').select_related('schedule__leg')
         if not completed_trips:
             return 100
         